@@ -0,0 +1,235 @@
+import argparse
+import atexit
+import gzip
+import os
+import queue
+import shutil
+import sys
+import threading
+import time
+from datetime import datetime
+
+# 调试产物的后台写入：截图 / HTML / OCR 文本 / 结果 JSON 在抓取线程上只做一次入队，
+# 落盘（HTML 与 HAR 顺带 gzip 压缩）与清理都在后台线程完成，不占用查询时间。
+#   - 排队中的数据超过 MAX_PENDING_BYTES 时直接丢弃新产物（只记日志），绝不阻塞查询
+#   - 进程退出时最多等 FLUSH_TIMEOUT_SEC 把队列写完
+#   - 保留策略：app/debug 下超过 AIRSEA_DEBUG_MAX_AGE_DAYS（默认 7 天）的查询目录删除，
+#     总大小超过 AIRSEA_DEBUG_MAX_MB（默认 500MB）时从最旧的开始删；启动时与之后每 PRUNE_INTERVAL_SEC 执行一次
+#   python backend/artifact_sink.py --prune        立即按保留策略清理一次
+
+DEBUG_DIR = os.path.join(os.path.dirname(__file__), "app", "debug")
+MAX_AGE_DAYS = float(os.environ.get("AIRSEA_DEBUG_MAX_AGE_DAYS", "7"))
+MAX_TOTAL_MB = float(os.environ.get("AIRSEA_DEBUG_MAX_MB", "500"))
+MAX_PENDING_BYTES = 64 * 1024 * 1024
+PRUNE_INTERVAL_SEC = 600
+FLUSH_TIMEOUT_SEC = 10.0
+
+# 这些后缀的产物压缩后保存（文件名追加 .gz）
+COMPRESS_EXT = (".html", ".har")
+
+# 清理时只动调试产物；根目录下的日志（例如 Java 侧的 wanhai_runner.log）与 KEEP 中的文件不删
+ARTIFACT_EXT = (".png", ".html", ".gz", ".har", ".json", ".txt", ".zip")
+# Java 侧 OCR 兜底（TrackingService）固定读取 app/debug 根目录下的这两个文件，写入时额外平铺一份最新的
+KEEP = {"wanhai_ocr_eta.txt", "wanhai_ocr_detail.txt"}
+# 最近仍在写入的目录（HAR、tracing、排队中的产物）不因总大小超限被删
+RECENT_SEC = 600
+
+
+def log(msg: str) -> None:
+    ts = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    print(f"[artifacts] {ts} {msg}", file=sys.stderr, flush=True)
+
+
+def _atomic_write(path: str, data: bytes, compress: bool) -> str:
+    if compress:
+        path += ".gz"
+        data = gzip.compress(data, compresslevel=6)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + f".{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+    return path
+
+
+def write_now(path: str, data: bytes | str) -> str | None:
+    # 少量必须立即可见的文件（Java 侧轮询的 OCR 结果）：在调用线程上同步写入
+    try:
+        return _atomic_write(path, data.encode("utf-8") if isinstance(data, str) else data, False)
+    except Exception as e:
+        log(f"write {path} failed: {e}")
+        return None
+
+
+def _gzip_file(path: str) -> None:
+    # 已由 Playwright 写好的大文件（HAR）：流式压缩后删除原文件
+    if not os.path.isfile(path):
+        return
+    tmp = path + f".gz.{os.getpid()}.tmp"
+    with open(path, "rb") as src, gzip.open(tmp, "wb", compresslevel=6) as dst:
+        shutil.copyfileobj(src, dst, 1024 * 1024)
+    os.replace(tmp, path + ".gz")
+    os.remove(path)
+
+
+def _entry_stat(path: str) -> tuple[float, int]:
+    # (最后修改时间, 总字节数)；目录取其中最新的文件
+    if os.path.isfile(path):
+        st = os.stat(path)
+        return st.st_mtime, st.st_size
+    newest, total = os.path.getmtime(path), 0
+    for root, _dirs, files in os.walk(path):
+        for name in files:
+            try:
+                st = os.stat(os.path.join(root, name))
+            except OSError:
+                continue
+            newest = max(newest, st.st_mtime)
+            total += st.st_size
+    return newest, total
+
+
+def _remove(path: str) -> bool:
+    try:
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+        else:
+            os.remove(path)
+        return True
+    except OSError:
+        return False
+
+
+def prune(root: str = DEBUG_DIR, max_age_days: float = MAX_AGE_DAYS, max_total_mb: float = MAX_TOTAL_MB) -> dict:
+    # 按查询目录（以及旧版平铺在根目录下的产物文件）为单位清理，最旧的先删
+    entries = []
+    try:
+        names = os.listdir(root)
+    except OSError:
+        return {"removed": 0, "freed_mb": 0.0, "total_mb": 0.0}
+    for name in names:
+        path = os.path.join(root, name)
+        if name in KEEP or ".tmp" in name:
+            continue
+        if os.path.isfile(path) and not name.endswith(ARTIFACT_EXT):
+            continue
+        try:
+            mtime, size = _entry_stat(path)
+        except OSError:
+            continue
+        entries.append((mtime, size, path))
+    entries.sort()
+    total = sum(e[1] for e in entries)
+    now = time.time()
+    cutoff = now - max_age_days * 86400
+    limit = max_total_mb * 1024 * 1024
+    removed, freed = 0, 0
+    for mtime, size, path in entries:
+        if mtime >= cutoff and (total - freed <= limit or now - mtime < RECENT_SEC):
+            break
+        if _remove(path):
+            removed += 1
+            freed += size
+    if removed:
+        log(f"pruned {removed} entries ({freed / 1048576:.1f}MB), {(total - freed) / 1048576:.1f}MB left")
+    return {"removed": removed, "freed_mb": round(freed / 1048576, 1), "total_mb": round((total - freed) / 1048576, 1)}
+
+
+class ArtifactSink:
+    def __init__(self, root: str = DEBUG_DIR):
+        self.root = root
+        self.q: queue.Queue = queue.Queue()
+        self.pending = 0
+        self.dropped = 0
+        self._lock = threading.Lock()
+        self._last_prune = 0.0
+        self._thread = threading.Thread(target=self._run, name="artifact-sink", daemon=True)
+        self._thread.start()
+
+    def _reserve(self, size: int, name: str) -> bool:
+        with self._lock:
+            if self.pending + size > MAX_PENDING_BYTES:
+                self.dropped += 1
+                log(f"queue full, dropped {name} ({size} bytes)")
+                return False
+            self.pending += size
+            return True
+
+    def write(self, path: str, data: bytes | str, compress: bool | None = None) -> str:
+        # 入队后立即返回最终路径（压缩的产物带 .gz）
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        if compress is None:
+            compress = path.endswith(COMPRESS_EXT)
+        if self._reserve(len(data), os.path.basename(path)):
+            self.q.put(("write", path, data, compress))
+        return path + ".gz" if compress else path
+
+    def compress_file(self, path: str) -> None:
+        # Playwright 已写完的文件（HAR）交给后台压缩
+        self.q.put(("gzip", path, b"", True))
+
+    def _run(self) -> None:
+        while True:
+            try:
+                item = self.q.get(timeout=PRUNE_INTERVAL_SEC)
+            except queue.Empty:
+                item = None
+            if item is not None:
+                op, path, data, compress = item
+                try:
+                    if op == "write":
+                        _atomic_write(path, data, compress)
+                    else:
+                        _gzip_file(path)
+                except Exception as e:
+                    log(f"{op} {path} failed: {e}")
+                finally:
+                    with self._lock:
+                        self.pending -= len(data)
+                    self.q.task_done()
+            if time.time() - self._last_prune >= PRUNE_INTERVAL_SEC:
+                self._last_prune = time.time()
+                try:
+                    prune(self.root)
+                except Exception as e:
+                    log(f"prune failed: {e}")
+
+    def flush(self, timeout: float = FLUSH_TIMEOUT_SEC) -> bool:
+        deadline_at = time.time() + timeout
+        while self.q.unfinished_tasks:
+            if time.time() >= deadline_at:
+                log(f"flush timed out, {self.q.unfinished_tasks} artifacts not written")
+                return False
+            time.sleep(0.02)
+        return True
+
+
+_SINK: ArtifactSink | None = None
+_SINK_LOCK = threading.Lock()
+
+
+def get_sink(root: str = DEBUG_DIR) -> ArtifactSink:
+    global _SINK
+    with _SINK_LOCK:
+        if _SINK is None:
+            _SINK = ArtifactSink(root)
+            atexit.register(_SINK.flush)
+        return _SINK
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Debug artifact retention")
+    parser.add_argument("--prune", action="store_true", help="apply the age / size retention now")
+    parser.add_argument("--root", default=DEBUG_DIR)
+    parser.add_argument("--max-age-days", type=float, default=MAX_AGE_DAYS)
+    parser.add_argument("--max-mb", type=float, default=MAX_TOTAL_MB)
+    args = parser.parse_args()
+    if not args.prune:
+        parser.error("nothing to do (use --prune)")
+    print(prune(args.root, args.max_age_days, args.max_mb))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,168 @@
+import asyncio
+import sys
+from datetime import datetime
+from typing import AsyncIterable, AsyncIterator, Iterable
+
+from playwright.async_api import async_playwright
+
+from browser_pool import LAUNCH_ARGS
+from resource_blocking import install_blocking_async
+import carriers
+import result_cache
+import deadline
+import metrics
+
+# 异步批量引擎：一个进程、一个 Chromium，同时保持几十个查询在途，
+# 结果按完成顺序逐条产出。承运商流程走 carriers 中 provider 的 scrape_async()：
+# 与同步脚本同一份配置 "steps"，由 step_executor.AsyncRun 执行。
+
+CARRIERS = carriers.names()
+
+
+def log(msg: str) -> None:
+    ts = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    print(f"[engine] {ts} {msg}", file=sys.stderr, flush=True)
+
+
+def load_carrier(carrier: str, config: dict | None = None):
+    provider = carriers.get(carrier)
+    if config is None:
+        config = provider.load_config()
+    return provider, config
+
+
+async def _indexed(numbers: Iterable | AsyncIterable) -> AsyncIterator[tuple]:
+    # 输入项可以是单号，也可以是调用方已编号的 (index, number)；numbers 可以是异步迭代器（batch 的分流队列）
+    if hasattr(numbers, "__aiter__"):
+        i = 0
+        async for item in numbers:
+            yield item if isinstance(item, tuple) else (i, item)
+            i += 1
+        return
+    for i, item in enumerate(numbers):
+        yield item if isinstance(item, tuple) else (i, item)
+
+
+async def scrape_many(carrier: str, numbers: Iterable | AsyncIterable, concurrency: int = 8,
+                      headless: bool | None = None, config: dict | None = None) -> AsyncIterator[dict]:
+    # 结果带 "index"（输入序号），按完成顺序产出
+    provider, base_cfg = load_carrier(carrier, config)
+    if headless is None:
+        headless = bool(base_cfg.get("headless", True))
+    concurrency = max(1, int(concurrency))
+    source = _indexed(numbers)
+    source_lock = asyncio.Lock()
+    results: asyncio.Queue = asyncio.Queue()
+
+    async with async_playwright() as p:
+        # 浏览器按需启动：全部命中缓存（或分到本承运商的单号为空）时不启动
+        browser = None
+        launch_lock = asyncio.Lock()
+
+        async def get_browser():
+            nonlocal browser
+            async with launch_lock:
+                if browser is None:
+                    with metrics.span("browser_launch"):
+                        browser = await p.chromium.launch(headless=headless, args=LAUNCH_ARGS)
+                    log(f"{carrier}: browser launched, concurrency={concurrency}")
+            return browser
+
+        async def one(number: str) -> dict:
+            with metrics.lookup(carrier, number) as trace:
+                res = await one_lookup(number)
+                trace.result(res)
+                return res
+
+        async def one_lookup(number: str) -> dict:
+            cfg = dict(base_cfg, search_number=str(number))
+            # 缓存命中不占用浏览器 context
+            if result_cache.enabled() and not cfg.get("refresh"):
+                hit = await asyncio.to_thread(result_cache.lookup_cached, carrier, number)
+                if hit is not None:
+                    return hit
+            # 每个查询各自的时间预算（ContextVar 随任务隔离），从取到单号开始计时
+            with deadline.scope(base_cfg.get("budget_sec")) as dl:
+                ctx = None
+                try:
+                    # 浏览器启动 / context 创建失败只算本条的错误，worker 继续处理后续单号（下次重新尝试启动）
+                    dl.mark("context")
+                    ctx = await (await get_browser()).new_context(**provider.context_options)
+                    await install_blocking_async(ctx, carrier, base_cfg.get("resource_blocking"))
+                    dl.mark("scrape")
+                    res = await provider.scrape_async(cfg, ctx)
+                except Exception as e:
+                    log(f"{carrier}/{number}: {dl.stage} failed: {e}")
+                    res = {"status": "error", "error": str(e)}
+                finally:
+                    if ctx is not None:
+                        try:
+                            await ctx.close()
+                        except Exception:
+                            pass
+                res = deadline.finish(res, dl)
+            res.setdefault("number", str(number))
+            if result_cache.enabled():
+                await asyncio.to_thread(result_cache.store, carrier, number, res, base_cfg.get("negative_cache_ttl_sec"))
+            return res
+
+        # 批内重复单号合并：同一单号只查一次，其余等待同一个 Future
+        inflight: dict[str, asyncio.Future] = {}
+
+        async def one_coalesced(number: str) -> dict:
+            key = number.upper()
+            fut = inflight.get(key)
+            if fut is not None:
+                res = await asyncio.shield(fut)
+                return {**res, "number": number, "coalesced": True}
+            fut = asyncio.get_running_loop().create_future()
+            inflight[key] = fut
+            try:
+                res = await one(number)
+                fut.set_result(res)
+                return res
+            except asyncio.CancelledError:
+                fut.cancel()
+                raise
+            except BaseException as e:
+                fut.set_exception(e)
+                fut.exception()  # 避免无人等待时的未取异常告警
+                raise
+            finally:
+                inflight.pop(key, None)
+
+        async def next_item():
+            # 异步生成器不能被多个任务同时推进，取号串行
+            async with source_lock:
+                return await anext(source, None)
+
+        async def worker():
+            # 各 worker 从同一迭代器取号，输入可以是任意长度的流
+            while (item := await next_item()) is not None:
+                index, number = item
+                number = str(number).strip()
+                if not number:
+                    continue
+                res = await one_coalesced(number)
+                await results.put({**res, "index": index})
+
+        workers = [asyncio.create_task(worker()) for _ in range(concurrency)]
+        done = asyncio.gather(*workers)
+        done.add_done_callback(lambda _f: results.put_nowait(None))
+        try:
+            while True:
+                item = await results.get()
+                if item is None:
+                    break
+                yield item
+            await done
+        finally:
+            for w in workers:
+                w.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+            await source.aclose()
+            if browser is not None:
+                try:
+                    await browser.close()
+                except Exception:
+                    pass
@@ -0,0 +1,164 @@
+import argparse
+import asyncio
+import json
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+import cancellation
+import carrier_detect
+from async_engine import CARRIERS, load_carrier, scrape_many
+
+# 批量查询入口：一个进程处理整批单号（夜间重查约 2 万个），有界并发，
+# 每个结果一完成就输出一行 NDJSON（完成顺序，带输入序号 index）。
+#   python backend/batch.py --carrier wanhai --numbers-file numbers.txt > results.ndjson
+#   cat numbers.txt | python backend/batch.py --concurrency 16
+# 未指定 --carrier 时按 carrier_detect 的首选承运商分流，每个承运商一个浏览器。
+# 输入每行一个单号，空行与 # 开头的行忽略；输入按需读取，不整体载入内存。
+
+# 每个承运商待查单号队列的上限：队列满时暂停读取输入
+QUEUE_SIZE = 256
+
+
+def log(msg: str) -> None:
+    ts = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    print(f"[batch] {ts} {msg}", file=sys.stderr, flush=True)
+
+
+def read_numbers(stream):
+    for line in stream:
+        line = line.strip()
+        if line and not line.startswith("#"):
+            yield line
+
+
+class Router:
+    # 分流：读取线程逐行读输入、识别承运商，放入各承运商的有界队列；队列满时读取线程等待，
+    # 事件循环不做阻塞读。输入读完后向每个队列放一个 None 作为结束标记。
+    def __init__(self, numbers, carriers, maxsize: int = QUEUE_SIZE):
+        self._numbers = numbers
+        self.queues = {c: asyncio.Queue(maxsize=maxsize) for c in carriers}
+        self.closed: set = set()
+        self.dropped = 0
+
+    def start(self) -> threading.Thread:
+        # 守护线程：进程被取消时不会因阻塞在 stdin 上而无法退出
+        loop = asyncio.get_running_loop()
+        t = threading.Thread(target=self._read, args=(loop,), name="batch-reader", daemon=True)
+        t.start()
+        return t
+
+    def _read(self, loop) -> None:
+        try:
+            for index, number in enumerate(self._numbers):
+                top = carrier_detect.detect(number, tuple(self.queues))[0]["carrier"]
+                asyncio.run_coroutine_threadsafe(self._put(top, (index, number)), loop).result()
+        except RuntimeError:
+            return  # 事件循环已关闭
+        except Exception as e:
+            log(f"read input failed: {e}")
+        try:
+            for c in self.queues:
+                asyncio.run_coroutine_threadsafe(self._put(c, None), loop).result()
+        except RuntimeError:
+            pass
+
+    async def _put(self, carrier: str, item) -> None:
+        if carrier in self.closed:
+            if item is not None:
+                self.dropped += 1
+            return
+        await self.queues[carrier].put(item)
+        if carrier in self.closed:
+            self.close(carrier)
+
+    def close(self, carrier: str) -> None:
+        # 承运商的引擎已退出：丢弃其队列中剩余的单号，之后分到它的单号不再入队，读取线程不会卡住
+        self.closed.add(carrier)
+        q = self.queues[carrier]
+        while not q.empty():
+            if q.get_nowait() is not None:
+                self.dropped += 1
+
+    async def numbers_for(self, carrier: str):
+        q = self.queues[carrier]
+        while (item := await q.get()) is not None:
+            yield item
+
+
+def _emit(res: dict, counts: Counter) -> None:
+    counts[res.get("status")] += 1
+    sys.stdout.write(json.dumps(res, ensure_ascii=False) + "\n")
+    sys.stdout.flush()
+
+
+async def run_batch(numbers, carrier: str | None, concurrency: int, refresh: bool = False,
+                    counts: Counter | None = None, budget: float | None = None) -> Counter:
+    counts = Counter() if counts is None else counts
+    carriers = [carrier] if carrier else list(CARRIERS)
+    router = Router(numbers, carriers)
+    router.start()
+    out: asyncio.Queue = asyncio.Queue()
+
+    async def drive(c: str):
+        cfg = load_carrier(c)[1]
+        if refresh:
+            cfg = dict(cfg, refresh=True)
+        if budget:
+            cfg = dict(cfg, budget_sec=budget)
+        try:
+            async for res in scrape_many(c, router.numbers_for(c), concurrency=concurrency, config=cfg):
+                await out.put({**res, "carrier": c})
+        finally:
+            router.close(c)
+
+    tasks = [asyncio.create_task(drive(c)) for c in carriers]
+    done = asyncio.gather(*tasks, return_exceptions=True)
+    done.add_done_callback(lambda _f: out.put_nowait(None))
+    while True:
+        res = await out.get()
+        if res is None:
+            break
+        _emit(res, counts)
+    for c, r in zip(carriers, await done):
+        if isinstance(r, Exception):
+            log(f"{c}: engine failed: {r}")
+    if router.dropped:
+        log(f"{router.dropped} number(s) not queried (carrier engine exited early)")
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Batch tracking lookups with NDJSON output")
+    parser.add_argument("--numbers-file", default=None, help="one number per line (default: stdin)")
+    parser.add_argument("--carrier", choices=sorted(CARRIERS), default=None,
+                        help="query all numbers on this carrier (default: route by detected carrier)")
+    parser.add_argument("--concurrency", type=int, default=8, help="lookups in flight per carrier")
+    parser.add_argument("--refresh", action="store_true", help="bypass the result cache and query again")
+    parser.add_argument("--budget", type=float, default=None, metavar="SEC",
+                        help="time budget per lookup (default: budget_sec in carrier config)")
+    args = parser.parse_args()
+
+    t0 = time.time()
+    # SIGTERM / SIGINT：asyncio.run 退出前取消全部任务，各 context 随之关闭；已输出的行保持完整
+    cancellation.install()
+    stream = open(args.numbers_file, "r", encoding="utf-8") if args.numbers_file else sys.stdin
+    counts: Counter = Counter()
+    try:
+        with cancellation.cancellable():
+            counts = asyncio.run(run_batch(read_numbers(stream), args.carrier, args.concurrency, args.refresh,
+                                           counts, args.budget))
+    except cancellation.Cancelled as e:
+        log(f"cancelled ({e}), partial output")
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+    total = sum(counts.values())
+    log(f"done: {total} result(s) in {time.time() - t0:.1f}s, by status {dict(counts)}")
+    return cancellation.exit_code()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,243 @@
+import argparse
+import os
+import sys
+import threading
+import time
+import uuid
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, quote, urlsplit
+
+# 离线夹具站点：按承运商站点的 URL 结构提供查询页、列表页、详情页、无数据页与无效单号对话框，
+# 供基准测试把 search_url 指向本机，不再访问真实站点（慢、限流、页面常变）。
+# 页面模板在 fixtures/<carrier>/ 下，{{number}} / {{eta}} / {{ref_type}} / {{view_state}} / {{consent}} 按请求替换；
+# 模板按各脚本配置中的 XPath 与选择器编写，可以直接换成从真实站点保存的页面（文件名保持不变）。
+# 单号决定场景：INVALID 开头为无效单号，NODATA 开头为无数据，其余返回结果。
+# 首次访问查询页会先 302 到一个热身地址设置 cookie（模拟 WAF / 首访跳转），Cookie 弹窗在同意后不再出现。
+#   python backend/bench/fixture_server.py --port 8089 --latency-ms 80
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), "fixtures")
+ETA = "2026-11-02"
+
+# 各承运商配置中 search_url 对应的本机地址（base 为 http://127.0.0.1:<port>）
+SEARCH_URLS = {
+    "shipmentlink": "{base}/shipmentlink/servlet/TDB1_CargoTracking.do",
+    "wanhai": "{base}/wanhai/views/cargo_track_v2/tracking_query.xhtml",
+    "zim": "{base}/zim/tools/track-a-shipment?consnumber={{number}}",
+}
+
+# 基准默认使用的单号：(承运商, 场景) -> 单号
+NUMBERS = {
+    ("shipmentlink", "ok"): "003501147981",
+    ("shipmentlink", "no_data"): "NODATA501147",
+    ("shipmentlink", "invalid"): "INVALID00001",
+    ("wanhai", "ok"): "026F537809",
+    ("wanhai", "no_data"): "NODATA537809",
+    ("zim", "ok"): "ZIMUXIA8449359",
+    ("zim", "no_data"): "NODATA8449359",
+}
+
+WARM_COOKIE = "bench_visited"
+
+
+def log(msg: str) -> None:
+    ts = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    print(f"[fixtures] {ts} {msg}", file=sys.stderr, flush=True)
+
+
+def scenario_of(number: str) -> str:
+    n = (number or "").strip().upper()
+    if n.startswith("INVALID"):
+        return "invalid"
+    if n.startswith("NODATA"):
+        return "no_data"
+    return "ok"
+
+
+def search_url(carrier: str, base: str) -> str:
+    return SEARCH_URLS[carrier].format(base=base.rstrip("/"))
+
+
+class Handler(BaseHTTPRequestHandler):
+    server_version = "AirSeaFixtures/1.0"
+
+    # ---- 工具 ----
+    def log_message(self, fmt, *args):
+        if self.server.verbose:
+            log(f"{self.command} {self.path} -> {fmt % args}")
+
+    def _cookies(self) -> dict:
+        out = {}
+        for part in (self.headers.get("Cookie") or "").split(";"):
+            if "=" in part:
+                k, v = part.strip().split("=", 1)
+                out[k] = v
+        return out
+
+    def _template(self, carrier: str, name: str, **values) -> str:
+        with open(os.path.join(self.server.fixtures_dir, carrier, name), "r", encoding="utf-8") as f:
+            text = f.read()
+        values.setdefault("eta", ETA)
+        values.setdefault("view_state", uuid.uuid4().hex)
+        values.setdefault("consent", "")
+        for k, v in values.items():
+            text = text.replace("{{" + k + "}}", str(v))
+        return text
+
+    def _send(self, status: int, body: str | bytes = b"", ctype: str = "text/html; charset=utf-8", headers=None):
+        data = body.encode("utf-8") if isinstance(body, str) else body
+        self.send_response(status)
+        self.send_header("Content-Type", ctype)
+        self.send_header("Content-Length", str(len(data)))
+        self.send_header("Cache-Control", "no-store")
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(data)
+
+    def _redirect(self, location: str, cookie: str | None = None):
+        headers = {"Location": location}
+        if cookie:
+            headers["Set-Cookie"] = cookie
+        self._send(302, b"", headers=headers)
+
+    def _warm_gate(self, url) -> bool:
+        # 首次访问：302 到热身地址设置 cookie 再跳回（每个 context / HTTP 会话各一次）
+        if WARM_COOKIE in self._cookies():
+            return False
+        self._redirect(f"/warmup?next={quote(url.path + ('?' + url.query if url.query else ''), safe='')}")
+        return True
+
+    def _consent(self, carrier: str, cookie_name: str) -> str:
+        if cookie_name in self._cookies():
+            return ""
+        return self._template(carrier, "consent.html")
+
+    def _form(self) -> dict:
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length).decode("utf-8", "replace") if length else ""
+        return {k: v[0] for k, v in parse_qs(raw, keep_blank_values=True).items()}
+
+    # ---- 路由 ----
+    def do_HEAD(self):
+        self.do_GET()
+
+    def do_GET(self):
+        self._route("GET")
+
+    def do_POST(self):
+        self._route("POST")
+
+    def _route(self, method: str):
+        if self.server.latency_ms and not self.path.startswith("/static/"):
+            time.sleep(self.server.latency_ms / 1000.0)
+        url = urlsplit(self.path)
+        q = {k: v[0] for k, v in parse_qs(url.query, keep_blank_values=True).items()}
+        path = url.path
+        try:
+            if path.startswith("/static/"):
+                ctype = "text/css" if path.endswith(".css") else "application/octet-stream"
+                return self._send(200, b"/* fixture */" if path.endswith(".css") else b"", ctype)
+            if path == "/warmup":
+                return self._redirect(q.get("next") or "/", cookie=f"{WARM_COOKIE}={uuid.uuid4().hex[:12]}; Path=/")
+            if path.startswith("/shipmentlink/"):
+                return self._shipmentlink(method, url, path)
+            if path.startswith("/wanhai/"):
+                return self._wanhai(url, path, q)
+            if path.startswith("/zim/"):
+                return self._zim(url, path, q)
+            self._send(404, "not found", "text/plain")
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def _shipmentlink(self, method: str, url, path: str):
+        if not path.endswith("/TDB1_CargoTracking.do"):
+            return self._send(404, "not found", "text/plain")
+        if method == "GET":
+            if self._warm_gate(url):
+                return
+            return self._send(200, self._template("shipmentlink", "search.html",
+                                                  consent=self._consent("shipmentlink", "cookie_consent")))
+        number = self._form().get("NO", "")
+        page = {"ok": "result.html", "no_data": "no_data.html", "invalid": "invalid.html"}[scenario_of(number)]
+        self._send(200, self._template("shipmentlink", page, number=number))
+
+    def _wanhai(self, url, path: str, q: dict):
+        name = path.rsplit("/", 1)[-1]
+        number = q.get("q_ref_no1") or q.get("ref_no") or ""
+        ref_type = q.get("ref_type") or "MFT"
+        scenario = scenario_of(number)
+        if name == "tracking_query.xhtml":
+            if self._warm_gate(url):
+                return
+            return self._send(200, self._template("wanhai", "query.html"))
+        if name == "tracking_data_list.xhtml":
+            page = "list.html" if scenario == "ok" else "list_no_data.html"
+            return self._send(200, self._template("wanhai", page, number=number))
+        if name in ("tracking_data_page_by_bl_redirect.xhtml", "tracking_data_page_by_booking_redirect.xhtml"):
+            return self._redirect(f"tracking_data_page.xhtml?ref_no={quote(number)}&ref_type={ref_type}")
+        if name == "tracking_data_page.xhtml":
+            page = "detail.html" if scenario == "ok" else "detail_no_data.html"
+            return self._send(200, self._template("wanhai", page, number=number, ref_type=ref_type))
+        self._send(404, "not found", "text/plain")
+
+    def _zim(self, url, path: str, q: dict):
+        number = q.get("consnumber") or ""
+        if path == "/zim/tools/track-a-shipment":
+            return self._send(200, self._template("zim", "track.html", number=number,
+                                                  consent=self._consent("zim", "OptanonAlertBoxClosed")))
+        if path == "/zim/api/v2/trackShipment/GetTracking":
+            name = "tracking.json" if scenario_of(number) == "ok" else "tracking_no_data.json"
+            return self._send(200, self._template("zim", name, number=number, eta=ETA + "T00:00:00"),
+                              "application/json; charset=utf-8")
+        self._send(404, "not found", "text/plain")
+
+
+class FixtureServer:
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, fixtures_dir: str = FIXTURES_DIR,
+                 latency_ms: int = 0, verbose: bool = False):
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+        self.httpd.fixtures_dir = fixtures_dir
+        self.httpd.latency_ms = int(latency_ms)
+        self.httpd.verbose = verbose
+        self._thread: threading.Thread | None = None
+
+    @property
+    def base(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "FixtureServer":
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name="fixture-server", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve offline carrier fixtures for benchmarks")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--fixtures", default=FIXTURES_DIR, help="directory with <carrier>/ page templates")
+    parser.add_argument("--latency-ms", type=int, default=0, help="added delay per request, to mimic the network")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    server = FixtureServer(args.host, args.port, args.fixtures, args.latency_ms, verbose=args.verbose)
+    log(f"serving {args.fixtures} on {server.base}")
+    for carrier in SEARCH_URLS:
+        log(f"  {carrier}: {search_url(carrier, server.base)}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
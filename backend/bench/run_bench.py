@@ -0,0 +1,256 @@
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+# 抓取延迟基准：启动本机夹具站点，对每个承运商 / 场景分别跑冷启动与热启动查询，汇总耗时、CPU 与内存。
+#   冷启动：每次一个全新子进程 + 全新沙箱（空缓存、空 profile、无会话状态），含 Playwright 与浏览器启动；
+#   热启动：同一子进程内连续查询，丢弃第一次，之后复用浏览器池、会话状态与学到的策略。
+# 输出表格，可选写出 JSON；给定 --baseline 时与上次结果比较，p50 变慢超过阈值则退出码为 1，便于在改动前后对比。
+#   python backend/bench/run_bench.py --cold 3 --warm 5 --json bench.json
+#   python backend/bench/run_bench.py --carriers wanhai --baseline bench.json
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCH_DIR)
+
+from fixture_server import FIXTURES_DIR, NUMBERS, SEARCH_URLS, FixtureServer  # noqa: E402
+
+WORKER = os.path.join(BENCH_DIR, "worker.py")
+
+
+def log(msg: str) -> None:
+    ts = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    print(f"[bench] {ts} {msg}", file=sys.stderr, flush=True)
+
+
+def percentile(values: list, q: float) -> float | None:
+    if not values:
+        return None
+    vals = sorted(values)
+    k = (len(vals) - 1) * q
+    lo = int(k)
+    hi = min(lo + 1, len(vals) - 1)
+    return vals[lo] + (vals[hi] - vals[lo]) * (k - lo)
+
+
+def run_worker(args, base: str, carrier: str, scenario: str, iterations: int, root: str) -> tuple[list, dict]:
+    # 起一个 worker 子进程，返回 (每次查询的记录, 整个子进程的开销)
+    cmd = [
+        sys.executable, WORKER,
+        "--carrier", carrier,
+        "--number", NUMBERS[(carrier, scenario)],
+        "--scenario", scenario,
+        "--base", base,
+        "--sandbox", root,
+        "--iterations", str(iterations),
+        "--budget", str(args.budget),
+    ]
+    if args.fast_path:
+        cmd.append("--fast-path")
+    stderr = None if args.verbose else open(os.path.join(root, "worker.log"), "wb")
+    t0 = time.perf_counter()
+    try:
+        proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=stderr)
+        out = proc.stdout.read()
+        usage = None
+        if hasattr(os, "wait4"):
+            # POSIX：wait4 给出子进程树（已回收的浏览器进程也算在内）的 CPU 与峰值内存
+            _, status, usage = os.wait4(proc.pid, 0)
+            proc.returncode = os.waitstatus_to_exitcode(status)
+        else:
+            proc.wait()
+    finally:
+        if stderr is not None:
+            stderr.close()
+    process = {"wall_ms": round((time.perf_counter() - t0) * 1000, 1), "returncode": proc.returncode}
+    if usage is not None:
+        process["cpu_ms"] = round((usage.ru_utime + usage.ru_stime) * 1000, 1)
+        # Linux 上 ru_maxrss 单位为 KB，macOS 为字节
+        process["peak_rss_mb"] = round(usage.ru_maxrss / (1048576 if sys.platform == "darwin" else 1024), 1)
+
+    records = []
+    for line in out.decode("utf-8", "replace").splitlines():
+        line = line.strip()
+        if not line.startswith("{"):
+            continue
+        try:
+            records.append(json.loads(line))
+        except ValueError:
+            continue
+    if len(records) < iterations:
+        log(f"{carrier}/{scenario}: worker returned {len(records)}/{iterations} records "
+            f"(rc={proc.returncode}, log={os.path.join(root, 'worker.log')})")
+    return records, process
+
+
+def run_cold(args, base: str, carrier: str, scenario: str) -> list:
+    runs = []
+    for i in range(args.cold):
+        root = tempfile.mkdtemp(prefix=f"bench-{carrier}-")
+        try:
+            records, process = run_worker(args, base, carrier, scenario, 1, root)
+            for rec in records:
+                rec["mode"] = "cold"
+                rec["iteration"] = i
+                rec["process"] = process
+                runs.append(rec)
+        finally:
+            if not args.keep:
+                shutil.rmtree(root, ignore_errors=True)
+    return runs
+
+
+def run_warm(args, base: str, carrier: str, scenario: str) -> list:
+    if args.warm <= 0:
+        return []
+    root = tempfile.mkdtemp(prefix=f"bench-{carrier}-")
+    try:
+        records, _ = run_worker(args, base, carrier, scenario, args.warm + 1, root)
+    finally:
+        if not args.keep:
+            shutil.rmtree(root, ignore_errors=True)
+    runs = []
+    for rec in records[1:]:  # 第一次是冷启动，丢弃
+        rec["mode"] = "warm"
+        runs.append(rec)
+    return runs
+
+
+def summarize(runs: list) -> dict:
+    groups: dict = {}
+    for r in runs:
+        groups.setdefault(f"{r['carrier']}/{r['scenario']}/{r['mode']}", []).append(r)
+    summary = {}
+    for key, rs in sorted(groups.items()):
+        wall = [r["wall_ms"] for r in rs]
+        cpu = [r["process"]["cpu_ms"] if "cpu_ms" in r.get("process", {}) else r["cpu_ms"] for r in rs]
+        rss = [r["process"]["peak_rss_mb"] if "peak_rss_mb" in r.get("process", {}) else r["peak_rss_mb"]
+               for r in rs]
+        statuses: dict = {}
+        for r in rs:
+            statuses[r.get("status") or "?"] = statuses.get(r.get("status") or "?", 0) + 1
+        stage_vals: dict = {}
+        for r in rs:
+            for name, ms in (r.get("stages") or {}).items():
+                stage_vals.setdefault(name, []).append(ms)
+        summary[key] = {
+            "n": len(rs),
+            "status": statuses,
+            "wall_p50_ms": round(percentile(wall, 0.5), 1),
+            "wall_p95_ms": round(percentile(wall, 0.95), 1),
+            "cpu_mean_ms": round(sum(cpu) / len(cpu), 1),
+            "peak_rss_mb": max(rss),
+            "stages_p50_ms": {k: round(percentile(v, 0.5), 1) for k, v in sorted(stage_vals.items())},
+        }
+    return summary
+
+
+def print_table(summary: dict) -> None:
+    head = f"{'carrier/scenario/mode':<28} {'n':>3} {'p50 ms':>9} {'p95 ms':>9} {'cpu ms':>9} {'rss MB':>8}  status"
+    print(head)
+    print("-" * len(head))
+    for key, s in summary.items():
+        status = ",".join(f"{k}:{v}" for k, v in sorted(s["status"].items()))
+        print(f"{key:<28} {s['n']:>3} {s['wall_p50_ms']:>9.1f} {s['wall_p95_ms']:>9.1f} "
+              f"{s['cpu_mean_ms']:>9.1f} {s['peak_rss_mb']:>8.1f}  {status}")
+        stages = "  ".join(f"{k}={v:.0f}" for k, v in s["stages_p50_ms"].items()
+                           if k not in ("lookup", "cache_hit"))
+        if stages:
+            print(f"{'':<28}     stages p50: {stages}")
+
+
+def compare(summary: dict, baseline_path: str, threshold: float) -> list:
+    # 与基线比较 p50 耗时与平均 CPU，返回超出阈值的回退项
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = json.load(f).get("summary") or {}
+    regressions = []
+    for key, s in summary.items():
+        b = baseline.get(key)
+        if not b:
+            continue
+        for field in ("wall_p50_ms", "cpu_mean_ms"):
+            old, new = b.get(field), s.get(field)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            mark = "REGRESSION" if change > threshold else ""
+            print(f"{key:<28} {field:<12} {old:>9.1f} -> {new:>9.1f}  {change:+.1%} {mark}")
+            if change > threshold:
+                regressions.append({"key": key, "field": field, "baseline": old, "current": new,
+                                    "change": round(change, 3)})
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark carrier scrapers against offline fixtures")
+    parser.add_argument("--carriers", default=",".join(SEARCH_URLS), help="comma separated carriers")
+    parser.add_argument("--scenarios", default="", help="comma separated scenarios (default: all with a fixture)")
+    parser.add_argument("--cold", type=int, default=3, help="cold runs, one fresh process each")
+    parser.add_argument("--warm", type=int, default=5, help="warm runs in one process (after a discarded first run)")
+    parser.add_argument("--latency-ms", type=int, default=0, help="added delay per fixture request")
+    parser.add_argument("--budget", type=float, default=60, help="deadline budget per lookup, seconds")
+    parser.add_argument("--fast-path", action="store_true", help="allow the HTTP / API fast paths")
+    parser.add_argument("--fixtures", default=FIXTURES_DIR)
+    parser.add_argument("--json", dest="json_out", default="", help="write runs and summary to this file")
+    parser.add_argument("--baseline", default="", help="previous --json output to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed slowdown vs baseline (0.2 = 20%%)")
+    parser.add_argument("--keep", action="store_true", help="keep sandbox directories")
+    parser.add_argument("--verbose", action="store_true", help="show worker and fixture server logs")
+    args = parser.parse_args()
+
+    carriers = [c.strip() for c in args.carriers.split(",") if c.strip()]
+    wanted = {s.strip() for s in args.scenarios.split(",") if s.strip()}
+    cases = [(c, s) for (c, s) in NUMBERS if c in carriers and (not wanted or s in wanted)]
+    if not cases:
+        log("no matching carrier / scenario")
+        return 2
+
+    server = FixtureServer(fixtures_dir=args.fixtures, latency_ms=args.latency_ms, verbose=args.verbose).start()
+    log(f"fixture server on {server.base}")
+    runs = []
+    started = time.time()
+    try:
+        for carrier, scenario in cases:
+            log(f"{carrier}/{scenario}: {args.cold} cold, {args.warm} warm")
+            runs += run_cold(args, server.base, carrier, scenario)
+            runs += run_warm(args, server.base, carrier, scenario)
+    finally:
+        server.stop()
+
+    if not runs:
+        log("no results")
+        return 2
+    summary = summarize(runs)
+    print_table(summary)
+
+    if args.json_out:
+        meta = {
+            "ts": datetime.now().isoformat(timespec="seconds"),
+            "duration_sec": round(time.time() - started, 1),
+            "python": sys.version.split()[0],
+            "platform": sys.platform,
+            "cold": args.cold,
+            "warm": args.warm,
+            "latency_ms": args.latency_ms,
+            "fast_path": args.fast_path,
+        }
+        with open(args.json_out, "w", encoding="utf-8") as f:
+            json.dump({"meta": meta, "runs": runs, "summary": summary}, f, ensure_ascii=False, indent=2)
+        log(f"wrote {args.json_out}")
+
+    if args.baseline:
+        print()
+        regressions = compare(summary, args.baseline, args.threshold)
+        if regressions:
+            log(f"{len(regressions)} regression(s) over {args.threshold:.0%}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,214 @@
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+
+# 基准测试子进程：在隔离的沙箱目录里对夹具站点执行同一承运商的若干次查询，每次查询输出一行 JSON。
+# 第一次查询包含 Playwright 启动与浏览器启动（冷），之后复用浏览器池、会话状态与学到的策略（热）。
+# 缓存、会话状态、策略记录、profile、接口模板、埋点全部落在沙箱里，不碰 app/ 下的真实数据。
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# 真实站点一律拦截：夹具缺页时宁可失败，也不要悄悄访问线上
+LIVE_HOSTS = ["*wanhai.com*", "*shipmentlink.com*", "*zim.com*"]
+
+try:
+    import psutil  # 可选：统计整个进程树（含浏览器子进程）的 CPU 与内存
+except ImportError:
+    psutil = None
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def log(msg: str) -> None:
+    ts = time.strftime("%Y-%m-%d %H:%M:%S")
+    print(f"[bench-worker] {ts} {msg}", file=sys.stderr, flush=True)
+
+
+def sandbox(root: str) -> None:
+    # 各模块的数据路径在导入时已确定，这里逐个改到沙箱
+    os.environ["AIRSEA_CACHE"] = "off"
+    import http_client
+    import metrics
+    import profile_manager
+    import session_state
+    import shipmentlink_http
+    import single_flight
+    import strategy_store
+    import zim_api
+
+    http_client.COOKIE_DIR = os.path.join(root, "http")
+    shipmentlink_http.FORM_CACHE = os.path.join(http_client.COOKIE_DIR, "shipmentlink_form.json")
+    zim_api.TEMPLATE_PATH = os.path.join(http_client.COOKIE_DIR, "zim_api.json")
+    single_flight.INFLIGHT_DIR = os.path.join(root, "inflight")
+    strategy_store.STORE_PATH = os.path.join(root, "selector_strategies.json")
+    session_state.STATE_DIR = os.path.join(root, "storage_state")
+    session_state.REFRESH_AT = float("inf")  # 基准中不拉起后台热身进程
+    metrics.METRICS_DIR = os.path.join(root, "metrics")
+    profile_manager.DEFAULT_ROOT = os.path.join(root, "userdata")
+
+
+class Probe:
+    # 单次查询的 CPU 时间与峰值内存；有 psutil 时统计整个进程树，否则只统计本进程
+    def __init__(self):
+        self.proc = psutil.Process() if psutil else None
+        self.scope = "tree" if psutil else "self"
+        self._peak = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _tree(self):
+        procs = [self.proc]
+        try:
+            procs += self.proc.children(recursive=True)
+        except Exception:
+            pass
+        return procs
+
+    def cpu_sec(self) -> float:
+        if self.proc is None:
+            t = os.times()
+            return t.user + t.system + t.children_user + t.children_system
+        total = 0.0
+        for p in self._tree():
+            try:
+                c = p.cpu_times()
+                total += c.user + c.system
+            except Exception:
+                continue
+        return total
+
+    def rss_bytes(self) -> int:
+        if self.proc is None:
+            if resource is None:
+                return 0
+            kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            return kb if sys.platform == "darwin" else kb * 1024
+        total = 0
+        for p in self._tree():
+            try:
+                total += p.memory_info().rss
+            except Exception:
+                continue
+        return total
+
+    def _sample(self):
+        while not self._stop.wait(0.05):
+            self._peak = max(self._peak, self.rss_bytes())
+
+    def start(self):
+        self._peak = self.rss_bytes()
+        self._stop.clear()
+        if self.proc is not None:
+            self._thread = threading.Thread(target=self._sample, name="bench-rss", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> int:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        return max(self._peak, self.rss_bytes())
+
+
+def read_stages(path: str, offset: int) -> tuple[dict, int]:
+    # 读埋点文件中新增的 span：{stage: ms}
+    stages: dict = {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            f.seek(offset)
+            for line in f:
+                try:
+                    r = json.loads(line)
+                except ValueError:
+                    continue
+                stages[r["stage"]] = stages.get(r["stage"], 0) + int(r.get("ms", 0))
+            offset = f.tell()
+    except OSError:
+        pass
+    return stages, offset
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run benchmark lookups against the fixture server")
+    parser.add_argument("--carrier", required=True)
+    parser.add_argument("--number", required=True)
+    parser.add_argument("--scenario", default="ok")
+    parser.add_argument("--base", required=True, help="fixture server base URL")
+    parser.add_argument("--sandbox", required=True)
+    parser.add_argument("--iterations", type=int, default=1)
+    parser.add_argument("--budget", type=float, default=60)
+    parser.add_argument("--fast-path", action="store_true", help="allow the HTTP / API fast paths")
+    parser.add_argument("--debug-level", default="off")
+    args = parser.parse_args()
+
+    sandbox(args.sandbox)
+    from datetime import datetime
+
+    import carriers
+    import metrics
+    from fixture_server import search_url
+
+    provider = carriers.get(args.carrier)
+    provider.profile_seed = None  # 冷启动从空 profile 开始，不复制真实的旧版目录
+    base_cfg = provider.load_config()
+    blocking = dict(base_cfg.get("resource_blocking") or {})
+    blocking["deny"] = list(blocking.get("deny") or []) + LIVE_HOSTS
+    cfg = dict(
+        base_cfg,
+        search_url=search_url(args.carrier, args.base),
+        search_number=args.number,
+        headless=True,
+        manual_verify=False,
+        user_data_dir=os.path.join(args.sandbox, "userdata"),
+        debug_level=args.debug_level,
+        budget_sec=args.budget,
+        http_fast_path=args.fast_path,
+        api_replay=args.fast_path,
+        refresh=True,
+        resource_blocking=blocking,
+    )
+
+    probe = Probe()
+    spans_path = os.path.join(metrics.METRICS_DIR, f"spans-{datetime.now():%Y%m%d}.jsonl")
+    offset = 0
+    for i in range(args.iterations):
+        probe.start()
+        cpu0 = probe.cpu_sec()
+        t0 = time.perf_counter()
+        try:
+            out = provider.scrape(dict(cfg))
+        except Exception as e:
+            out = {"status": "error", "error": str(e)}
+        wall_ms = (time.perf_counter() - t0) * 1000
+        cpu_ms = (probe.cpu_sec() - cpu0) * 1000
+        peak = probe.stop()
+        stages, offset = read_stages(spans_path, offset)
+        rec = {
+            "carrier": args.carrier,
+            "scenario": args.scenario,
+            "number": args.number,
+            "iteration": i,
+            "status": out.get("status"),
+            "source": out.get("source"),
+            "wall_ms": round(wall_ms, 1),
+            "cpu_ms": round(cpu_ms, 1),
+            "peak_rss_mb": round(peak / 1048576, 1),
+            "probe": probe.scope,
+            "stages": stages,
+        }
+        if out.get("status") not in ("ok", "no_data", "invalid"):
+            rec["error"] = str(out.get("error") or "")[:300]
+        sys.stdout.write(json.dumps(rec, ensure_ascii=False) + "\n")
+        sys.stdout.flush()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,187 @@
+import atexit
+import os
+import sys
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+from playwright.sync_api import sync_playwright
+
+import metrics
+
+# 浏览器池：常驻 N 个 Chromium，每次查询只新建一个 context（毫秒级），
+# 浏览器在累计打开 max_pages 个页面后回收重启，避免长期运行内存膨胀。
+# 注意：Playwright sync API 不是线程安全的，池只能在创建它的线程中使用。
+
+DEFAULT_POOL_SIZE = int(os.environ.get("AIRSEA_BROWSER_POOL_SIZE", "2"))
+DEFAULT_MAX_PAGES = int(os.environ.get("AIRSEA_BROWSER_MAX_PAGES", "50"))
+
+LAUNCH_ARGS = [
+    "--disable-blink-features=AutomationControlled",
+    "--no-sandbox",
+    "--disable-dev-shm-usage",
+]
+
+
+def log(msg: str) -> None:
+    ts = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    print(f"[pool] {ts} {msg}", file=sys.stderr, flush=True)
+
+
+class _Slot:
+    def __init__(self, headless: bool):
+        self.headless = headless
+        self.browser = None
+        self.pages = 0
+        self.active = 0
+        self.launched_at = 0.0
+
+    def alive(self) -> bool:
+        try:
+            return self.browser is not None and self.browser.is_connected()
+        except Exception:
+            return False
+
+
+class BrowserPool:
+    def __init__(self, size: int = DEFAULT_POOL_SIZE, max_pages: int = DEFAULT_MAX_PAGES):
+        self.size = max(1, int(size))
+        self.max_pages = max(1, int(max_pages))
+        self._pw_cm = None
+        self._pw = None
+        self._slots: list[_Slot] = []
+
+    # ---- 生命周期 ----
+    def start(self):
+        if self._pw is None:
+            t0 = time.time()
+            with metrics.span("playwright_start"):
+                self._pw_cm = sync_playwright()
+                self._pw = self._pw_cm.start()
+            log(f"playwright started in {int((time.time() - t0) * 1000)}ms")
+        return self
+
+    @property
+    def playwright(self):
+        return self.start()._pw
+
+    def warm(self, headless: bool = True, count: int | None = None) -> None:
+        # 预先拉起浏览器（常驻进程用；一次性脚本无需 warm，按需启动即可）
+        want = self.size if count is None else min(self.size, count)
+        while sum(1 for s in self._slots if s.headless == headless and s.alive()) < want:
+            slot = _Slot(headless)
+            self._launch(slot)
+            self._slots.append(slot)
+
+    def close(self) -> None:
+        for slot in self._slots:
+            self._shutdown(slot)
+        self._slots = []
+        if self._pw_cm is not None:
+            try:
+                self._pw_cm.__exit__(None, None, None)
+            except Exception:
+                pass
+        self._pw_cm = None
+        self._pw = None
+
+    def stats(self) -> list[dict]:
+        return [
+            {"headless": s.headless, "alive": s.alive(), "pages": s.pages, "active": s.active}
+            for s in self._slots
+        ]
+
+    # ---- 槽位管理 ----
+    def _launch(self, slot: _Slot) -> None:
+        pw = self.playwright
+        t0 = time.time()
+        with metrics.span("browser_launch"):
+            slot.browser = pw.chromium.launch(headless=slot.headless, args=LAUNCH_ARGS)
+        slot.pages = 0
+        slot.active = 0
+        slot.launched_at = time.time()
+        log(f"browser launched headless={slot.headless} in {int((time.time() - t0) * 1000)}ms")
+
+    def _shutdown(self, slot: _Slot) -> None:
+        try:
+            if slot.browser is not None:
+                slot.browser.close()
+        except Exception as e:
+            log(f"ignore browser close error: {e}")
+        slot.browser = None
+
+    def _pick(self, headless: bool) -> _Slot:
+        # 先回收已超出页数且空闲的浏览器
+        for slot in self._slots:
+            if slot.headless == headless and slot.active == 0 and slot.pages >= self.max_pages:
+                log(f"recycle browser after {slot.pages} pages")
+                self._shutdown(slot)
+        candidates = [s for s in self._slots if s.headless == headless]
+        for slot in candidates:
+            if not slot.alive() and slot.active == 0:
+                self._launch(slot)
+        usable = [s for s in candidates if s.alive() and s.pages < self.max_pages]
+        if usable:
+            idle = [s for s in usable if s.active == 0]
+            if idle or len(self._slots) >= self.size:
+                return min(idle or usable, key=lambda s: (s.active, s.pages))
+        if len(self._slots) < self.size:
+            slot = _Slot(headless)
+            self._launch(slot)
+            self._slots.append(slot)
+            return slot
+        # 池已满且全部超限：挑负载最小的继续用，等空闲后再回收
+        return min(candidates or self._slots, key=lambda s: (s.active, s.pages))
+
+    # ---- 对外：借出一个全新的 context ----
+    @contextmanager
+    def context(self, headless: bool = True, user_data_dir: str | None = None, **context_kwargs):
+        if user_data_dir:
+            # 持久化 profile 无法挂在共享浏览器上，只复用 Playwright 驱动
+            pw = self.playwright
+            with metrics.span("browser_launch"):
+                ctx = pw.chromium.launch_persistent_context(
+                    user_data_dir=user_data_dir, headless=headless, args=LAUNCH_ARGS, **context_kwargs
+                )
+            try:
+                yield ctx
+            finally:
+                try:
+                    ctx.close()
+                except Exception as e:
+                    log(f"ignore context close error: {e}")
+            return
+
+        slot = self._pick(headless)
+        ctx = slot.browser.new_context(**context_kwargs)
+        slot.active += 1
+
+        def _on_page(_pg):
+            slot.pages += 1
+        ctx.on("page", _on_page)
+        try:
+            yield ctx
+        finally:
+            slot.active -= 1
+            try:
+                ctx.close()
+            except Exception as e:
+                log(f"ignore context close error: {e}")
+
+
+_POOL: BrowserPool | None = None
+
+
+def get_pool() -> BrowserPool:
+    global _POOL
+    if _POOL is None:
+        _POOL = BrowserPool()
+        atexit.register(close_pool)
+    return _POOL
+
+
+def close_pool() -> None:
+    global _POOL
+    if _POOL is not None:
+        _POOL.close()
+        _POOL = None
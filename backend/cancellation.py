@@ -0,0 +1,182 @@
+import _thread
+import json
+import os
+import signal
+import sys
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+
+# 协作式取消：赛跑输掉的脚本应尽快退出并释放浏览器、会话目录，而不是被强杀留下孤儿进程。
+#   - SIGTERM / SIGINT（Windows 另有 SIGBREAK）：结束当前查询并退出进程
+#   - 协议内取消：单次模式下 stdin 收到 {"op": "cancel"}（或一行 cancel）；
+#     --serve 模式下由 serve_loop 处理 {"op": "cancel", "id": ...}，只取消该请求、进程继续服务
+# 取消以 Cancelled 异常在主线程抛出（只在 cancellable() 区间内；区间外只记标记，由调用方检查 terminating()），
+# 沿途的 with / finally 负责关闭 context、停止 tracing、
+# 释放 profile 租约与 single-flight 锁；进程退出时 atexit 再关闭浏览器池与 OCR 子进程。
+
+EXIT_CODES = {"SIGINT": 130, "SIGTERM": 143, "SIGBREAK": 149}
+
+
+class Cancelled(BaseException):
+    # 继承 BaseException：抓取流程里大量的 except Exception 不会把取消吞掉
+    pass
+
+
+_lock = threading.RLock()  # 信号处理函数也在主线程里取这把锁，需可重入
+_event = threading.Event()
+_reason: str | None = None
+_terminating = False
+_armed = False
+_raised = False
+_internal = False
+_installed = False
+
+
+def log(msg: str) -> None:
+    ts = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    print(f"[cancel] {ts} {msg}", file=sys.stderr, flush=True)
+
+
+def requested() -> bool:
+    return _event.is_set()
+
+
+def terminating() -> bool:
+    return _terminating
+
+
+def reason() -> str | None:
+    return _reason
+
+
+def exit_code() -> int:
+    if not _event.is_set():
+        return 0
+    return EXIT_CODES.get(_reason or "", 1)
+
+
+def check() -> None:
+    # 长循环里的检查点：已请求取消则立即抛出
+    if _event.is_set() and _armed:
+        _raise()
+
+
+def reset() -> None:
+    # serve 模式：一次请求被取消后清除状态，继续处理下一条
+    global _reason, _raised, _internal
+    with _lock:
+        if _terminating:
+            return
+        _event.clear()
+        _reason = None
+        _raised = False
+        _internal = False
+
+
+def _raise() -> None:
+    global _raised
+    if _raised:
+        return
+    _raised = True
+    raise Cancelled(_reason or "cancel")
+
+
+def _interrupt_main() -> None:
+    # 真实信号能让主线程里阻塞的 select / recv 立即返回（约 200ms 内停下）；
+    # Windows 没有 pthread_kill，退回 interrupt_main（下一条字节码时生效）
+    main = threading.main_thread()
+    if threading.current_thread() is main:
+        return
+    if hasattr(signal, "pthread_kill"):
+        signal.pthread_kill(main.ident, signal.SIGINT)
+    else:
+        _thread.interrupt_main()
+
+
+def request(why: str = "cancel") -> bool:
+    # 任意线程可调用；只有主线程正处于 cancellable() 区间时才打断它，否则只记下标记
+    global _reason, _internal
+    with _lock:
+        if _event.is_set():
+            return False
+        _reason = why
+        _event.set()
+        interrupt = _armed and _installed
+        _internal = interrupt
+    log(f"cancel requested ({why})")
+    if interrupt:
+        _interrupt_main()
+    return True
+
+
+@contextmanager
+def cancellable():
+    # 包住一次查询：区间内的取消请求会以 Cancelled 打断主线程
+    global _armed
+    _armed = True
+    try:
+        check()
+        yield
+    finally:
+        _armed = False
+
+
+def _on_signal(signum, frame) -> None:
+    global _reason, _terminating, _internal
+    name = signal.Signals(signum).name
+    with _lock:
+        internal = _internal and signum == signal.SIGINT
+        _internal = False
+    if internal:
+        # request() 发来的中断信号
+        if _armed:
+            _raise()
+        return
+    if _terminating:
+        # 清理过程中再次收到信号（例如连按两次 Ctrl+C）：不再等待，直接退出
+        log(f"{name} again during cleanup, exiting now")
+        os._exit(EXIT_CODES.get(name, 1))
+    _terminating = True
+    _reason = name
+    _event.set()
+    if not _armed:
+        # 不在 cancellable() 区间内（例如正在输出结果 JSON、关闭浏览器池）：只记下标记，
+        # 由下一个取消检查点处理，不在任意位置抛出导致 traceback 或半行输出
+        log(f"received {name}, stopping after the current step")
+        return
+    log(f"received {name}, stopping")
+    _raise()
+
+
+def _watch_stdin() -> None:
+    for line in sys.stdin:
+        line = line.strip()
+        if not line:
+            continue
+        op = line
+        if line.startswith("{"):
+            try:
+                op = json.loads(line).get("op")
+            except Exception:
+                continue
+        if op == "cancel":
+            request("cancel")
+            return
+
+
+def install(watch_stdin: bool = False) -> None:
+    # 在主线程调用一次；watch_stdin 仅用于单次查询模式（--serve 模式由 serve_loop 读取 stdin）
+    global _installed
+    if _installed:
+        return
+    _installed = True
+    for name in ("SIGTERM", "SIGINT", "SIGBREAK"):
+        sig = getattr(signal, name, None)
+        if sig is not None:
+            try:
+                signal.signal(sig, _on_signal)
+            except (ValueError, OSError) as e:
+                log(f"cannot install {name} handler: {e}")
+    if watch_stdin and sys.stdin is not None and not sys.stdin.isatty():
+        threading.Thread(target=_watch_stdin, name="cancel-stdin", daemon=True).start()
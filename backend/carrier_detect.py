@@ -0,0 +1,144 @@
+import json
+import os
+import re
+import sys
+import threading
+from datetime import datetime
+
+# 按单号格式推断承运商，返回按得分排序的候选列表：
+#   1. 前缀规则（ZIM 提单 / 万海 026F 类提单 / 长荣 12 位数字订舱号 / 各家箱主代码）
+#   2. 集装箱号 ISO 6346 校验位（校验通过才按箱主代码加权）
+#   3. 历史学习：按单号“形状签名”记录过去哪家查到了结果
+# 未命中任何规则的承运商仍以低分附在末尾，调度器按顺序逐个放宽查询范围。
+
+CARRIERS = ("wanhai", "shipmentlink", "zim")
+HISTORY_PATH = os.path.join(os.path.dirname(__file__), "app", "cache", "carrier_history.json")
+
+# (正则, 承运商, 分值, 说明)
+PREFIX_RULES = (
+    (re.compile(r"^ZIM[A-Z]{1,4}\d"), "zim", 0.9, "ZIM B/L prefix"),
+    (re.compile(r"^WHLC\w+"), "wanhai", 0.9, "WHLC B/L prefix"),
+    (re.compile(r"^0\d{2}[A-Z]\w{6,}$"), "wanhai", 0.8, "WanHai office-coded B/L (e.g. 026F...)"),
+    (re.compile(r"^EGLV\d{9,12}$"), "shipmentlink", 0.9, "EGLV B/L prefix"),
+    (re.compile(r"^\d{12}$"), "shipmentlink", 0.7, "Evergreen 12-digit booking"),
+)
+
+# ISO 6346 箱主代码（前 4 位）
+OWNER_CODES = {
+    "ZIMU": "zim", "ZCSU": "zim", "ZWFU": "zim",
+    "WHLU": "wanhai", "WHSU": "wanhai",
+    "EGHU": "shipmentlink", "EGSU": "shipmentlink", "EISU": "shipmentlink",
+    "EITU": "shipmentlink", "EMCU": "shipmentlink", "UGMU": "shipmentlink",
+}
+CONTAINER_RE = re.compile(r"^([A-Z]{3}[UJZ])(\d{6})(\d)$")
+
+BASE_SCORE = 0.1
+HISTORY_WEIGHT = 0.5
+
+_lock = threading.Lock()
+_history: dict | None = None
+
+
+def log(msg: str) -> None:
+    ts = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    print(f"[detect] {ts} {msg}", file=sys.stderr, flush=True)
+
+
+def normalize(number: str) -> str:
+    return re.sub(r"[\s\-/]", "", str(number or "")).upper()
+
+
+def iso6346_check_digit(code10: str) -> int:
+    # 字母取值 A=10 起，跳过 11 的倍数；第 i 位乘 2^i，求和 mod 11 mod 10
+    values = {}
+    v = 10
+    for ch in "ABCDEFGHIJKLMNOPQRSTUVWXYZ":
+        if v % 11 == 0:
+            v += 1
+        values[ch] = v
+        v += 1
+    total = 0
+    for i, ch in enumerate(code10):
+        total += (values[ch] if ch.isalpha() else int(ch)) * (2 ** i)
+    return total % 11 % 10
+
+
+def is_container_number(number: str) -> bool:
+    m = CONTAINER_RE.match(number)
+    if not m:
+        return False
+    return iso6346_check_digit(m.group(1) + m.group(2)) == int(m.group(3))
+
+
+def signature(number: str) -> str:
+    # 形状签名：字母保留、数字记为 9，只取前 4 位 + 长度，例如 026F12345678 -> 999F/12
+    n = normalize(number)
+    head = re.sub(r"\d", "9", n[:4])
+    return f"{head}/{len(n)}"
+
+
+# ---- 历史记录 ----
+def _load_history() -> dict:
+    global _history
+    if _history is None:
+        try:
+            with open(HISTORY_PATH, "r", encoding="utf-8") as f:
+                _history = json.load(f)
+        except Exception:
+            _history = {}
+    return _history
+
+
+def learn(number: str, carrier: str) -> None:
+    # 某承运商查到结果后调用；文件整体原子替换，并发进程偶有计数丢失可以接受
+    sig = signature(number)
+    with _lock:
+        hist = _load_history()
+        counts = hist.setdefault(sig, {})
+        counts[carrier] = int(counts.get(carrier, 0)) + 1
+        try:
+            os.makedirs(os.path.dirname(HISTORY_PATH), exist_ok=True)
+            tmp = HISTORY_PATH + f".{os.getpid()}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(hist, f, ensure_ascii=False, indent=2)
+            os.replace(tmp, HISTORY_PATH)
+        except Exception as e:
+            log(f"save history failed: {e}")
+
+
+def history_scores(number: str) -> dict:
+    with _lock:
+        counts = dict(_load_history().get(signature(number), {}))
+    total = sum(counts.values())
+    if not total:
+        return {}
+    return {c: n / total for c, n in counts.items()}
+
+
+def detect(number: str, carriers: tuple = CARRIERS) -> list[dict]:
+    n = normalize(number)
+    scores = {c: BASE_SCORE for c in carriers}
+    reasons: dict[str, list[str]] = {c: [] for c in carriers}
+
+    for rx, carrier, score, why in PREFIX_RULES:
+        if carrier in scores and rx.match(n):
+            scores[carrier] = max(scores[carrier], score)
+            reasons[carrier].append(why)
+
+    if is_container_number(n):
+        owner = OWNER_CODES.get(n[:4])
+        if owner in scores:
+            scores[owner] = max(scores[owner], 0.95)
+            reasons[owner].append(f"container owner code {n[:4]} (ISO 6346 check digit ok)")
+    elif CONTAINER_RE.match(n):
+        # 形似箱号但校验位不对：多半是录入错误，不按箱主加权
+        for c in carriers:
+            reasons[c].append("container check digit mismatch")
+
+    for carrier, share in history_scores(n).items():
+        if carrier in scores:
+            scores[carrier] += HISTORY_WEIGHT * share
+            reasons[carrier].append(f"history {share:.0%} for {signature(n)}")
+
+    ranked = sorted(carriers, key=lambda c: (-scores[c], carriers.index(c)))
+    return [{"carrier": c, "score": round(scores[c], 3), "reasons": reasons[c]} for c in ranked]
@@ -0,0 +1,333 @@
+import asyncio
+import importlib
+import json
+import os
+import sys
+from datetime import datetime
+
+import deadline
+import har_replay
+import metrics
+import result_cache
+import session_state
+import shipmentlink_http
+import zim_api
+from browser_pool import get_pool
+from debug_artifacts import DebugArtifacts
+from profile_manager import profile_lease
+from resource_blocking import install_blocking
+
+# 承运商 provider 与注册表。每个承运商一个 Carrier 子类，公共流程只写一次：
+#   scrape()   时间预算 → 结果缓存 / 负缓存 / 并发合并 → _lookup()
+#   _lookup()  快速通道（HTTP / 接口回放）→ profile 租约 → browser_lookup()
+#   browser_lookup()  浏览器池 context + 资源拦截 + 调试产物，执行配置中的 "steps"（step_executor）
+#   scrape_async()    async 引擎用：快速通道（线程中执行）→ 在引擎给的 context 上用 AsyncRun 执行同一份 "steps"
+# 新承运商只需一个配置文件（含 steps）和一个注册的子类；流程特殊的承运商（WanHai）覆盖 browser_lookup / browser_lookup_async。
+# 命令行脚本（Java 调用）仍按 script 字段找到各自模块。
+
+ROOT_DIR = os.path.dirname(__file__)
+CONFIG_DIR = os.path.join(ROOT_DIR, "app", "config")
+
+_REGISTRY: dict = {}
+
+
+def log(msg: str) -> None:
+    ts = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    print(f"[carriers] {ts} {msg}", file=sys.stderr, flush=True)
+
+
+def register(cls):
+    _REGISTRY[cls.name] = cls()
+    return cls
+
+
+def get(name: str) -> "Carrier":
+    key = (name or "").strip().lower()
+    if key not in _REGISTRY:
+        raise ValueError(f"unknown carrier: {name}")
+    return _REGISTRY[key]
+
+
+def names() -> tuple:
+    return tuple(_REGISTRY)
+
+
+class Carrier:
+    name = ""
+    script = ""            # 命令行脚本模块，提供 main()
+    config_name = ""
+    context_options: dict = {"viewport": {"width": 1280, "height": 900}}
+    profile_mode: str | None = None   # 不为 None 时覆盖配置中的 profile_mode
+    profile_seed: str | None = None
+
+    def load_config(self, path: str | None = None) -> dict:
+        path = path or os.path.join(CONFIG_DIR, self.config_name)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def module(self):
+        main = sys.modules.get("__main__")
+        if os.path.splitext(os.path.basename(getattr(main, "__file__", None) or ""))[0] == self.script:
+            return main  # 脚本直接运行时不再重复导入一份
+        return importlib.import_module(self.script)
+
+    # ---- 公共流程 ----
+    def scrape(self, config: dict) -> dict:
+        # 结果缓存命中直接返回，不发请求、不启动浏览器；config["refresh"] 为真时强制重新查询
+        number = str(config.get("search_number"))
+        with metrics.lookup(self.name, number) as trace, deadline.scope(config.get("budget_sec")):
+            if har_replay.active(config):
+                # HAR 回放：不读写缓存、不走快速通道与 profile，只回放浏览器流程
+                out = deadline.finish(self.browser_lookup(har_replay.prepare(config)), deadline.current())
+            else:
+                out = result_cache.cached_lookup(self.name, number, lambda: self._lookup(config),
+                                                 refresh=bool(config.get("refresh")),
+                                                 negative_ttl=config.get("negative_cache_ttl_sec"))
+            trace.result(out)
+            return out
+
+    def _lookup(self, config: dict) -> dict:
+        dl = deadline.current()
+        dl.mark("fast_path")
+        fast = self.fast_path(config)
+        if fast is not None:
+            return fast
+        lease_cfg = dict(config, profile_mode=self.profile_mode) if self.profile_mode else config
+        with profile_lease(self.name, lease_cfg, seed_from=self.profile_seed) as lease:
+            if lease.path is None:
+                session_state.schedule_refresh(self.name, config)
+            out = deadline.finish(self.browser_lookup(config, lease.path), dl)
+            lease.ok = isinstance(out, dict) and out.get("status") == "ok"
+            return out
+
+    def fast_path(self, config: dict) -> dict | None:
+        return None
+
+    def browser_lookup(self, config: dict, profile_dir: str | None = None) -> dict:
+        import step_executor  # 依赖 playwright，按需导入
+
+        steps = config.get("steps")
+        if not steps:
+            raise ValueError(f"配置缺少必要字段：steps ({self.config_name})")
+        number = str(config.get("search_number"))
+        headless = bool(config.get("headless", True))
+        dbg = DebugArtifacts(self.name, number, config.get("debug_level"))
+        log(f"{self.name}: acquire pooled browser context, headless={headless}, profile_dir={profile_dir}")
+        with get_pool().context(
+            headless=headless,
+            user_data_dir=profile_dir,
+            record_har_path=None if har_replay.active(config) else dbg.har_path(),
+            **self.context_options,
+            **session_state.context_kwargs(self.name, config, profile_dir),
+            **har_replay.context_kwargs(config),
+        ) as context:
+            har_replay.install(context, self.name, config)
+            install_blocking(context, self.name, config.get("resource_blocking"))
+            dbg.start_tracing(context)
+            try:
+                run = step_executor.Run(self.name, context, config, dbg)
+                out = run.execute(steps)
+                self.after_steps(run, out)
+                if out.get("status") == "ok" and not profile_dir and session_state.enabled(config):
+                    session_state.save(self.name, context)
+                return out
+            finally:
+                dbg.stop_tracing(context)
+            # context 由浏览器池负责关闭
+
+    def after_steps(self, run, out: dict) -> None:
+        # 步骤执行完后的承运商特有处理（例如学习接口模板）
+        pass
+
+    # ---- async 引擎 ----
+    async def scrape_async(self, config: dict, context) -> dict:
+        # 缓存与时间预算由 async_engine 负责；context 由引擎创建并关闭
+        fast = await asyncio.to_thread(self.fast_path, config)
+        if fast is not None:
+            return fast
+        return await self.browser_lookup_async(config, context)
+
+    async def browser_lookup_async(self, config: dict, context) -> dict:
+        import step_executor  # 依赖 playwright，按需导入
+
+        steps = config.get("steps")
+        if not steps:
+            raise ValueError(f"配置缺少必要字段：steps ({self.config_name})")
+        dbg = DebugArtifacts(self.name, str(config.get("search_number")), config.get("debug_level"))
+        run = step_executor.AsyncRun(self.name, context, config, dbg)
+        out = await run.execute(steps)
+        await self.after_steps_async(run, out)
+        return out
+
+    async def after_steps_async(self, run, out: dict) -> None:
+        self.after_steps(run, out)
+
+    # ---- 会话热身（session_state 后台刷新进程调用）----
+    def warmup_steps(self, config: dict) -> list[dict]:
+        # 默认取 steps 中填写单号之前的部分（打开页面、Cookie 同意等）；没有 steps 时只打开查询页
+        if config.get("warmup_steps"):
+            return config["warmup_steps"]
+        out = []
+        for step in config.get("steps") or []:
+            if step.get("action") in ("fill", "click", "submit", "extract"):
+                break
+            out.append(step)
+        return out or [{"action": "navigate", "url": "{search_url}"},
+                       {"action": "wait", "load_state": "networkidle", "optional": True}]
+
+    def warm(self, config: dict) -> dict:
+        import step_executor  # 依赖 playwright，按需导入
+
+        with deadline.scope(config.get("budget_sec")):
+            dbg = DebugArtifacts(self.name, "warmup", config.get("debug_level"))
+            with get_pool().context(
+                headless=True,
+                **self.context_options,
+                **session_state.context_kwargs(self.name, config),
+            ) as context:
+                install_blocking(context, self.name, config.get("resource_blocking"))
+                out = step_executor.Run(self.name, context, config, dbg).execute(self.warmup_steps(config))
+                if out.get("status") == "ok":
+                    session_state.save(self.name, context)
+                return out
+
+
+def _detail_text(out: dict) -> str:
+    # 非 OCR 结果的明细：节点表逐行（日期 + 事件），没有节点时为结果或错误信息
+    lines = [f"{m.get('date', '')} {m.get('event', '')}".strip() for m in out.get("milestones") or []]
+    if not lines:
+        lines = [str(out.get("result") or out.get("error") or out.get("status") or "")]
+    return "\n".join(lines)
+
+
+@register
+class WanHai(Carrier):
+    # JSF 多窗口流程 + OCR，步骤化收益小，沿用脚本中的定制实现
+    name = "wanhai"
+    script = "wanhai_tracking_playwright"
+    config_name = "wanhai.json"
+
+    def scrape(self, config: dict) -> dict:
+        out = super().scrape(config)
+        self.write_java_files(config, out)
+        return out
+
+    def write_java_files(self, config: dict, out: dict) -> None:
+        # Java 侧 TrackingService 启动脚本后轮询 app/debug 下的 wanhai_ocr_eta.txt / wanhai_ocr_detail.txt，
+        # 快速通道、缓存命中（含负缓存）与浏览器各条路径都在这里按最终结果写一次；没有 ETA 时写 "null"
+        if not isinstance(out, dict) or out.get("status") == "cancelled":
+            return
+        dbg = DebugArtifacts(self.name, str(config.get("search_number")), config.get("debug_level"))
+        if out.get("source") != "ocr" or out.get("cache"):
+            # 浏览器 OCR 路径已写入识别原文，其余结果写明细摘要；明细先于 ETA 写入（Java 读到 ETA 后再读明细）
+            dbg.write_text("wanhai_ocr_detail.txt", _detail_text(out))
+        eta = out.get("result") if out.get("status") == "ok" else None
+        dbg.write_text("wanhai_ocr_eta.txt", str(eta) if eta else "null")
+
+    def fast_path(self, config: dict) -> dict | None:
+        return self.module().http_fast_path(config)
+
+    def browser_lookup(self, config: dict, profile_dir: str | None = None) -> dict:
+        return self.module()._scrape(config, profile_dir)
+
+    async def browser_lookup_async(self, config: dict, context) -> dict:
+        return await self.module()._scrape_async(config, context)
+
+
+@register
+class ShipmentLink(Carrier):
+    name = "shipmentlink"
+    script = "shipmentlink_tracking_playwright"
+    config_name = "shipmentlink.json"
+
+    def fast_path(self, config: dict) -> dict | None:
+        # 直接 POST TDB1_CargoTracking.do 表单，失败（WAF / 表单变化 / 依赖缺失）返回 None 再走浏览器
+        if not config.get("http_fast_path", True):
+            return None
+        number = str(config.get("search_number"))
+        try:
+            res = shipmentlink_http.lookup(number, config)
+        except Exception as e:
+            log(f"shipmentlink: http fast path error: {e}")
+            return None
+        if not res:
+            return None
+        if res["status"] == "invalid":
+            return {"status": "invalid", "number": number, "error": shipmentlink_http.INVALID_MARKER, "source": "http"}
+        log(f"shipmentlink: result (via HTTP form POST): {res['result']}")
+        return {
+            "status": "ok",
+            "number": number,
+            "result": res["result"],
+            "clickedChoose": False,
+            "clickedSearch": False,
+            "source": "http",
+        }
+
+    def after_steps(self, run, out: dict) -> None:
+        if out.get("status") == "ok":
+            out.setdefault("clickedChoose", bool(run.vars.get("search_button_choose_xpath")))
+            out.setdefault("clickedSearch", True)
+
+
+@register
+class Zim(Carrier):
+    name = "zim"
+    script = "zim_tracking_playwright"
+    config_name = "zim.json"
+    user_agent = ("Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+                  "(KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36")
+    context_options = {"viewport": {"width": 1366, "height": 900}, "user_agent": user_agent}
+    # ZIM 依赖持久 profile 保留站点 cookie；每次借用 golden 的克隆，旧版固定目录只用于初始化 golden
+    profile_mode = "clone"
+    profile_seed = os.path.join(ROOT_DIR, "app", "userdata_zim")
+
+    def fast_path(self, config: dict) -> dict | None:
+        # 用上次浏览器查询学到的接口模板直接请求 JSON；没有模板或已失效返回 None 再走浏览器
+        if not config.get("api_replay", True):
+            return None
+        number = str(config.get("search_number"))
+        try:
+            res = zim_api.lookup(number, ttl_sec=float(config.get("api_template_ttl_sec", zim_api.TEMPLATE_TTL_SEC)))
+        except Exception as e:
+            log(f"zim: api replay error: {e}")
+            return None
+        if not res:
+            return None
+        return {**res, "number": number, "source": "api"}
+
+    @staticmethod
+    def _classify(out: dict) -> None:
+        # 接口 JSON 表示失败 / 无数据时改为 invalid / no_data（走负缓存），与 API 直连一致
+        if out.get("status") != "ok" or "data" not in out:
+            return
+        status, error = zim_api.classify(out["data"])
+        if status != "ok":
+            out.update(status=status, error=error)
+
+    def after_steps(self, run, out: dict) -> None:
+        # 抓到追踪接口时学习模板，供后续单号直连
+        self._classify(out)
+        cap = run.capture
+        if out.get("status") != "ok" or cap is None or cap.request is None:
+            return
+        try:
+            req = cap.request
+            zim_api.learn(run.number, req.url, req.method, req.all_headers(), req.post_data, run.context.cookies())
+        except Exception as e:
+            log(f"zim: learn api template failed: {e}")
+
+    async def after_steps_async(self, run, out: dict) -> None:
+        self._classify(out)
+        cap = run.capture
+        if out.get("status") != "ok" or cap is None or cap.request is None:
+            return
+        try:
+            req = cap.request
+            headers, cookies = await req.all_headers(), await run.context.cookies()
+            await asyncio.to_thread(zim_api.learn, run.number, req.url, req.method, headers, req.post_data, cookies)
+        except Exception as e:
+            log(f"zim: learn api template failed: {e}")
@@ -0,0 +1,120 @@
+import os
+import sys
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+
+import metrics
+
+# 单次查询的端到端时间预算：每个 wait_for / goto / expect_page / 轮询都从剩余预算里取超时，
+# 而不是各自写死 15s / 25s / 60s，保证整个查询在调用方（Java 最多等 180s）放弃之前结束。
+#   with deadline.scope(config.get("budget_sec")) as dl:
+#       page.goto(url, timeout=dl.ms(25000))   # min(25000, 剩余毫秒)
+# 预算用尽后每一步只给 1ms，Playwright 随即超时，流程迅速走到收尾并返回已有的部分结果。
+# 当前预算放在 ContextVar 中：dispatch 的多个候选承运商共享同一个预算，async 引擎中每个查询任务各自独立。
+
+DEFAULT_BUDGET_SEC = float(os.environ.get("AIRSEA_BUDGET_SEC", "170"))
+MIN_STEP_MS = 1
+
+_current: ContextVar["Deadline | None"] = ContextVar("airsea_deadline", default=None)
+
+
+def log(msg: str) -> None:
+    ts = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    print(f"[deadline] {ts} {msg}", file=sys.stderr, flush=True)
+
+
+class Deadline:
+    def __init__(self, budget_sec: float | None = None):
+        self.started = time.monotonic()
+        self.budget_sec = budget_sec
+        self.stage = "start"
+
+    def elapsed_ms(self) -> int:
+        return int((time.monotonic() - self.started) * 1000)
+
+    def remaining_sec(self) -> float:
+        if self.budget_sec is None:
+            return float("inf")
+        return self.budget_sec - (time.monotonic() - self.started)
+
+    def remaining_ms(self) -> int | None:
+        # 无预算时返回 None
+        if self.budget_sec is None:
+            return None
+        return max(0, int(self.remaining_sec() * 1000))
+
+    def expired(self) -> bool:
+        return self.remaining_sec() <= 0
+
+    def ms(self, cap: int) -> int:
+        # 某一步的超时：原先的固定值与剩余预算取小
+        left = self.remaining_ms()
+        if left is None:
+            return int(cap)
+        return max(MIN_STEP_MS, min(int(cap), left))
+
+    def sec(self, cap: float) -> float:
+        return self.ms(int(cap * 1000)) / 1000.0
+
+    def mark(self, stage: str) -> None:
+        # 记录进行到哪一步，预算用尽时随部分结果返回；同时作为分阶段耗时埋点的阶段边界
+        self.stage = stage
+        metrics.stage(stage)
+
+    def info(self) -> dict:
+        out = {"stage": self.stage, "elapsedMs": self.elapsed_ms()}
+        if self.budget_sec is not None:
+            out["budgetMs"] = int(self.budget_sec * 1000)
+        return out
+
+
+def current() -> Deadline:
+    # 不在任何 scope 中时返回不限时的 Deadline（各步沿用原先的固定超时）
+    dl = _current.get()
+    return dl if dl is not None else Deadline(None)
+
+
+def parse_budget(value) -> float | None:
+    try:
+        sec = float(value)
+    except (TypeError, ValueError):
+        return None
+    return sec if sec > 0 else None
+
+
+@contextmanager
+def scope(budget_sec=None):
+    # 外层已有更紧的预算（例如 dispatch 为整个调度设的 --budget）时沿用外层
+    budget = parse_budget(budget_sec) or DEFAULT_BUDGET_SEC
+    outer = _current.get()
+    if outer is not None and outer.remaining_sec() <= budget:
+        yield outer
+        return
+    dl = Deadline(budget)
+    token = _current.set(dl)
+    try:
+        yield dl
+    finally:
+        _current.reset(token)
+
+
+def is_answer(out) -> bool:
+    return isinstance(out, dict) and out.get("status") == "ok" and bool(out.get("result") or out.get("data"))
+
+
+def finish(out: dict, dl: Deadline) -> dict:
+    # 预算用尽且没有拿到答案：标记为部分结果并附上进行到的阶段（部分结果不写缓存）
+    if not dl.expired() or is_answer(out):
+        return out
+    if isinstance(out, dict) and out.get("status") in ("invalid", "no_data"):
+        return out
+    out = dict(out) if isinstance(out, dict) else {"status": "timeout"}
+    if out.get("status") in ("error", None):
+        out["status"] = "timeout"
+    out.setdefault("error", "lookup budget exhausted")
+    out["partial"] = True
+    out.update(dl.info())
+    log(f"budget exhausted at stage '{dl.stage}' after {dl.elapsed_ms()}ms")
+    return out
@@ -0,0 +1,172 @@
+import json
+import os
+import re
+import sys
+import uuid
+from datetime import datetime
+
+import artifact_sink
+
+# 分级调试产物：
+#   off     不写任何文件
+#   errors  仅在失败时保存截图 + HTML（生产默认）
+#   steps   额外保存每一步的视口截图、OCR 文本、结果 JSON
+#   full    额外录制 HAR、tracing，截图改为整页
+# 优先级：--debug-level 参数 > 配置 "debug_level" > 环境变量 AIRSEA_DEBUG_LEVEL > errors
+# 每次查询一个目录 app/debug/<时间>_<carrier>_<单号>_<随机>/，并发查询互不覆盖；
+# 截图与 HTML 在抓取线程上只取数据，落盘、压缩（HTML / HAR 为 .gz）与按时间 / 总大小清理由 artifact_sink 在后台完成。
+
+LEVELS = ("off", "errors", "steps", "full")
+LEVEL_ENV = "AIRSEA_DEBUG_LEVEL"
+DEBUG_DIR = os.path.join(os.path.dirname(__file__), "app", "debug")
+
+
+def log(msg: str) -> None:
+    ts = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    print(f"[debug] {ts} {msg}", file=sys.stderr, flush=True)
+
+
+def resolve_level(value: str | None = None, config: dict | None = None) -> str:
+    for cand in (value, (config or {}).get("debug_level"), os.environ.get(LEVEL_ENV)):
+        if cand and str(cand).lower() in LEVELS:
+            return str(cand).lower()
+    return "errors"
+
+
+def _san_label(s: str) -> str:
+    try:
+        return re.sub(r"[^a-zA-Z0-9._-]+", "_", str(s))[:80]
+    except Exception:
+        return "snap"
+
+
+class DebugArtifacts:
+    def __init__(self, carrier: str, number: str, level: str | None = None, debug_dir: str = DEBUG_DIR):
+        self.carrier = carrier
+        self.number = str(number)
+        self.level = resolve_level(level)
+        self.root = debug_dir
+        self.lookup_id = f"{datetime.now():%Y%m%d-%H%M%S}_{carrier}_{_san_label(self.number)}_{uuid.uuid4().hex[:6]}"
+        self.debug_dir = os.path.join(debug_dir, self.lookup_id)
+        self._seq = 0
+        self._tracing = False
+        self._har: str | None = None
+        self._announced = False
+
+    def enabled(self, level: str) -> bool:
+        return LEVELS.index(self.level) >= LEVELS.index(level)
+
+    def path(self, name: str) -> str:
+        return os.path.join(self.debug_dir, name)
+
+    def _sink(self) -> artifact_sink.ArtifactSink:
+        if not self._announced:
+            self._announced = True
+            log(f"{self.carrier}: debug artifacts -> {self.debug_dir}")
+        return artifact_sink.get_sink(self.root)
+
+    # ---- context 级：HAR / tracing 只在 full 级别开启 ----
+    def har_path(self) -> str | None:
+        if not self.enabled("full"):
+            return None
+        # Playwright 在 context 关闭时直接写这个文件，目录需先建好
+        os.makedirs(self.debug_dir, exist_ok=True)
+        self._har = self.path(f"{self.carrier}.har")
+        return self._har
+
+    def start_tracing(self, context) -> None:
+        if not self.enabled("full"):
+            return
+        if self._har:
+            # HAR 在 context 关闭时才写完，之后交给后台压缩
+            har = self._har
+            try:
+                context.on("close", lambda _ctx: self._sink().compress_file(har))
+            except Exception:
+                pass
+        try:
+            context.tracing.start(screenshots=True, snapshots=True, sources=True)
+            self._tracing = True
+            log(f"{self.carrier}: tracing started")
+        except Exception as e:
+            log(f"{self.carrier}: tracing start failed: {e}")
+
+    def stop_tracing(self, context) -> None:
+        if not self._tracing:
+            return
+        self._tracing = False
+        try:
+            os.makedirs(self.debug_dir, exist_ok=True)
+            out = self.path("trace.zip")
+            context.tracing.stop(path=out)
+            log(f"{self.carrier}: trace saved -> {out}")
+        except Exception as e:
+            log(f"{self.carrier}: tracing stop failed: {e}")
+
+    # ---- 页面级 ----
+    def snap(self, page, label: str) -> str | None:
+        if not self.enabled("steps"):
+            return None
+        try:
+            self._seq += 1
+            data = page.screenshot(full_page=self.enabled("full"))
+            return self._write(f"{self._seq:03d}_{_san_label(label)}.png", data)
+        except Exception:
+            return None
+
+    def save_png(self, label: str, data: bytes) -> str | None:
+        # 已在内存中的截图（例如 OCR 用图），steps 级别才落盘
+        if not self.enabled("steps") or not data:
+            return None
+        self._seq += 1
+        return self._write(f"{self._seq:03d}_{_san_label(label)}.png", data)
+
+    def capture_failure(self, page, label: str) -> None:
+        if not self.enabled("errors") or page is None:
+            return
+        png = html = None
+        try:
+            png = page.screenshot(full_page=self.enabled("full"))
+        except Exception:
+            pass
+        try:
+            html = page.content()
+        except Exception:
+            pass
+        self.save_failure(label, png, html)
+
+    def save_failure(self, label: str, png: bytes | None, html: str | None) -> None:
+        # 已取到的失败现场（async 页面由调用方 await 后传入）
+        if not self.enabled("errors"):
+            return
+        base = f"failure_{_san_label(label)}"
+        if png:
+            self._write(base + ".png", png)
+        if html is not None:
+            self._write(base + ".html", html)
+        log(f"{self.carrier}: queued failure artifacts {self.lookup_id}/{base}.png/.html.gz")
+
+    def write_text(self, name: str, text: str, level: str = "steps") -> str | None:
+        if name in artifact_sink.KEEP:
+            # 与 Java 侧约定的文件（TrackingService 轮询读取）：只要不是 off 就写，
+            # 根目录的最新副本同步写入，不经过后台队列，进程退出前一定落盘
+            if self.level == "off":
+                return None
+            artifact_sink.write_now(os.path.join(self.root, name), text or "")
+        elif not self.enabled(level):
+            return None
+        return self._write(name, text or "")
+
+    def write_json(self, name: str, obj: dict, level: str = "steps") -> str | None:
+        if not self.enabled(level):
+            return None
+        payload = json.dumps({"timestamp": datetime.now().isoformat(), **obj}, ensure_ascii=False, indent=2)
+        return self._write(name, payload)
+
+    def _write(self, name: str, data: bytes | str) -> str | None:
+        # 只入队，由后台线程写入；返回最终路径（HTML 带 .gz）
+        try:
+            return self._sink().write(self.path(name), data)
+        except Exception as e:
+            log(f"{self.carrier}: queue {name} failed: {e}")
+            return None
@@ -0,0 +1,101 @@
+import argparse
+import json
+import sys
+from datetime import datetime
+
+import cancellation
+import carrier_detect
+import carriers
+import deadline
+from debug_artifacts import LEVELS
+
+# 单进程调度入口：先按 carrier_detect 的排序只查最可能的承运商，
+# 未命中（无结果 / 无效单号 / 查无数据 / 失败）再依次放宽到下一个候选，
+# 取代“同时起多个浏览器赛跑、输家被强杀”的做法。命中后记入历史，供下次排序。
+
+
+def log(msg: str) -> None:
+    ts = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    print(f"[dispatch] {ts} {msg}", file=sys.stderr, flush=True)
+
+
+def is_hit(res: dict) -> bool:
+    return isinstance(res, dict) and res.get("status") == "ok" and bool(res.get("result") or res.get("data"))
+
+
+def run_carrier(carrier: str, number: str, refresh: bool = False, debug_level: str | None = None) -> dict:
+    provider = carriers.get(carrier)
+    cfg = dict(provider.load_config(), search_number=number, refresh=refresh)
+    if debug_level:
+        cfg["debug_level"] = debug_level
+    return provider.scrape(cfg)
+
+
+def lookup(number: str, carriers: list[str] | None = None, max_candidates: int | None = None,
+           refresh: bool = False, debug_level: str | None = None) -> dict:
+    number = carrier_detect.normalize(number)
+    if carriers:
+        ranked = [{"carrier": c, "score": None, "reasons": ["requested"]} for c in carriers]
+    else:
+        ranked = carrier_detect.detect(number)
+    if max_candidates:
+        ranked = ranked[:max_candidates]
+    log(f"{number}: candidates {[(c['carrier'], c['score']) for c in ranked]}")
+
+    tried = []
+    fallback = None
+    for cand in ranked:
+        carrier = cand["carrier"]
+        try:
+            res = run_carrier(carrier, number, refresh=refresh, debug_level=debug_level)
+        except Exception as e:
+            res = {"status": "error", "error": str(e)}
+        tried.append({"carrier": carrier, "status": res.get("status") if isinstance(res, dict) else None})
+        if is_hit(res):
+            if not carriers:
+                carrier_detect.learn(number, carrier)
+            log(f"{number}: hit on {carrier} after {len(tried)} candidate(s)")
+            return {**res, "number": number, "carrier": carrier, "tried": tried}
+        # 全部未命中时优先返回明确的负结果（invalid / no_data），其次最后一个错误
+        if fallback is None or res.get("status") in ("invalid", "no_data"):
+            fallback = {**res, "carrier": carrier}
+        if deadline.current().expired():
+            log(f"{number}: miss on {carrier}, budget exhausted, not widening")
+            break
+        log(f"{number}: miss on {carrier} (status={res.get('status')}), widening")
+    out = dict(fallback or {"status": "error", "error": "no carrier candidates"})
+    out.update({"number": number, "tried": tried})
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Detect the carrier of a tracking number and query it")
+    parser.add_argument("--number", required=True)
+    parser.add_argument("--carrier", action="append", choices=carrier_detect.CARRIERS,
+                        help="skip detection and query these carriers in order (repeatable)")
+    parser.add_argument("--max-candidates", type=int, default=None,
+                        help="stop widening after this many carriers")
+    parser.add_argument("--detect-only", action="store_true", help="print ranked candidates without querying")
+    parser.add_argument("--refresh", action="store_true", help="bypass the result cache and query again")
+    parser.add_argument("--debug-level", choices=LEVELS, default=None)
+    parser.add_argument("--budget", type=float, default=None, metavar="SEC",
+                        help="time budget shared by all candidate carriers")
+    args = parser.parse_args()
+
+    if args.detect_only:
+        out = {"number": carrier_detect.normalize(args.number), "candidates": carrier_detect.detect(args.number)}
+    else:
+        cancellation.install(watch_stdin=True)
+        try:
+            # 所有候选承运商共用一个预算，各脚本内部的预算不会超出它
+            with cancellation.cancellable(), deadline.scope(args.budget):
+                out = lookup(args.number, carriers=args.carrier, max_candidates=args.max_candidates,
+                             refresh=args.refresh, debug_level=args.debug_level)
+        except cancellation.Cancelled as e:
+            out = {"status": "cancelled", "number": carrier_detect.normalize(args.number), "reason": str(e)}
+    print(json.dumps(out, ensure_ascii=False), flush=True)
+    return cancellation.exit_code()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,87 @@
+import json
+import os
+import sys
+import time
+
+# 跨进程的简易锁文件：O_EXCL 创建，内容记录持有者 pid；
+# 持有者进程已退出或超过 max_age 秒视为陈旧锁，可被抢占。
+
+
+def pid_alive(pid: int) -> bool:
+    if pid <= 0:
+        return False
+    if pid == os.getpid():
+        return True
+    if sys.platform == "win32":
+        import ctypes
+        PROCESS_QUERY_LIMITED_INFORMATION = 0x1000
+        STILL_ACTIVE = 259
+        handle = ctypes.windll.kernel32.OpenProcess(PROCESS_QUERY_LIMITED_INFORMATION, False, pid)
+        if not handle:
+            return False
+        try:
+            code = ctypes.c_ulong()
+            ctypes.windll.kernel32.GetExitCodeProcess(handle, ctypes.byref(code))
+            return code.value == STILL_ACTIVE
+        finally:
+            ctypes.windll.kernel32.CloseHandle(handle)
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    except OSError:
+        return False
+    return True
+
+
+def read_owner(path: str) -> dict:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception:
+        return {}
+
+
+def is_stale(path: str, max_age: float = 3600) -> bool:
+    try:
+        age = time.time() - os.path.getmtime(path)
+    except OSError:
+        return False
+    owner = read_owner(path)
+    pid = int(owner.get("pid") or 0)
+    if pid and not pid_alive(pid):
+        return True
+    # 内容缺失（写入中途崩溃）或持有过久
+    if not pid and age > 5:
+        return True
+    return age > max_age
+
+
+def try_lock(path: str, max_age: float = 3600) -> bool:
+    for _ in range(2):
+        try:
+            fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            if is_stale(path, max_age):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+                continue
+            return False
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump({"pid": os.getpid(), "ts": time.time()}, f)
+        return True
+    return False
+
+
+def release(path: str) -> None:
+    owner = read_owner(path)
+    if owner and int(owner.get("pid") or 0) not in (0, os.getpid()):
+        return
+    try:
+        os.remove(path)
+    except OSError:
+        pass
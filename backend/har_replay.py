@@ -0,0 +1,240 @@
+import base64
+import gzip
+import hashlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+from datetime import datetime
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+# HAR 回放：debug_level=full 时录下的 app/debug/<查询目录>/<carrier>.har.gz 可以原样回放整个抓取流程（含弹窗与 JSF POST），
+# 所有请求都从 HAR 应答，不访问网络、不受限流影响，便于在本机反复复现与做性能分析。
+#   python backend/wanhai_tracking_playwright.py --number X --replay-har backend/app/debug/<查询目录>/wanhai.har.gz
+#   --replay-mode strict   用 Playwright 的 route_from_har：URL、方法、POST 内容必须一致，未命中直接 abort
+#   --replay-mode lenient  自行匹配：忽略 ViewState / 时间戳等易变参数，仍找不到时按“同方法同路径”的录制顺序应答
+# 回放时不读写结果缓存、不走 HTTP 快速通道、不用持久 profile、不读写会话状态，也不再录制 HAR。
+
+MODES = ("strict", "lenient")
+
+# lenient 模式下匹配时忽略的查询 / 表单参数（配置 replay_har_ignore 可追加）
+DEFAULT_IGNORE = [
+    "javax.faces.ViewState",
+    "javax.faces.ClientWindow",
+    "jsessionid",
+    "_",
+    "t",
+    "ts",
+    "timestamp",
+    "nocache",
+    "rnd",
+    "random",
+]
+
+# 回放时不能原样带回的响应头：内容已解码、长度由 fulfill 重新计算
+DROP_HEADERS = {"content-length", "content-encoding", "transfer-encoding", "connection", "keep-alive"}
+
+
+def log(msg: str) -> None:
+    ts = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    print(f"[har-replay] {ts} {msg}", file=sys.stderr, flush=True)
+
+
+def active(config: dict) -> bool:
+    return bool(config.get("replay_har"))
+
+
+def mode_of(config: dict) -> str:
+    mode = str(config.get("replay_har_mode") or "strict").lower()
+    return mode if mode in MODES else "strict"
+
+
+def _unpacked(path: str) -> str:
+    # 压缩保存的 HAR（.har.gz）解到临时目录；route_from_har 只认 .har / .zip
+    if not path.endswith(".gz"):
+        return path
+    st = os.stat(path)
+    key = hashlib.sha1(f"{path}|{st.st_mtime}|{st.st_size}".encode("utf-8")).hexdigest()[:12]
+    out = os.path.join(tempfile.gettempdir(), f"airsea-replay-{key}.har")
+    if not os.path.isfile(out):
+        tmp = out + f".{os.getpid()}.tmp"
+        with gzip.open(path, "rb") as src, open(tmp, "wb") as dst:
+            shutil.copyfileobj(src, dst, 1024 * 1024)
+        os.replace(tmp, out)
+    return out
+
+
+def prepare(config: dict) -> dict:
+    # 回放专用配置：结果来自录制，不能进缓存，也不能覆盖真实的会话状态
+    path = os.path.abspath(str(config["replay_har"]))
+    if not os.path.isfile(path):
+        raise FileNotFoundError(f"HAR not found: {path}")
+    path = _unpacked(path)
+    return dict(config, replay_har=path, refresh=True, storage_state=False,
+                http_fast_path=False, api_replay=False)
+
+
+def context_kwargs(config: dict) -> dict:
+    # Service Worker 发出的请求不经过 context.route，回放时禁用
+    return {"service_workers": "block"} if active(config) else {}
+
+
+class ReplayStats:
+    def __init__(self, carrier: str, mode: str, path: str):
+        self.carrier = carrier
+        self.mode = mode
+        self.path = path
+        self.exact = 0
+        self.loose = 0
+        self.by_path = 0
+        self.missed = 0
+        self.missed_urls: list[str] = []
+
+    def miss(self, method: str, url: str) -> None:
+        self.missed += 1
+        if len(self.missed_urls) < 20:
+            self.missed_urls.append(f"{method} {url}")
+
+    def as_dict(self) -> dict:
+        return {
+            "mode": self.mode,
+            "exact": self.exact,
+            "loose": self.loose,
+            "byPath": self.by_path,
+            "missed": self.missed,
+        }
+
+    def summary(self) -> str:
+        head = f"{self.carrier}: mode={self.mode} {os.path.basename(self.path)}"
+        if self.mode == "strict":
+            return f"{head} (matching done by route_from_har, misses aborted)"
+        text = f"{head} exact={self.exact} loose={self.loose} by_path={self.by_path} missed={self.missed}"
+        if self.missed_urls:
+            text += " missed: " + "; ".join(self.missed_urls[:5])
+        return text
+
+
+def _strip_params(pairs, ignore: set) -> list:
+    return sorted((k, v) for k, v in pairs if k not in ignore and k.lower() not in ignore)
+
+
+def _norm_url(url: str, ignore: set) -> str:
+    parts = urlsplit(url)
+    path = parts.path.split(";", 1)[0]  # ;jsessionid=...
+    query = urlencode(_strip_params(parse_qsl(parts.query, keep_blank_values=True), ignore))
+    return urlunsplit((parts.scheme, parts.netloc.lower(), path, query, ""))
+
+
+def _path_key(url: str) -> str:
+    parts = urlsplit(url)
+    return urlunsplit((parts.scheme, parts.netloc.lower(), parts.path.split(";", 1)[0], "", ""))
+
+
+def _norm_body(body: str | None, ignore: set) -> str:
+    body = body or ""
+    if not body or body.lstrip().startswith(("{", "[")) or "=" not in body:
+        return body
+    return urlencode(_strip_params(parse_qsl(body, keep_blank_values=True), ignore))
+
+
+class HarIndex:
+    # lenient 模式的匹配表：精确 → 忽略易变参数 → 同方法同路径，同一键按录制顺序依次应答，用完后重复最后一条
+    def __init__(self, path: str, ignore: set):
+        self.path = path
+        self.ignore = ignore
+        self.exact: dict = {}
+        self.loose: dict = {}
+        self.by_path: dict = {}
+        self._cursor: dict = {}
+        with open(path, "r", encoding="utf-8") as f:
+            har = json.load(f)
+        for entry in (har.get("log") or {}).get("entries") or []:
+            req = entry.get("request") or {}
+            resp = entry.get("response") or {}
+            if int(resp.get("status") or 0) <= 0:
+                continue  # 录制时被拦截或失败的请求
+            method = str(req.get("method") or "GET").upper()
+            url = req.get("url") or ""
+            body = ((req.get("postData") or {}).get("text")) or ""
+            self.exact.setdefault((method, url, body), []).append(entry)
+            self.loose.setdefault((method, _norm_url(url, ignore), _norm_body(body, ignore)), []).append(entry)
+            self.by_path.setdefault((method, _path_key(url)), []).append(entry)
+
+    def _next(self, table: str, key) -> dict | None:
+        entries = getattr(self, table).get(key)
+        if not entries:
+            return None
+        i = self._cursor.get((table, key), 0)
+        self._cursor[(table, key)] = i + 1
+        return entries[min(i, len(entries) - 1)]
+
+    def find(self, method: str, url: str, body: str | None) -> tuple[str | None, dict | None]:
+        method = method.upper()
+        for table, key in (
+            ("exact", (method, url, body or "")),
+            ("loose", (method, _norm_url(url, self.ignore), _norm_body(body, self.ignore))),
+            ("by_path", (method, _path_key(url))),
+        ):
+            entry = self._next(table, key)
+            if entry is not None:
+                return table, entry
+        return None, None
+
+    def response(self, entry: dict) -> tuple[int, dict, bytes]:
+        resp = entry.get("response") or {}
+        headers: dict = {}
+        for h in resp.get("headers") or []:
+            name = str(h.get("name") or "").lower()
+            if not name or name.startswith(":") or name in DROP_HEADERS:
+                continue
+            # 多个 Set-Cookie 用换行拼接，其余同名头用逗号
+            sep = "\n" if name == "set-cookie" else ", "
+            headers[name] = f"{headers[name]}{sep}{h.get('value')}" if name in headers else str(h.get("value"))
+        content = resp.get("content") or {}
+        if content.get("_file"):
+            with open(os.path.join(os.path.dirname(self.path), content["_file"]), "rb") as f:
+                body = f.read()
+        elif content.get("encoding") == "base64":
+            body = base64.b64decode(content.get("text") or "")
+        else:
+            body = (content.get("text") or "").encode("utf-8")
+        if "content-type" not in headers and content.get("mimeType"):
+            headers["content-type"] = content["mimeType"]
+        return int(resp.get("status") or 200), headers, body
+
+
+def install(context, carrier: str, config: dict) -> ReplayStats | None:
+    # 需在资源拦截之前注册：后注册的 route 先执行，拦截规则放行的请求经 fallback 落到这里
+    if not active(config):
+        return None
+    path = config["replay_har"]
+    mode = mode_of(config)
+    stats = ReplayStats(carrier, mode, path)
+    log(f"{carrier}: replaying {path} ({mode})")
+    if mode == "strict":
+        context.route_from_har(path, not_found="abort", update=False)
+    else:
+        index = HarIndex(path, set(DEFAULT_IGNORE) | set(config.get("replay_har_ignore") or []))
+
+        def handler(route):
+            req = route.request
+            try:
+                table, entry = index.find(req.method, req.url, req.post_data)
+                if entry is None:
+                    stats.miss(req.method, req.url)
+                    route.abort("internetdisconnected")
+                    return
+                setattr(stats, table, getattr(stats, table) + 1)
+                status, headers, body = index.response(entry)
+                route.fulfill(status=status, headers=headers, body=body)
+            except Exception:
+                # 页面关闭后 route 可能已失效
+                pass
+
+        context.route("**/*", handler)
+    try:
+        context.on("close", lambda _ctx: log(stats.summary()))
+    except Exception:
+        pass
+    return stats
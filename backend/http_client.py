@@ -0,0 +1,154 @@
+import json
+import os
+import re
+import sys
+import threading
+from datetime import datetime
+
+try:
+    import requests  # type: ignore
+    from requests.adapters import HTTPAdapter  # type: ignore
+except Exception:  # noqa: S110
+    requests = None
+    HTTPAdapter = None
+try:
+    from lxml import html as lxml_html  # type: ignore
+except Exception:  # noqa: S110
+    lxml_html = None
+
+# 纯 HTTP 快速通道的公共部分：按承运商复用 keep-alive 连接池与 cookie，
+# 识别 WAF 验证页，解析 HTML。依赖（requests / lxml）缺失时快速通道自动关闭，回退浏览器流程。
+
+COOKIE_DIR = os.path.join(os.path.dirname(__file__), "app", "userdata", "http")
+USER_AGENT = (
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+    "(KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
+)
+DEFAULT_HEADERS = {
+    "User-Agent": USER_AGENT,
+    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+    "Accept-Language": "en-US,en;q=0.9",
+}
+
+# WAF / 验证页特征（小写匹配）
+CHALLENGE_MARKERS = (
+    "captcha",
+    "cf-chl",
+    "challenge-platform",
+    "just a moment...",
+    "request rejected",
+    "access denied",
+    "_incapsula_resource",
+    "pardon our interruption",
+    "please enable javascript",
+)
+CHALLENGE_STATUS = (403, 429, 503)
+
+_sessions: dict = {}
+_lock = threading.Lock()
+
+
+def log(msg: str) -> None:
+    ts = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    print(f"[http] {ts} {msg}", file=sys.stderr, flush=True)
+
+
+def available() -> bool:
+    return requests is not None and lxml_html is not None
+
+
+def _cookie_path(name: str) -> str:
+    return os.path.join(COOKIE_DIR, f"{name}.json")
+
+
+def get_session(name: str):
+    with _lock:
+        sess = _sessions.get(name)
+        if sess is not None:
+            return sess
+        sess = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16, max_retries=0)
+        sess.mount("https://", adapter)
+        sess.mount("http://", adapter)
+        sess.headers.update(DEFAULT_HEADERS)
+        load_cookies(name, sess)
+        _sessions[name] = sess
+        return sess
+
+
+def load_cookies(name: str, sess) -> None:
+    try:
+        with open(_cookie_path(name), "r", encoding="utf-8") as f:
+            items = json.load(f)
+    except Exception:
+        return
+    for c in items or []:
+        try:
+            sess.cookies.set(c["name"], c["value"], domain=c.get("domain", ""), path=c.get("path", "/"))
+        except Exception:
+            continue
+
+
+def save_cookies(name: str) -> None:
+    sess = _sessions.get(name)
+    if sess is None:
+        return
+    items = [
+        {"name": c.name, "value": c.value, "domain": c.domain, "path": c.path, "expires": c.expires}
+        for c in sess.cookies
+    ]
+    try:
+        os.makedirs(COOKIE_DIR, exist_ok=True)
+        tmp = _cookie_path(name) + f".{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(items, f)
+        os.replace(tmp, _cookie_path(name))
+    except Exception as e:
+        log(f"{name}: save cookies failed: {e}")
+
+
+def import_cookies(name: str, items: list[dict]) -> None:
+    # 浏览器 context.cookies() 导出的 cookie 写入 HTTP 会话并落盘，供后续纯 HTTP 请求复用
+    sess = get_session(name)
+    for c in items or []:
+        try:
+            sess.cookies.set(c["name"], c["value"], domain=c.get("domain", ""), path=c.get("path", "/"))
+        except Exception:
+            continue
+    save_cookies(name)
+
+
+def looks_like_challenge(resp) -> bool:
+    if resp.status_code in CHALLENGE_STATUS:
+        return True
+    head = (resp.text or "")[:20000].lower()
+    return any(m in head for m in CHALLENGE_MARKERS)
+
+
+def parse_html(text: str):
+    return lxml_html.fromstring(text or "<html></html>")
+
+
+def norm_text(s: str | None) -> str:
+    return re.sub(r"\s+", " ", (s or "").replace("\u00A0", " ")).strip()
+
+
+def cell_text(el) -> str:
+    try:
+        return norm_text(el.text_content())
+    except Exception:
+        return ""
+
+
+def xpath_first_text(tree, xpath: str) -> str:
+    # 浏览器会自动补 <tbody>，原始 HTML 里通常没有；找不到时去掉 tbody 再试
+    for xp in (xpath, xpath.replace("/tbody", "")):
+        try:
+            found = tree.xpath(xp)
+        except Exception:
+            continue
+        for el in found:
+            txt = cell_text(el) if hasattr(el, "text_content") else norm_text(str(el))
+            if txt:
+                return txt
+    return ""
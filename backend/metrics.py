@@ -0,0 +1,380 @@
+import argparse
+import glob
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import file_lock
+
+# 分阶段耗时埋点：每次查询一个 Trace，Deadline.mark(stage) 即结束上一阶段、开始下一阶段，
+# 另有 span() 包住嵌套的单项耗时（Playwright 启动、浏览器启动、OCR 等待）。
+# 每个 span 一行 JSON 写入 app/metrics/spans-YYYYMMDD.jsonl：
+#   {"ts", "carrier", "stage", "outcome", "ms", "number_hash", "pid"}
+# 查询结束时整条查询记为 stage="lookup"（缓存命中记为 "cache_hit"），outcome 为结果 status（部分结果为 partial）。
+# Prometheus 导出从 JSONL 汇总（多进程一次性脚本也能统计到）。直方图与 _sum / _count 是累计值：
+# 导出时只读各 JSONL 新追加的行，累加到 app/metrics/totals.json，数值只增不减（旧文件被清理也不回退）；
+# 分位数（p50 / p95 / p99）取最近 --window-hours 内的 span。
+#   python backend/metrics.py --prom app/metrics/airsea.prom     # 写 textfile（node_exporter textfile collector）
+#   python backend/metrics.py --serve 127.0.0.1:9464            # /metrics 端点
+# 环境变量 AIRSEA_METRICS=0 关闭埋点。
+
+METRICS_DIR = os.path.join(os.path.dirname(__file__), "app", "metrics")
+ENABLED = os.environ.get("AIRSEA_METRICS", "1") != "0"
+BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+QUANTILES = (0.5, 0.95, 0.99)
+RETENTION_DAYS = 7
+
+_trace: ContextVar["Trace | None"] = ContextVar("airsea_trace", default=None)
+_write_lock = threading.Lock()
+_totals_lock = threading.Lock()
+
+
+def log(msg: str) -> None:
+    ts = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    print(f"[metrics] {ts} {msg}", file=sys.stderr, flush=True)
+
+
+def number_hash(number: str) -> str:
+    # 单号不落明文，只留短哈希便于关联同一单号的多次查询
+    return hashlib.sha1(str(number or "").strip().upper().encode("utf-8")).hexdigest()[:12]
+
+
+def _write(records: list[dict]) -> None:
+    if not ENABLED or not records:
+        return
+    path = os.path.join(METRICS_DIR, f"spans-{datetime.now():%Y%m%d}.jsonl")
+    data = "".join(json.dumps(r, ensure_ascii=False) + "\n" for r in records).encode("utf-8")
+    try:
+        with _write_lock:
+            os.makedirs(METRICS_DIR, exist_ok=True)
+            # 一次 write 写完整条查询的所有 span，多进程追加时不会交错
+            fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+            try:
+                os.write(fd, data)
+            finally:
+                os.close(fd)
+    except Exception as e:
+        log(f"write spans failed: {e}")
+
+
+def _record(carrier: str, stage: str, outcome: str, ms: float, nh: str = "") -> dict:
+    return {"ts": round(time.time(), 3), "carrier": carrier, "stage": stage, "outcome": outcome,
+            "ms": int(ms), "number_hash": nh, "pid": os.getpid()}
+
+
+class Trace:
+    def __init__(self, carrier: str, number: str):
+        self.carrier = carrier
+        self.nh = number_hash(number)
+        self.started = time.monotonic()
+        self.outcome = "ok"
+        self.cache_hit = False
+        self._stage: str | None = None
+        self._stage_t0 = 0.0
+        self.records: list[dict] = []
+
+    def add(self, stage: str, outcome: str, ms: float) -> None:
+        self.records.append(_record(self.carrier, stage, outcome, ms, self.nh))
+
+    def stage(self, name: str) -> None:
+        now = time.monotonic()
+        if self._stage is not None:
+            self.add(self._stage, "ok", (now - self._stage_t0) * 1000)
+        self._stage = name
+        self._stage_t0 = now
+
+    def result(self, out) -> None:
+        # 以查询结果确定 outcome：status，部分结果记为 partial
+        if not isinstance(out, dict):
+            return
+        self.outcome = "partial" if out.get("partial") else str(out.get("status") or "error")
+        self.cache_hit = bool(out.get("cache")) and out.get("cache") != "stale"
+
+    def finish(self, outcome: str | None = None) -> None:
+        outcome = outcome or self.outcome
+        now = time.monotonic()
+        if self._stage is not None:
+            # 最后一个阶段的结果就是整次查询的结果（超时 / 出错都停在这一步）
+            self.add(self._stage, outcome, (now - self._stage_t0) * 1000)
+            self._stage = None
+        self.add("cache_hit" if self.cache_hit else "lookup", outcome, (now - self.started) * 1000)
+        _write(self.records)
+        self.records = []
+
+
+def current() -> "Trace | None":
+    return _trace.get()
+
+
+@contextmanager
+def lookup(carrier: str, number: str):
+    # 包住一次查询；嵌套调用（dispatch → provider）沿用外层同一承运商的 Trace
+    outer = _trace.get()
+    if outer is not None and outer.carrier == carrier:
+        yield outer
+        return
+    trace = Trace(carrier, number)
+    token = _trace.set(trace)
+    try:
+        yield trace
+    except BaseException as e:
+        trace.finish("cancelled" if type(e).__name__ in ("Cancelled", "CancelledError", "KeyboardInterrupt") else "error")
+        raise
+    else:
+        trace.finish()
+    finally:
+        _trace.reset(token)
+
+
+def stage(name: str) -> None:
+    # 由 Deadline.mark 调用；不在查询中时忽略
+    trace = _trace.get()
+    if trace is not None:
+        trace.stage(name)
+
+
+@contextmanager
+def span(name: str):
+    # 嵌套的单项耗时，不影响阶段划分；不在查询中时（例如常驻进程预热浏览器）直接写出
+    trace = _trace.get()
+    t0 = time.monotonic()
+    outcome = "ok"
+    try:
+        yield
+    except BaseException as e:
+        outcome = "cancelled" if type(e).__name__ in ("Cancelled", "CancelledError", "KeyboardInterrupt") else \
+            ("timeout" if "Timeout" in type(e).__name__ else "error")
+        raise
+    finally:
+        ms = (time.monotonic() - t0) * 1000
+        if trace is not None:
+            trace.add(name, outcome, ms)
+        else:
+            _write([_record("", name, outcome, ms)])
+
+
+# ---- 导出 ----
+def read_spans(window_hours: float = 24.0) -> list[dict]:
+    since = time.time() - window_hours * 3600
+    days = int(window_hours // 24) + 1
+    names = {f"spans-{datetime.now() - timedelta(days=d):%Y%m%d}.jsonl" for d in range(days + 1)}
+    out = []
+    for name in sorted(names):
+        try:
+            with open(os.path.join(METRICS_DIR, name), "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        r = json.loads(line)
+                    except ValueError:
+                        continue
+                    if float(r.get("ts", 0)) >= since:
+                        out.append(r)
+        except OSError:
+            continue
+    return out
+
+
+def prune(days: int = RETENTION_DAYS) -> int:
+    cutoff = time.time() - days * 86400
+    removed = 0
+    for path in glob.glob(os.path.join(METRICS_DIR, "spans-*.jsonl")):
+        try:
+            if os.path.getmtime(path) < cutoff:
+                os.remove(path)
+                removed += 1
+        except OSError:
+            pass
+    return removed
+
+
+def _series_key(carrier: str, stg: str, outcome: str) -> str:
+    return f"{carrier}\t{stg}\t{outcome}"
+
+
+def _read_totals(path: str) -> dict:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("buckets") == list(BUCKETS):
+            return data
+    except (OSError, ValueError):
+        pass
+    return {"buckets": list(BUCKETS), "files": {}, "series": {}}
+
+
+def _accumulate(totals: dict) -> None:
+    # 把各 JSONL 文件 offset 之后的完整行累加进 totals
+    files = totals["files"]
+    series = totals["series"]
+    present = set()
+    for path in sorted(glob.glob(os.path.join(METRICS_DIR, "spans-*.jsonl"))):
+        name = os.path.basename(path)
+        present.add(name)
+        offset = int(files.get(name, 0))
+        try:
+            if os.path.getsize(path) < offset:
+                offset = 0  # 文件被截断或重建
+            with open(path, "rb") as f:
+                f.seek(offset)
+                data = f.read()
+        except OSError:
+            continue
+        end = data.rfind(b"\n") + 1  # 只处理完整的行，写了一半的留到下次
+        for line in data[:end].splitlines():
+            try:
+                r = json.loads(line)
+            except ValueError:
+                continue
+            sec = float(r.get("ms", 0)) / 1000.0
+            key = _series_key(r.get("carrier") or "", r.get("stage") or "", r.get("outcome") or "")
+            s = series.setdefault(key, {"bucket": [0] * len(BUCKETS), "count": 0, "sum": 0.0})
+            for i, le in enumerate(BUCKETS):
+                if sec <= le:
+                    s["bucket"][i] += 1
+            s["count"] += 1
+            s["sum"] += sec
+        files[name] = offset + end
+    for name in list(files):
+        if name not in present:
+            del files[name]  # 已被 prune 删除，累计值保留
+
+
+def update_totals() -> dict:
+    # 多个导出进程（textfile 定时任务、/metrics 端点）共用同一份累计值，用锁文件串行更新
+    path = os.path.join(METRICS_DIR, "totals.json")
+    lock = path + ".lock"
+    with _totals_lock:
+        totals = _read_totals(path)
+        for _ in range(50):
+            if file_lock.try_lock(lock, max_age=60):
+                break
+            time.sleep(0.05)
+        else:
+            return totals  # 另一个导出进程正在更新：本次沿用已保存的值，仍然单调
+        try:
+            totals = _read_totals(path)
+            _accumulate(totals)
+            os.makedirs(METRICS_DIR, exist_ok=True)
+            tmp = path + f".{os.getpid()}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(totals, f)
+            os.replace(tmp, path)
+        except Exception as e:
+            log(f"update totals failed: {e}")
+        finally:
+            file_lock.release(lock)
+        return totals
+
+
+def _quantile(values: list[float], q: float) -> float:
+    # values 已排序；最近秩法
+    if not values:
+        return 0.0
+    idx = min(len(values) - 1, max(0, int(q * len(values) + 0.999999) - 1))
+    return values[idx]
+
+
+def _labels(**kv) -> str:
+    return "{" + ",".join(f'{k}="{str(v).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"'
+                          for k, v in kv.items()) + "}"
+
+
+def render_prometheus(spans: list[dict], totals: dict) -> str:
+    # totals：update_totals() 的累计值（直方图、_sum、_count 单调递增）；spans：窗口内的 span，只用于分位数
+    lines = [
+        "# HELP airsea_stage_duration_seconds Scraper stage duration.",
+        "# TYPE airsea_stage_duration_seconds histogram",
+    ]
+    by_stage_total: dict[tuple, list] = {}
+    for key, s in sorted(totals.get("series", {}).items()):
+        carrier, stg, outcome = key.split("\t")
+        for le, n in zip(BUCKETS, s["bucket"]):
+            lines.append(f"airsea_stage_duration_seconds_bucket{_labels(carrier=carrier, stage=stg, outcome=outcome, le=le)} {n}")
+        lines.append(f"airsea_stage_duration_seconds_bucket{_labels(carrier=carrier, stage=stg, outcome=outcome, le='+Inf')} {s['count']}")
+        lines.append(f"airsea_stage_duration_seconds_sum{_labels(carrier=carrier, stage=stg, outcome=outcome)} {s['sum']:.3f}")
+        lines.append(f"airsea_stage_duration_seconds_count{_labels(carrier=carrier, stage=stg, outcome=outcome)} {s['count']}")
+        t = by_stage_total.setdefault((carrier, stg), [0.0, 0])
+        t[0] += s["sum"]
+        t[1] += s["count"]
+
+    by_stage: dict[tuple, list[float]] = {}
+    for r in spans:
+        by_stage.setdefault((r.get("carrier") or "", r.get("stage") or ""), []).append(float(r.get("ms", 0)) / 1000.0)
+    lines += [
+        "# HELP airsea_stage_latency_seconds Scraper stage latency quantiles over the export window.",
+        "# TYPE airsea_stage_latency_seconds summary",
+    ]
+    for (carrier, stg), (total_sum, total_count) in sorted(by_stage_total.items()):
+        values = sorted(by_stage.get((carrier, stg)) or [])
+        if values:
+            for q in QUANTILES:
+                lines.append(f"airsea_stage_latency_seconds{_labels(carrier=carrier, stage=stg, quantile=q)} {_quantile(values, q):.3f}")
+        lines.append(f"airsea_stage_latency_seconds_sum{_labels(carrier=carrier, stage=stg)} {total_sum:.3f}")
+        lines.append(f"airsea_stage_latency_seconds_count{_labels(carrier=carrier, stage=stg)} {total_count}")
+    return "\n".join(lines) + "\n"
+
+
+def export_text(window_hours: float = 24.0) -> str:
+    return render_prometheus(read_spans(window_hours), update_totals())
+
+
+def write_prometheus(path: str, window_hours: float = 24.0) -> None:
+    text = export_text(window_hours)
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp = path + f".{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp, path)
+
+
+def serve(addr: str, window_hours: float = 24.0) -> None:
+    host, _, port = addr.rpartition(":")
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = export_text(window_hours).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, fmt, *args):
+            pass
+
+    server = ThreadingHTTPServer((host or "127.0.0.1", int(port)), Handler)
+    log(f"serving /metrics on {host or '127.0.0.1'}:{port}")
+    server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export scraper stage timings in Prometheus text format")
+    parser.add_argument("--prom", default=None, metavar="FILE", help="write a Prometheus textfile")
+    parser.add_argument("--serve", default=None, metavar="HOST:PORT", help="serve /metrics over HTTP")
+    parser.add_argument("--window-hours", type=float, default=24.0, help="window for the p50/p95/p99 quantiles")
+    args = parser.parse_args()
+
+    prune()
+    if args.serve:
+        serve(args.serve, args.window_hours)
+        return 0
+    if args.prom:
+        write_prometheus(args.prom, args.window_hours)
+        log(f"wrote {args.prom}")
+        return 0
+    sys.stdout.write(export_text(args.window_hours))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
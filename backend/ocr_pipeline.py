@@ -0,0 +1,121 @@
+import atexit
+import io
+import os
+import re
+import sys
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from datetime import datetime
+
+try:
+    import pytesseract  # type: ignore
+    from PIL import Image  # type: ignore
+except Exception:  # noqa: S110
+    pytesseract = None
+    Image = None
+
+# OCR 兜底流水线：
+#   截图只在内存中传递（PNG bytes），优先截 ETA 所在行的元素区域，
+#   Tesseract 在独立进程池中执行（限定 --psm 与字符白名单），抓取线程不被阻塞。
+# 进程池大小：环境变量 AIRSEA_OCR_WORKERS（默认 2）
+
+OCR_WORKERS = int(os.environ.get("AIRSEA_OCR_WORKERS", "2"))
+CHAR_WHITELIST = "ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-/.:()"
+# 元素截图只含一行文字：psm 6（单一文本块）；整页兜底用 psm 3（自动分版）
+ROW_CONFIG = f"--psm 6 -c tessedit_char_whitelist={CHAR_WHITELIST}"
+PAGE_CONFIG = f"--psm 3 -c tessedit_char_whitelist={CHAR_WHITELIST}"
+
+DATE_RE = r"(\d{4}[\/-]\d{1,2}[\/-]\d{1,2}|[A-Z]{3}[\-\s]\d{1,2}[\-\s]\d{4}|\d{1,2}[\-\s][A-Z]{3}[\-\s]\d{4})"
+
+# 返回 ETA 标签所在的 <tr>（找不到返回 null），与 SCAN_ETA_JS 使用同一组标签
+ETA_ROW_JS = """
+() => {
+  const norm = s => (s||'').replace(/\\u00A0/g,' ').replace(/\\s+/g,' ').trim().toUpperCase();
+  const labels = ['ESTIMATED ARRIVAL DATE','EST. ARRIVAL DATE','EST ARRIVAL DATE','ETA'];
+  for (const td of document.querySelectorAll('td')) {
+    if (labels.includes(norm(td.textContent)) && td.nextElementSibling) {
+      return td.closest('tr') || td;
+    }
+  }
+  return null;
+}
+"""
+
+_pool: ProcessPoolExecutor | None = None
+_lock = threading.Lock()
+
+
+def log(msg: str) -> None:
+    ts = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    print(f"[ocr] {ts} {msg}", file=sys.stderr, flush=True)
+
+
+def available() -> bool:
+    return pytesseract is not None and Image is not None
+
+
+def _ocr_png(data: bytes, config: str) -> str:
+    # 子进程中执行：小图放大 2 倍再识别，单行文字的准确率明显更高
+    img = Image.open(io.BytesIO(data)).convert("L")
+    if img.height < 80:
+        img = img.resize((img.width * 2, img.height * 2))
+    return pytesseract.image_to_string(img, lang="eng", config=config)
+
+
+def get_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=max(1, OCR_WORKERS))
+            atexit.register(shutdown)
+        return _pool
+
+
+def shutdown(kill: bool = False) -> None:
+    # kill=True：查询被取消时直接结束正在识别的子进程，否则退出时还要等 tesseract 跑完
+    global _pool
+    with _lock:
+        pool, _pool = _pool, None
+    if pool is None:
+        return
+    procs = list((getattr(pool, "_processes", None) or {}).values()) if kill else []
+    pool.shutdown(wait=False, cancel_futures=True)
+    for p in procs:
+        try:
+            p.terminate()
+        except Exception:
+            pass
+
+
+def submit(data: bytes, clipped: bool = True) -> Future:
+    return get_pool().submit(_ocr_png, data, ROW_CONFIG if clipped else PAGE_CONFIG)
+
+
+def extract_eta(text: str | None, clipped: bool = False) -> str | None:
+    # clipped：文本来自 ETA 行的元素截图（screenshot_eta_region 返回的第二项）
+    if not text:
+        return None
+    m = re.search(r"ESTIMATED\s*ARRIVAL\s*DATE[^\n\r]*?" + DATE_RE, text, flags=re.I)
+    if not m:
+        m = re.search(r"ETA[^\n\r]*?" + DATE_RE, text, flags=re.I)
+    if not m and clipped:
+        # 元素截图里标签可能被识别残缺，直接取第一个日期；整页截图的第一个日期可能是 ETD / 其它节点，不能这样取
+        m = re.search(DATE_RE, text, flags=re.I)
+    return m.group(1) if m else None
+
+
+def screenshot_eta_region(page) -> tuple[bytes | None, bool]:
+    # 返回 (png, 是否为元素截图)；主文档与 frame 都找不到 ETA 行时退回整页
+    for fr in [page.main_frame] + [f for f in page.frames if f is not page.main_frame]:
+        try:
+            handle = fr.evaluate_handle(ETA_ROW_JS)
+            el = handle.as_element()
+            if el is not None:
+                return el.screenshot(), True
+        except Exception:
+            continue
+    try:
+        return page.screenshot(full_page=True), False
+    except Exception as e:
+        log(f"page screenshot failed: {e}")
+        return None, False
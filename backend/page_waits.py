@@ -0,0 +1,191 @@
+import sys
+import time
+from datetime import datetime
+
+from playwright.sync_api import TimeoutError as PlaywrightTimeoutError
+
+# 事件驱动的等待工具：目标就绪即返回，取代固定 sleep 与轮询循环。
+#   JsfActivity          监听 JSF 局部刷新请求（Faces-Request: partial/ajax），等到全部返回
+#   wait_loaders_hidden  等加载遮罩（PrimeFaces blockUI / spinner）消失
+#   wait_for_dom_value   页面内注入 MutationObserver，扫描脚本有结果时立即 resolve
+#   wait_for_page        等 URL 含指定片段的新窗口（含 window.open 打开的页面）
+# 各函数超时都不抛异常，返回空值由调用方决定后续兜底。
+
+LOADER_SELECTORS = (
+    ".ui-widget-overlay", ".ui-blockui", ".ui-blockui-content", ".blockUI",
+    ".loading", ".spinner", ".fa-spinner", 'img[src*="loading"]',
+)
+
+LOADERS_HIDDEN_JS = """
+(sels) => {
+  const visible = el => el && !!(el.offsetParent);
+  return !sels.some(s => Array.from(document.querySelectorAll(s)).some(visible));
+}
+"""
+
+# 扫描脚本有结果或超时（返回 ''）时 resolve；直接拼接源码，避免 eval 受页面 CSP 限制
+DOM_WATCH_TEMPLATE = """
+(timeoutMs) => new Promise(resolve => {
+  const scan = %s;
+  const tryScan = () => { try { return scan() || ''; } catch (e) { return ''; } };
+  const first = tryScan();
+  if (first) { resolve(first); return; }
+  let done = false;
+  const finish = v => { if (done) return; done = true; obs.disconnect(); clearTimeout(timer); resolve(v); };
+  const obs = new MutationObserver(() => { const v = tryScan(); if (v) finish(v); });
+  obs.observe(document.documentElement || document, {childList: true, subtree: true, characterData: true});
+  const timer = setTimeout(() => finish(''), timeoutMs);
+})
+"""
+
+
+def log(msg: str) -> None:
+    ts = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    print(f"[waits] {ts} {msg}", file=sys.stderr, flush=True)
+
+
+def is_jsf_partial(request) -> bool:
+    try:
+        return (request.headers or {}).get("faces-request", "").lower() == "partial/ajax"
+    except Exception:
+        return False
+
+
+class JsfActivity:
+    # 挂在 context 上，覆盖之后新开的所有窗口
+    def __init__(self, context):
+        self.context = context
+        self.inflight = set()
+        context.on("request", self._on_request)
+        context.on("requestfinished", self._on_done)
+        context.on("requestfailed", self._on_done)
+
+    def _on_request(self, request) -> None:
+        if is_jsf_partial(request):
+            self.inflight.add(request)
+
+    def _on_done(self, request) -> None:
+        self.inflight.discard(request)
+
+    def wait_idle(self, timeout_ms: int = 10000) -> bool:
+        deadline = time.monotonic() + timeout_ms / 1000
+        while self.inflight:
+            remaining = int((deadline - time.monotonic()) * 1000)
+            if remaining <= 0:
+                log(f"JSF partial requests still pending: {len(self.inflight)}")
+                return False
+            try:
+                # requestfailed 不会触发 requestfinished，按小段等待再复查
+                self.context.wait_for_event("requestfinished", timeout=min(remaining, 1000))
+            except PlaywrightTimeoutError:
+                continue
+            except Exception:
+                break
+        return True
+
+
+def wait_loaders_hidden(page, timeout_ms: int = 12000) -> bool:
+    try:
+        page.wait_for_function(LOADERS_HIDDEN_JS, arg=list(LOADER_SELECTORS), polling="raf", timeout=timeout_ms)
+        return True
+    except Exception:
+        return False
+
+
+def _frames(page):
+    return [page.main_frame] + [f for f in page.frames if f is not page.main_frame]
+
+
+def _is_navigation_error(e: Exception) -> bool:
+    msg = str(e).lower()
+    return "context was destroyed" in msg or "navigat" in msg
+
+
+def wait_for_dom_value(page, scan_js: str, timeout_ms: int = 15000) -> str:
+    # 主文档内等待（页面中途跳转则在新文档上继续）；超时后再对各 frame 扫一次
+    watch_js = DOM_WATCH_TEMPLATE % scan_js.strip()
+    deadline = time.monotonic() + timeout_ms / 1000
+    while True:
+        remaining = int((deadline - time.monotonic()) * 1000)
+        if remaining <= 0:
+            break
+        try:
+            val = page.evaluate(watch_js, remaining)
+            if val:
+                return val
+            break
+        except Exception as e:
+            if not _is_navigation_error(e):
+                log(f"dom watch failed: {e}")
+                break
+            try:
+                page.wait_for_load_state("domcontentloaded", timeout=max(1, remaining))
+            except Exception:
+                pass
+    for fr in _frames(page)[1:]:
+        try:
+            val = fr.evaluate(scan_js)
+            if val:
+                return val
+        except Exception:
+            continue
+    return ""
+
+
+def wait_for_page(context, url_part: str, timeout_ms: int = 12000):
+    deadline = time.monotonic() + timeout_ms / 1000
+    while True:
+        for p in context.pages:
+            if url_part in (p.url or ""):
+                return p
+        remaining = int((deadline - time.monotonic()) * 1000)
+        if remaining <= 0:
+            return None
+        try:
+            # 新窗口先是 about:blank，再导航到目标地址
+            p = context.wait_for_event("page", timeout=remaining)
+            p.wait_for_url(lambda u: url_part in u, wait_until="commit", timeout=max(1, remaining))
+            return p
+        except PlaywrightTimeoutError:
+            continue
+        except Exception:
+            continue
+
+
+# ---- 异步版本（async_engine 使用）----
+async def async_wait_loaders_hidden(page, timeout_ms: int = 12000) -> bool:
+    try:
+        await page.wait_for_function(LOADERS_HIDDEN_JS, arg=list(LOADER_SELECTORS), polling="raf", timeout=timeout_ms)
+        return True
+    except Exception:
+        return False
+
+
+async def async_wait_for_dom_value(page, scan_js: str, timeout_ms: int = 15000) -> str:
+    watch_js = DOM_WATCH_TEMPLATE % scan_js.strip()
+    deadline = time.monotonic() + timeout_ms / 1000
+    while True:
+        remaining = int((deadline - time.monotonic()) * 1000)
+        if remaining <= 0:
+            break
+        try:
+            val = await page.evaluate(watch_js, remaining)
+            if val:
+                return val
+            break
+        except Exception as e:
+            if not _is_navigation_error(e):
+                log(f"dom watch failed: {e}")
+                break
+            try:
+                await page.wait_for_load_state("domcontentloaded", timeout=max(1, remaining))
+            except Exception:
+                pass
+    for fr in _frames(page)[1:]:
+        try:
+            val = await fr.evaluate(scan_js)
+            if val:
+                return val
+        except Exception:
+            continue
+    return ""
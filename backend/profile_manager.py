@@ -0,0 +1,255 @@
+import os
+import re
+import shutil
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+
+import file_lock
+
+# Profile 管理：每个承运商维护一个“golden”热身 profile（HTTP 缓存、cookie 已就绪），
+# 每个 worker 借用它的一份写时复制克隆；用完归还到池中复用，后台清理陈旧目录。
+#
+# 目录结构：<user_data_dir>/<carrier>/
+#   golden/              热身后的模板 profile
+#   clones/clone_xxx/    克隆（clone_xxx.lock 表示正在被某进程使用）
+#   session_*            旧版脚本每次运行遗留的会话目录，由 gc() 清理
+
+DEFAULT_ROOT = os.path.join(os.path.dirname(__file__), "app", "userdata")
+# 配置中的 Windows 盘符路径（如 D:/AirSea/...）在其他系统上会被当成相对路径，改用 DEFAULT_ROOT
+_DRIVE_PATH = re.compile(r"^[A-Za-z]:[\\/]")
+# Chromium 的单实例锁文件，复制后必须删除，否则克隆无法启动
+SINGLETON_FILES = ("SingletonLock", "SingletonSocket", "SingletonCookie", "lockfile")
+
+
+def log(msg: str) -> None:
+    ts = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    print(f"[profile] {ts} {msg}", file=sys.stderr, flush=True)
+
+
+def _dir_mtime(path: str) -> float:
+    try:
+        return os.path.getmtime(path)
+    except OSError:
+        return 0.0
+
+
+def resolve_root(path: str | None) -> str:
+    if not path:
+        return DEFAULT_ROOT
+    if os.name != "nt" and _DRIVE_PATH.match(path):
+        return DEFAULT_ROOT
+    return os.path.abspath(os.path.expanduser(path))
+
+
+def _copy_tree(src: str, dst: str) -> None:
+    # 优先走文件系统的 reflink（btrfs/xfs/APFS 上几乎零成本），不支持时退回普通复制
+    if os.path.isdir(src):
+        cmd = None
+        if sys.platform.startswith("linux"):
+            cmd = ["cp", "-a", "--reflink=auto", src, dst]
+        elif sys.platform == "darwin":
+            cmd = ["cp", "-cR", src, dst]
+        if cmd:
+            try:
+                subprocess.run(cmd, check=True, capture_output=True)
+            except Exception:
+                shutil.rmtree(dst, ignore_errors=True)
+                cmd = None
+        if not cmd:
+            shutil.copytree(src, dst, ignore=shutil.ignore_patterns(*SINGLETON_FILES), dirs_exist_ok=True)
+    else:
+        os.makedirs(dst, exist_ok=True)
+    for name in SINGLETON_FILES:
+        try:
+            os.remove(os.path.join(dst, name))
+        except OSError:
+            pass
+
+
+class ProfileManager:
+    def __init__(self, carrier: str, root: str | None = None, seed_from: str | None = None,
+                 max_idle: int = 4, refresh_golden_sec: int = 6 * 3600,
+                 session_max_age_sec: int = 3600, clone_max_age_sec: int = 24 * 3600):
+        self.carrier = carrier
+        self.base = os.path.join(resolve_root(root), carrier)
+        self.golden = os.path.join(self.base, "golden")
+        self.clones = os.path.join(self.base, "clones")
+        self.seed_from = seed_from
+        self.max_idle = max_idle
+        self.refresh_golden_sec = refresh_golden_sec
+        self.session_max_age_sec = session_max_age_sec
+        self.clone_max_age_sec = clone_max_age_sec
+        os.makedirs(self.clones, exist_ok=True)
+
+    def _ensure_golden(self) -> None:
+        if os.path.isdir(self.golden):
+            return
+        if self.seed_from and os.path.isdir(self.seed_from):
+            log(f"{self.carrier}: seed golden profile from {self.seed_from}")
+            _copy_tree(self.seed_from, self.golden)
+        else:
+            os.makedirs(self.golden, exist_ok=True)
+
+    def _golden_is_cold(self) -> bool:
+        try:
+            return not os.listdir(self.golden)
+        except OSError:
+            return True
+
+    def _idle_clones(self) -> list[str]:
+        out = []
+        try:
+            names = sorted(os.listdir(self.clones))
+        except OSError:
+            return out
+        for name in names:
+            path = os.path.join(self.clones, name)
+            if name.startswith("clone_") and os.path.isdir(path) and not os.path.exists(path + ".lock"):
+                out.append(path)
+        return out
+
+    def acquire(self) -> str:
+        # 先复用空闲克隆（保留了上次的缓存），否则从 golden 新克隆一份
+        for path in self._idle_clones():
+            if file_lock.try_lock(path + ".lock"):
+                if os.path.isdir(path):
+                    log(f"{self.carrier}: reuse clone {os.path.basename(path)}")
+                    return path
+                file_lock.release(path + ".lock")
+        self._ensure_golden()
+        path = os.path.join(self.clones, f"clone_{uuid.uuid4().hex[:12]}")
+        file_lock.try_lock(path + ".lock")
+        t0 = time.time()
+        _copy_tree(self.golden, path)
+        log(f"{self.carrier}: cloned golden -> {os.path.basename(path)} in {int((time.time() - t0) * 1000)}ms")
+        return path
+
+    def release(self, path: str, ok: bool = True) -> None:
+        if ok and (self._golden_is_cold() or time.time() - _dir_mtime(self.golden) > self.refresh_golden_sec):
+            self.promote_golden(path)
+        if not ok or len(self._idle_clones()) >= self.max_idle:
+            # 失败的克隆可能带着坏状态（验证页、损坏缓存），直接丢弃
+            shutil.rmtree(path, ignore_errors=True)
+        else:
+            try:
+                os.utime(path, None)
+            except OSError:
+                pass
+        file_lock.release(path + ".lock")
+
+    def promote_golden(self, path: str) -> None:
+        lock = os.path.join(self.base, "golden.lock")
+        if not file_lock.try_lock(lock, max_age=600):
+            return
+        try:
+            tmp = os.path.join(self.base, f"golden_{uuid.uuid4().hex[:8]}.tmp")
+            old = os.path.join(self.base, f"golden_{uuid.uuid4().hex[:8]}.old")
+            _copy_tree(path, tmp)
+            if os.path.isdir(self.golden):
+                os.replace(self.golden, old)
+            os.replace(tmp, self.golden)
+            shutil.rmtree(old, ignore_errors=True)
+            log(f"{self.carrier}: golden profile refreshed from {os.path.basename(path)}")
+        except Exception as e:
+            log(f"{self.carrier}: golden refresh failed: {e}")
+        finally:
+            file_lock.release(lock)
+
+    def gc(self) -> int:
+        removed = 0
+        now = time.time()
+        try:
+            names = os.listdir(self.base)
+        except OSError:
+            names = []
+        for name in names:
+            path = os.path.join(self.base, name)
+            stale_session = name.startswith("session_") and now - _dir_mtime(path) > self.session_max_age_sec
+            leftover = (name.endswith(".tmp") or name.endswith(".old")) and now - _dir_mtime(path) > 600
+            if os.path.isdir(path) and (stale_session or leftover):
+                shutil.rmtree(path, ignore_errors=True)
+                removed += 1
+        idle = self._idle_clones()
+        for i, path in enumerate(idle):
+            too_many = i >= self.max_idle
+            if too_many or now - _dir_mtime(path) > self.clone_max_age_sec:
+                if file_lock.try_lock(path + ".lock"):
+                    shutil.rmtree(path, ignore_errors=True)
+                    file_lock.release(path + ".lock")
+                    removed += 1
+        # 持有者已退出的克隆：锁和目录一起回收
+        try:
+            for name in os.listdir(self.clones):
+                lock = os.path.join(self.clones, name)
+                if name.endswith(".lock") and file_lock.is_stale(lock):
+                    shutil.rmtree(lock[:-len(".lock")], ignore_errors=True)
+                    file_lock.release(lock)
+                    try:
+                        os.remove(lock)
+                    except OSError:
+                        pass
+                    removed += 1
+        except OSError:
+            pass
+        if removed:
+            log(f"{self.carrier}: gc removed {removed} stale profile dirs")
+        return removed
+
+    def start_background_gc(self, interval_sec: float | None = None) -> threading.Thread:
+        # interval 为空时只跑一轮（一次性脚本），否则周期运行（常驻进程）
+        def run():
+            while True:
+                try:
+                    self.gc()
+                except Exception as e:
+                    log(f"{self.carrier}: gc error: {e}")
+                if not interval_sec:
+                    return
+                time.sleep(interval_sec)
+        t = threading.Thread(target=run, name=f"profile-gc-{self.carrier}", daemon=True)
+        t.start()
+        return t
+
+
+class ProfileLease:
+    def __init__(self, path: str | None):
+        self.path = path
+        self.ok = False
+
+
+_MANAGERS: dict = {}
+_MANAGERS_LOCK = threading.Lock()
+
+
+def get_manager(carrier: str, root: str | None = None, seed_from: str | None = None) -> ProfileManager:
+    # 每个承运商（及 profile 根目录）一个，首次使用时创建并跑一轮后台清理
+    key = (carrier, resolve_root(root))
+    with _MANAGERS_LOCK:
+        manager = _MANAGERS.get(key)
+        if manager is None:
+            manager = _MANAGERS[key] = ProfileManager(carrier, root=key[1], seed_from=seed_from)
+            log(f"{carrier}: profiles under {manager.base}")
+            manager.start_background_gc()
+        return manager
+
+
+@contextmanager
+def profile_lease(carrier: str, config: dict, seed_from: str | None = None):
+    # profile_mode: "ephemeral"（默认，浏览器池中的临时 context）或 "clone"（借用 golden 的克隆）
+    mode = str(config.get("profile_mode") or "ephemeral").lower()
+    if mode != "clone":
+        # 临时 context 不需要 profile 目录，也不创建 manager
+        yield ProfileLease(None)
+        return
+    manager = get_manager(carrier, config.get("user_data_dir") or None, seed_from)
+    lease = ProfileLease(manager.acquire())
+    try:
+        yield lease
+    finally:
+        if lease.path:
+            manager.release(lease.path, ok=lease.ok)
@@ -0,0 +1,157 @@
+import fnmatch
+import os
+import sys
+from datetime import datetime
+
+# 基于 context.route 的资源拦截：图片、字体、媒体以及统计/广告脚本直接 abort，
+# 页面更快进入可读状态，也省带宽。规则来自各承运商 JSON 配置的 "resource_blocking"：
+#   {"mode": "default" | "strict" | "off", "allow": [...], "deny": [...]}
+# allow / deny 为 URL 通配（fnmatch），也可以是普通子串；allow 优先于一切拦截规则。
+
+MODE_ENV = "AIRSEA_BLOCKING_MODE"
+
+BLOCK_TYPES = {
+    "off": set(),
+    "default": {"image", "media", "font"},
+    # strict 额外拦截 CSS；依赖样式判断可见性的页面需谨慎
+    "strict": {"image", "media", "font", "stylesheet"},
+}
+
+DEFAULT_DENY = [
+    "*google-analytics.com*",
+    "*googletagmanager.com*",
+    "*doubleclick.net*",
+    "*googlesyndication.com*",
+    "*googleadservices.com*",
+    "*connect.facebook.net*",
+    "*facebook.com/tr*",
+    "*hotjar.com*",
+    "*clarity.ms*",
+    "*bat.bing.com*",
+    "*snap.licdn.com*",
+    "*mc.yandex.ru*",
+    "*cdn.onesignal.com*",
+]
+
+# 验证码图片等必须放行
+DEFAULT_ALLOW = ["*captcha*", "*challenge*"]
+
+# 被拦截的请求拿不到真实大小，按资源类型估算
+EST_BYTES = {
+    "image": 40_000,
+    "media": 300_000,
+    "font": 60_000,
+    "stylesheet": 25_000,
+    "script": 60_000,
+}
+
+
+def log(msg: str) -> None:
+    ts = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    print(f"[block] {ts} {msg}", file=sys.stderr, flush=True)
+
+
+def _match(url: str, patterns) -> bool:
+    for pat in patterns or []:
+        if not pat:
+            continue
+        if any(ch in pat for ch in "*?[") and fnmatch.fnmatch(url, pat):
+            return True
+        if pat in url:
+            return True
+    return False
+
+
+class BlockStats:
+    def __init__(self, carrier: str, mode: str):
+        self.carrier = carrier
+        self.mode = mode
+        self.allowed = 0
+        self.blocked = 0
+        self.blocked_bytes_est = 0
+        self.by_type: dict[str, int] = {}
+
+    def record(self, resource_type: str) -> None:
+        self.blocked += 1
+        self.blocked_bytes_est += EST_BYTES.get(resource_type, 10_000)
+        self.by_type[resource_type] = self.by_type.get(resource_type, 0) + 1
+
+    def as_dict(self) -> dict:
+        return {
+            "mode": self.mode,
+            "allowed": self.allowed,
+            "blocked": self.blocked,
+            "blockedBytesEst": self.blocked_bytes_est,
+            "byType": dict(self.by_type),
+        }
+
+    def summary(self) -> str:
+        return (f"{self.carrier}: mode={self.mode} blocked={self.blocked} "
+                f"(~{self.blocked_bytes_est // 1024}KB) allowed={self.allowed} by_type={self.by_type}")
+
+
+class BlockRules:
+    def __init__(self, carrier: str, rules: dict | None):
+        rules = rules or {}
+        mode = str(os.environ.get(MODE_ENV) or rules.get("mode") or "default").lower()
+        if mode not in BLOCK_TYPES:
+            mode = "default"
+        self.mode = mode
+        self.block_types = set(BLOCK_TYPES[mode])
+        self.block_types.update(rules.get("block_types") or [])
+        self.allow = DEFAULT_ALLOW + list(rules.get("allow") or [])
+        self.deny = DEFAULT_DENY + list(rules.get("deny") or [])
+        self.stats = BlockStats(carrier, mode)
+
+    def should_block(self, url: str, resource_type: str) -> bool:
+        if _match(url, self.allow):
+            self.stats.allowed += 1
+            return False
+        if resource_type in self.block_types or _match(url, self.deny):
+            self.stats.record(resource_type)
+            return True
+        self.stats.allowed += 1
+        return False
+
+
+def install_blocking(context, carrier: str, rules: dict | None) -> BlockStats:
+    br = BlockRules(carrier, rules)
+    if br.mode == "off":
+        return br.stats
+
+    def handler(route):
+        req = route.request
+        try:
+            if br.should_block(req.url, req.resource_type):
+                route.abort("blockedbyclient")
+            else:
+                route.fallback()  # 交给其他 route（例如 HAR 回放），没有则正常发出
+        except Exception:
+            # 页面关闭后 route 可能已失效
+            pass
+
+    context.route("**/*", handler)
+    try:
+        context.on("close", lambda _ctx: log(br.stats.summary()))
+    except Exception:
+        pass
+    return br.stats
+
+
+async def install_blocking_async(context, carrier: str, rules: dict | None) -> BlockStats:
+    br = BlockRules(carrier, rules)
+    if br.mode == "off":
+        return br.stats
+
+    async def handler(route):
+        req = route.request
+        try:
+            if br.should_block(req.url, req.resource_type):
+                await route.abort("blockedbyclient")
+            else:
+                await route.fallback()
+        except Exception:
+            pass
+
+    await context.route("**/*", handler)
+    return br.stats
@@ -0,0 +1,365 @@
+import json
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, datetime
+
+import single_flight
+
+# 查询结果缓存，键为 (carrier, number)：
+#   一级：进程内 LRU（同一进程内的重复查询，零 IO）
+#   二级：app/cache/results.db（SQLite WAL，多个脚本进程共享，写入走事务保证原子性）
+# TTL 按状态与 ETA 远近决定：ETA 越近变化越频繁，缓存越短。
+# 负缓存：invalid / no_data 单独存表，TTL 较短且按承运商配置，命中时累计省下的浏览器启动次数。
+# 同一单号只保留最新的一种结果：写入正结果时删除负结果，反之亦然（否则旧的 ok 会一直优先命中）。
+# 环境变量 AIRSEA_CACHE=off 关闭缓存；脚本参数 --refresh 跳过读取但仍写入。
+
+CACHE_DIR = os.path.join(os.path.dirname(__file__), "app", "cache")
+DB_PATH = os.path.join(CACHE_DIR, "results.db")
+CACHE_ENV = "AIRSEA_CACHE"
+LRU_SIZE = int(os.environ.get("AIRSEA_CACHE_LRU", "512"))
+
+HOUR = 3600
+# (距 ETA 天数上限, TTL 秒)，按顺序匹配
+OK_TTL_STEPS = (
+    (2, 1 * HOUR),
+    (7, 3 * HOUR),
+    (21, 6 * HOUR),
+)
+OK_TTL_FAR = 12 * HOUR
+OK_TTL_ARRIVED = 24 * HOUR
+OK_TTL_UNKNOWN = 2 * HOUR
+
+# 负结果：单号无效 / 查无数据。单号可能稍后才录入系统，TTL 远短于正常结果
+NEGATIVE_STATUSES = ("invalid", "no_data")
+NEGATIVE_TTL = {
+    "wanhai": 2 * HOUR,
+    "shipmentlink": 6 * HOUR,
+    "zim": 2 * HOUR,
+}
+NEGATIVE_TTL_DEFAULT = 2 * HOUR
+
+SCHEMA = (
+    """
+    CREATE TABLE IF NOT EXISTS results (
+        carrier TEXT NOT NULL,
+        number  TEXT NOT NULL,
+        status  TEXT NOT NULL,
+        payload TEXT NOT NULL,
+        created REAL NOT NULL,
+        expires REAL NOT NULL,
+        PRIMARY KEY (carrier, number)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS negatives (
+        carrier TEXT NOT NULL,
+        number  TEXT NOT NULL,
+        status  TEXT NOT NULL,
+        payload TEXT NOT NULL,
+        created REAL NOT NULL,
+        expires REAL NOT NULL,
+        hits    INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (carrier, number)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS counters (
+        carrier TEXT NOT NULL,
+        name    TEXT NOT NULL,
+        value   INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (carrier, name)
+    )
+    """,
+)
+
+_ISO_DATE = re.compile(r"(\d{4})-(\d{1,2})-(\d{1,2})")
+
+
+def log(msg: str) -> None:
+    ts = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    print(f"[cache] {ts} {msg}", file=sys.stderr, flush=True)
+
+
+def enabled() -> bool:
+    return os.environ.get(CACHE_ENV, "on").lower() not in ("off", "0", "false", "no")
+
+
+def norm_key(carrier: str, number: str) -> tuple[str, str]:
+    return (carrier or "").strip().lower(), (str(number or "")).strip().upper()
+
+
+def eta_days(result: dict) -> int | None:
+    m = _ISO_DATE.search(str(result.get("result") or ""))
+    if not m:
+        return None
+    try:
+        eta = date(int(m.group(1)), int(m.group(2)), int(m.group(3)))
+    except ValueError:
+        return None
+    return (eta - date.today()).days
+
+
+def ttl_for(result: dict) -> int:
+    # 只缓存有结果的 ok（ZIM 返回接口 JSON 放在 data 中）；timeout / error 等瞬时失败不缓存
+    if not isinstance(result, dict) or result.get("status") != "ok":
+        return 0
+    if not (result.get("result") or result.get("data")) or result.get("partial"):
+        return 0
+    days = eta_days(result)
+    if days is None:
+        return OK_TTL_UNKNOWN
+    if days < 0:
+        return OK_TTL_ARRIVED
+    for limit, ttl in OK_TTL_STEPS:
+        if days <= limit:
+            return ttl
+    return OK_TTL_FAR
+
+
+class ResultCache:
+    def __init__(self, path: str = DB_PATH, lru_size: int = LRU_SIZE):
+        self.path = path
+        self.lru_size = max(0, lru_size)
+        self._lru: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            # isolation_level=None：显式 BEGIN IMMEDIATE，写锁在事务开头获取，避免升级死锁
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=10000")
+            for ddl in SCHEMA:
+                conn.execute(ddl)
+            self._local.conn = conn
+        return conn
+
+    # ---- 一级 LRU ----
+    def _lru_get(self, key):
+        with self._lock:
+            item = self._lru.get(key)
+            if item is not None:
+                self._lru.move_to_end(key)
+            return item
+
+    def _lru_put(self, key, item) -> None:
+        if not self.lru_size:
+            return
+        with self._lock:
+            self._lru[key] = item
+            self._lru.move_to_end(key)
+            while len(self._lru) > self.lru_size:
+                self._lru.popitem(last=False)
+
+    def _lru_drop(self, key) -> None:
+        with self._lock:
+            self._lru.pop(key, None)
+
+    # ---- 对外接口 ----
+    def get(self, carrier: str, number: str, allow_stale: bool = False) -> dict | None:
+        key = norm_key(carrier, number)
+        now = time.time()
+        item = self._lru_get(key)
+        if item is None or (item[1] <= now and not allow_stale):
+            try:
+                row = self._conn().execute(
+                    "SELECT payload, expires, created FROM results WHERE carrier=? AND number=?", key
+                ).fetchone()
+            except sqlite3.Error as e:
+                log(f"read failed: {e}")
+                return None
+            if row is None:
+                return None
+            item = (json.loads(row[0]), row[1], row[2])
+            if item[1] > now:
+                self._lru_put(key, item)
+        payload, expires, created = item
+        if expires <= now and not allow_stale:
+            return None
+        return {**payload, "cache": "hit" if expires > now else "stale", "cachedAt": int(created)}
+
+    def put(self, carrier: str, number: str, result: dict, ttl: int | None = None) -> bool:
+        ttl = ttl_for(result) if ttl is None else ttl
+        if ttl <= 0:
+            return False
+        key = norm_key(carrier, number)
+        now = time.time()
+        payload = {k: v for k, v in result.items() if k not in ("cache", "cachedAt")}
+        conn = self._conn()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute(
+                "INSERT OR REPLACE INTO results (carrier, number, status, payload, created, expires) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (*key, str(result.get("status")), json.dumps(payload, ensure_ascii=False), now, now + ttl),
+            )
+            conn.execute("DELETE FROM negatives WHERE carrier=? AND number=?", key)
+            conn.execute("COMMIT")
+        except sqlite3.Error as e:
+            try:
+                conn.execute("ROLLBACK")
+            except sqlite3.Error:
+                pass
+            log(f"write failed: {e}")
+            return False
+        self._lru_put(key, (payload, now + ttl, now))
+        return True
+
+    def invalidate(self, carrier: str, number: str) -> None:
+        key = norm_key(carrier, number)
+        self._lru_drop(key)
+        try:
+            self._conn().execute("DELETE FROM results WHERE carrier=? AND number=?", key)
+            self._conn().execute("DELETE FROM negatives WHERE carrier=? AND number=?", key)
+        except sqlite3.Error as e:
+            log(f"delete failed: {e}")
+
+    # ---- 负缓存：不进 LRU，命中计数需要跨进程累计 ----
+    def get_negative(self, carrier: str, number: str) -> dict | None:
+        key = norm_key(carrier, number)
+        conn = self._conn()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            cur = conn.execute(
+                "UPDATE negatives SET hits = hits + 1 WHERE carrier=? AND number=? AND expires > ?",
+                (*key, time.time()),
+            )
+            if cur.rowcount == 0:
+                conn.execute("COMMIT")
+                return None
+            conn.execute(
+                "INSERT INTO counters (carrier, name, value) VALUES (?, 'launches_saved', 1) "
+                "ON CONFLICT(carrier, name) DO UPDATE SET value = value + 1",
+                (key[0],),
+            )
+            row = conn.execute(
+                "SELECT payload, created, hits FROM negatives WHERE carrier=? AND number=?", key
+            ).fetchone()
+            conn.execute("COMMIT")
+        except sqlite3.Error as e:
+            try:
+                conn.execute("ROLLBACK")
+            except sqlite3.Error:
+                pass
+            log(f"negative read failed: {e}")
+            return None
+        payload, created, hits = row
+        return {**json.loads(payload), "cache": "negative", "cachedAt": int(created), "launchesSaved": hits}
+
+    def put_negative(self, carrier: str, number: str, result: dict, ttl: int | None = None) -> bool:
+        key = norm_key(carrier, number)
+        ttl = NEGATIVE_TTL.get(key[0], NEGATIVE_TTL_DEFAULT) if ttl is None else int(ttl)
+        if ttl <= 0 or result.get("status") not in NEGATIVE_STATUSES:
+            return False
+        now = time.time()
+        payload = {k: v for k, v in result.items() if k not in ("cache", "cachedAt", "launchesSaved")}
+        conn = self._conn()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute(
+                "INSERT OR REPLACE INTO negatives (carrier, number, status, payload, created, expires, hits) "
+                "VALUES (?, ?, ?, ?, ?, ?, 0)",
+                (*key, str(result.get("status")), json.dumps(payload, ensure_ascii=False), now, now + ttl),
+            )
+            conn.execute("DELETE FROM results WHERE carrier=? AND number=?", key)
+            conn.execute("COMMIT")
+        except sqlite3.Error as e:
+            try:
+                conn.execute("ROLLBACK")
+            except sqlite3.Error:
+                pass
+            log(f"negative write failed: {e}")
+            return False
+        self._lru_drop(key)
+        return True
+
+    def launches_saved(self, carrier: str | None = None) -> int:
+        sql = "SELECT COALESCE(SUM(value), 0) FROM counters WHERE name='launches_saved'"
+        args: tuple = ()
+        if carrier:
+            sql += " AND carrier=?"
+            args = (norm_key(carrier, "")[0],)
+        try:
+            return int(self._conn().execute(sql, args).fetchone()[0])
+        except sqlite3.Error:
+            return 0
+
+    def purge_expired(self, grace_sec: int = 7 * 24 * HOUR) -> int:
+        # 过期记录保留一段时间供页面读不到结果时兜底，超过宽限期再删除；负结果过期即删
+        try:
+            now = time.time()
+            cur = self._conn().execute("DELETE FROM results WHERE expires < ?", (now - grace_sec,))
+            cur2 = self._conn().execute("DELETE FROM negatives WHERE expires < ?", (now,))
+            return cur.rowcount + cur2.rowcount
+        except sqlite3.Error as e:
+            log(f"purge failed: {e}")
+            return 0
+
+
+_cache: ResultCache | None = None
+_cache_lock = threading.Lock()
+
+
+def get_cache() -> ResultCache:
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ResultCache()
+            # 每个进程首次使用时顺带清理过期太久的记录
+            _cache.purge_expired()
+        return _cache
+
+
+def lookup_cached(carrier: str, number: str) -> dict | None:
+    # 正结果优先，其次负结果；都没有返回 None
+    cache = get_cache()
+    hit = cache.get(carrier, number)
+    if hit is not None:
+        log(f"{carrier}/{number}: hit (status={hit.get('status')})")
+        return hit
+    neg = cache.get_negative(carrier, number)
+    if neg is not None:
+        log(f"{carrier}/{number}: negative hit (status={neg.get('status')}, launchesSaved={neg['launchesSaved']})")
+    return neg
+
+
+def store(carrier: str, number: str, out: dict, negative_ttl: int | None = None) -> None:
+    if not isinstance(out, dict):
+        return
+    cache = get_cache()
+    if out.get("status") in NEGATIVE_STATUSES:
+        if cache.put_negative(carrier, number, out, ttl=negative_ttl):
+            log(f"{carrier}/{number}: stored negative ({out.get('status')})")
+    elif cache.put(carrier, number, out):
+        log(f"{carrier}/{number}: stored, ttl={ttl_for(out)}s")
+
+
+def cached_lookup(carrier: str, number: str, produce, refresh: bool = False,
+                  negative_ttl: int | None = None) -> dict:
+    # 先查缓存，未命中才执行 produce()（HTTP 快速通道 / 浏览器），结果按 TTL 写回；
+    # 同一单号的并发查询经 single_flight 合并，只有执行者写缓存
+    if not enabled():
+        return single_flight.run(carrier, number, produce)
+    if not refresh:
+        hit = lookup_cached(carrier, number)
+        if hit is not None:
+            return hit
+    out = single_flight.run(carrier, number, produce)
+    if not (isinstance(out, dict) and out.get("coalesced")):
+        store(carrier, number, out, negative_ttl)
+    if isinstance(out, dict) and out.get("partial") and not out.get("result"):
+        # 查询预算用尽：有过期缓存时以它作为最佳部分答案
+        stale = get_cache().get(carrier, number, allow_stale=True)
+        if stale is not None:
+            log(f"{carrier}/{number}: budget exhausted, answering with stale entry")
+            return {**stale, "partial": True, "stage": out.get("stage"), "elapsedMs": out.get("elapsedMs")}
+    return out
@@ -0,0 +1,183 @@
+import json
+import queue
+import socket
+import sys
+import threading
+from datetime import datetime
+
+import cancellation
+
+# 常驻 worker 模式（各脚本的 --serve）：一个进程循环处理 JSON-lines 请求，浏览器池在请求之间保持热启动。
+#   --serve            从 stdin 读请求，响应写 stdout（每行一个 JSON）
+#   --serve HOST:PORT  监听本地 TCP 端口，每个连接内同样一行请求、一行响应
+# 请求：{"id": 1, "number": "XXX", "refresh": false, "debug_level": "errors"}
+# 响应：{"id": 1, "status": "ok", ...}；另支持 {"op": "ping"} 与 {"op": "shutdown"}。
+# {"op": "cancel", "id": 1} 由读取线程立即处理：正在执行的请求被打断并回 {"id": 1, "status": "cancelled"}，
+# 尚在排队的同 id 请求直接丢弃；不带 id 时取消当前请求。SIGTERM / SIGINT 结束当前请求后退出服务。
+# Playwright sync API 只能在创建它的线程使用，因此读取放在后台线程，查询统一在主线程串行执行。
+
+_STOP = object()
+# 空闲时检查终止信号的间隔
+IDLE_POLL_SEC = 0.5
+_out_lock = threading.Lock()
+
+
+def log(msg: str) -> None:
+    ts = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    print(f"[serve] {ts} {msg}", file=sys.stderr, flush=True)
+
+
+def _write_stdout(obj: dict) -> None:
+    # 取消确认由读取线程写出，与主线程的响应共用 stdout
+    with _out_lock:
+        sys.stdout.write(json.dumps(obj, ensure_ascii=False) + "\n")
+        sys.stdout.flush()
+
+
+def _parse(line: str):
+    line = line.strip()
+    if not line:
+        return None
+    try:
+        req = json.loads(line)
+        if not isinstance(req, dict):
+            raise ValueError("request must be a JSON object")
+        return req
+    except Exception as e:
+        return {"_error": f"bad request: {e}"}
+
+
+class _State:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.current = _STOP  # 正在执行的请求 id（无请求时为 _STOP）
+        self.dropped: set = set()
+
+
+def _submit(req: dict, reply, jobs: queue.Queue, state: _State) -> None:
+    # 取消请求不能排队（主线程正忙），在读取线程里直接处理
+    if req.get("op") != "cancel":
+        jobs.put((req, reply))
+        return
+    rid = req.get("id")
+    with state.lock:
+        running = state.current is not _STOP and (rid is None or rid == state.current)
+        if not running and rid is not None:
+            state.dropped.add(rid)
+        if running:
+            running = cancellation.request(f"cancel id={state.current}")
+    reply({"id": rid, "status": "ok", "op": "cancel", "running": running})
+
+
+def _stdin_reader(jobs: queue.Queue, state: _State) -> None:
+    for line in sys.stdin:
+        req = _parse(line)
+        if req is not None:
+            _submit(req, _write_stdout, jobs, state)
+    # stdin 关闭（父进程退出）即结束服务
+    jobs.put((_STOP, None))
+
+
+def _conn_reader(conn: socket.socket, jobs: queue.Queue, state: _State) -> None:
+    lock = threading.Lock()
+
+    def reply(obj: dict) -> None:
+        data = (json.dumps(obj, ensure_ascii=False) + "\n").encode("utf-8")
+        with lock:
+            try:
+                conn.sendall(data)
+            except OSError:
+                pass
+
+    with conn, conn.makefile("r", encoding="utf-8") as rf:
+        for line in rf:
+            req = _parse(line)
+            if req is not None:
+                _submit(req, reply, jobs, state)
+
+
+def _socket_listener(addr: str, jobs: queue.Queue, state: _State) -> None:
+    host, _, port = addr.rpartition(":")
+    srv = socket.create_server((host or "127.0.0.1", int(port)))
+    log(f"listening on {host or '127.0.0.1'}:{port}")
+    while True:
+        conn, peer = srv.accept()
+        log(f"client connected: {peer}")
+        threading.Thread(target=_conn_reader, args=(conn, jobs, state), daemon=True).start()
+
+
+def serve(handle, addr: str | None = None, on_start=None, on_cancel=None) -> int:
+    # handle(req) -> dict，在主线程调用；on_start() 用于预热浏览器；
+    # on_cancel() 在请求被取消后调用（被打断的 Playwright 连接状态不可信，由脚本回收浏览器池）
+    cancellation.install()
+    jobs: queue.Queue = queue.Queue()
+    state = _State()
+    if addr and addr != "stdin":
+        threading.Thread(target=_socket_listener, args=(addr, jobs, state), daemon=True).start()
+    else:
+        threading.Thread(target=_stdin_reader, args=(jobs, state), daemon=True).start()
+    if on_start is not None:
+        try:
+            on_start()
+        except Exception as e:
+            log(f"warm-up failed: {e}")
+    log("ready")
+    served = 0
+    try:
+        while True:
+            try:
+                req, reply = jobs.get(timeout=IDLE_POLL_SEC)
+            except queue.Empty:
+                # 空闲时收到 SIGTERM / SIGINT：信号处理只记标记，这里退出
+                if cancellation.terminating():
+                    break
+                continue
+            if req is _STOP:
+                break
+            rid = req.get("id")
+            op = req.get("op")
+            if "_error" in req:
+                reply({"id": rid, "status": "error", "error": req["_error"]})
+                continue
+            if op == "ping":
+                reply({"id": rid, "status": "ok", "op": "pong", "served": served})
+                continue
+            if op == "shutdown":
+                reply({"id": rid, "status": "ok", "op": "shutdown"})
+                break
+            if not req.get("number"):
+                reply({"id": rid, "status": "error", "error": "missing number"})
+                continue
+            with state.lock:
+                if rid is not None and rid in state.dropped:
+                    state.dropped.discard(rid)
+                    reply({"id": rid, "status": "cancelled", "number": req["number"]})
+                    continue
+                state.current = rid
+            try:
+                with cancellation.cancellable():
+                    out = handle(req)
+            except cancellation.Cancelled as e:
+                out = {"status": "cancelled", "number": req["number"], "reason": str(e)}
+            except Exception as e:
+                out = {"status": "error", "error": str(e)}
+            finally:
+                with state.lock:
+                    state.current = _STOP
+                    # 请求刚结束时到达的取消不应波及下一条请求
+                    cancellation.reset()
+            served += 1
+            reply({"id": rid, **(out if isinstance(out, dict) else {"status": "error", "error": "no result"})})
+            if cancellation.terminating():
+                break
+            if isinstance(out, dict) and out.get("status") == "cancelled":
+                if on_cancel is not None:
+                    try:
+                        on_cancel()
+                    except Exception as e:
+                        log(f"cleanup after cancel failed: {e}")
+    except cancellation.Cancelled:
+        # 请求之间（cancellable 区间外）收到的信号在下一次进入区间时抛出
+        pass
+    log(f"stopped after {served} request(s)" + (f" ({cancellation.reason()})" if cancellation.terminating() else ""))
+    return cancellation.exit_code() if cancellation.terminating() else 0
@@ -0,0 +1,150 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+# 会话状态（Playwright storage_state：cookie + localStorage）持久化：
+# 浏览器池里的 context 每次都是空会话，Cookie 弹窗、WAF 校验、首次访问的跳转每次都要重走一遍。
+# 查询成功后保存 storage_state，新 context 创建时带上它；状态超过 TTL 的 3/4 时在后台拉起一个独立进程
+# （python backend/session_state.py --warm <carrier>）重新热身并保存，只有过期后的第一次查询才需要付热身成本。
+# 只用于浏览器池中的临时 context；持久 profile（ZIM 的 clone 模式）本身就保留 cookie。
+# 配置：storage_state（默认 true）、storage_state_ttl_sec（默认 6 小时）。
+
+STATE_DIR = os.path.join(os.path.dirname(__file__), "app", "cache", "storage_state")
+DEFAULT_TTL_SEC = 6 * 3600
+REFRESH_AT = 0.75          # 状态年龄超过 TTL 的这个比例时后台刷新
+WARM_COOLDOWN_SEC = 600    # 两次后台热身之间的最短间隔（热身失败时避免每次查询都拉起进程）
+WARM_BUDGET_SEC = 90
+
+
+def log(msg: str) -> None:
+    ts = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    print(f"[session] {ts} {msg}", file=sys.stderr, flush=True)
+
+
+def enabled(config: dict) -> bool:
+    return bool(config.get("storage_state", True))
+
+
+def ttl_for(config: dict) -> float:
+    try:
+        return float(config.get("storage_state_ttl_sec") or DEFAULT_TTL_SEC)
+    except (TypeError, ValueError):
+        return DEFAULT_TTL_SEC
+
+
+def _path(carrier: str) -> str:
+    return os.path.join(STATE_DIR, f"{carrier}.json")
+
+
+def _read(carrier: str) -> dict | None:
+    try:
+        with open(_path(carrier), "r", encoding="utf-8") as f:
+            entry = json.load(f)
+    except Exception:
+        return None
+    if not isinstance(entry, dict) or not isinstance(entry.get("state"), dict):
+        return None
+    return entry
+
+
+def age_sec(carrier: str) -> float | None:
+    entry = _read(carrier)
+    if entry is None:
+        return None
+    return time.time() - float(entry.get("saved_at") or 0)
+
+
+def load(carrier: str, config: dict) -> dict | None:
+    # 未过期的 storage_state；已过期的单个 cookie 去掉，整体超过 TTL 返回 None（本次查询重新热身）
+    if not enabled(config):
+        return None
+    entry = _read(carrier)
+    if entry is None:
+        return None
+    age = time.time() - float(entry.get("saved_at") or 0)
+    if age > ttl_for(config):
+        log(f"{carrier}: storage state expired ({int(age)}s old)")
+        return None
+    state = entry["state"]
+    now = time.time()
+    cookies = [c for c in state.get("cookies") or [] if not (0 < float(c.get("expires", -1)) < now)]
+    log(f"{carrier}: load storage state ({len(cookies)} cookies, {int(age)}s old)")
+    return {"cookies": cookies, "origins": state.get("origins") or []}
+
+
+def context_kwargs(carrier: str, config: dict, profile_dir: str | None = None) -> dict:
+    # 传给 get_pool().context(...) 的参数；持久 profile 不支持 storage_state，返回空
+    if profile_dir:
+        return {}
+    state = load(carrier, config)
+    return {"storage_state": state} if state else {}
+
+
+def save(carrier: str, context) -> None:
+    # 查询成功后调用；原子替换，失败只记日志
+    try:
+        state = context.storage_state()
+        os.makedirs(STATE_DIR, exist_ok=True)
+        tmp = _path(carrier) + f".{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"saved_at": time.time(), "state": state}, f, ensure_ascii=False)
+        os.replace(tmp, _path(carrier))
+        log(f"{carrier}: storage state saved ({len(state.get('cookies') or [])} cookies)")
+    except Exception as e:
+        log(f"{carrier}: save storage state failed: {e}")
+
+
+def schedule_refresh(carrier: str, config: dict) -> bool:
+    # 状态还有效但快到期时，后台拉起热身进程；不存在或已过期则交给本次查询（它成功后会保存）
+    if not enabled(config):
+        return False
+    age = age_sec(carrier)
+    ttl = ttl_for(config)
+    if age is None or age > ttl or age < ttl * REFRESH_AT:
+        return False
+    stamp = os.path.join(STATE_DIR, f"{carrier}.warm")
+    try:
+        if time.time() - os.path.getmtime(stamp) < WARM_COOLDOWN_SEC:
+            return False
+    except OSError:
+        pass
+    try:
+        os.makedirs(STATE_DIR, exist_ok=True)
+        with open(stamp, "w", encoding="utf-8") as f:
+            f.write(str(os.getpid()))
+        kwargs = {"stdin": subprocess.DEVNULL, "stdout": subprocess.DEVNULL,
+                  "stderr": open(os.path.join(STATE_DIR, f"{carrier}.warm.log"), "ab")}
+        if sys.platform == "win32":
+            # 与当前进程脱离：Java 结束查询进程时不连带结束热身进程
+            kwargs["creationflags"] = subprocess.CREATE_NEW_PROCESS_GROUP | subprocess.DETACHED_PROCESS
+        else:
+            kwargs["start_new_session"] = True
+        subprocess.Popen([sys.executable, os.path.abspath(__file__), "--warm", carrier], **kwargs)
+        kwargs["stderr"].close()
+        log(f"{carrier}: storage state {int(age)}s old, background refresh started")
+        return True
+    except Exception as e:
+        log(f"{carrier}: start background refresh failed: {e}")
+        return False
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Warm up a carrier site and save its storage state")
+    parser.add_argument("--warm", required=True, metavar="CARRIER")
+    args = parser.parse_args()
+
+    import carriers  # 依赖 playwright，按需导入
+
+    provider = carriers.get(args.warm)
+    config = dict(provider.load_config(), budget_sec=WARM_BUDGET_SEC)
+    out = provider.warm(config)
+    print(json.dumps(out, ensure_ascii=False))
+    return 0 if out.get("status") == "ok" else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
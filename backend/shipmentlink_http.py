@@ -0,0 +1,185 @@
+import json
+import os
+import re
+import sys
+import time
+from datetime import datetime
+from urllib.parse import urljoin
+
+import deadline
+import http_client
+
+# ShipmentLink（长荣）TDB1_CargoTracking.do 的表单直连：
+# 首次 GET 查询页，按配置里的 XPath 找到表单与字段，之后直接 POST 同样的表单；
+# 结果表用 lxml 解析。遇到验证页或解析不到结果返回 None，由调用方走 Playwright 流程。
+
+FORM_CACHE = os.path.join(http_client.COOKIE_DIR, "shipmentlink_form.json")
+FORM_TTL_SEC = 24 * 3600
+INVALID_MARKER = "Booking No. is not valid"
+# 查询页自带的 doSearch() 校验脚本里也有这句提示，只认页面正文或顶层（不在函数体内）的 alert(...)
+_ALERT = re.compile(r"alert\s*\(\s*(['\"])(.*?)\1")
+
+_form_spec: dict | None = None
+
+
+def log(msg: str) -> None:
+    ts = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    print(f"[shipmentlink-http] {ts} {msg}", file=sys.stderr, flush=True)
+
+
+def _first(tree, xpath: str | None):
+    if not xpath:
+        return None
+    for xp in (xpath, xpath.replace("/tbody", "")):
+        try:
+            found = tree.xpath(xp)
+        except Exception:
+            continue
+        if found:
+            return found[0]
+    return None
+
+
+def discover_form(search_url: str, config: dict) -> dict | None:
+    sess = http_client.get_session("shipmentlink")
+    resp = sess.get(search_url, timeout=deadline.current().sec(15))
+    if http_client.looks_like_challenge(resp):
+        log(f"challenge on search page (status={resp.status_code})")
+        return None
+    tree = http_client.parse_html(resp.text)
+    inp = _first(tree, config.get("search_input_xpath"))
+    if inp is None or not inp.get("name"):
+        log("search input not found in HTML")
+        return None
+    form = inp
+    while form is not None and form.tag != "form":
+        form = form.getparent()
+    if form is None:
+        log("search form not found in HTML")
+        return None
+
+    fields: dict[str, str] = {}
+    for el in form.iter("input", "select", "textarea"):
+        name = el.get("name")
+        if not name:
+            continue
+        typ = (el.get("type") or "text").lower()
+        if el.tag == "select":
+            opt = el.xpath(".//option[@selected]") or el.xpath(".//option")
+            fields[name] = (opt[0].get("value") or "") if opt else ""
+        elif typ in ("radio", "checkbox"):
+            if el.get("checked") is not None:
+                fields[name] = el.get("value") or "on"
+        elif typ in ("submit", "button", "image", "reset", "file"):
+            continue
+        else:
+            fields[name] = el.get("value") or ""
+
+    # 与浏览器流程一致：先点 choose（单选项），再填单号
+    choose = _first(tree, config.get("search_button_choose_xpath"))
+    if choose is not None and choose.get("name"):
+        fields[choose.get("name")] = choose.get("value") or "on"
+    button = _first(tree, config.get("search_button_xpath"))
+    if button is not None and button.get("name") and (button.get("type") or "").lower() == "submit":
+        fields[button.get("name")] = button.get("value") or ""
+
+    return {
+        "action": urljoin(resp.url, form.get("action") or search_url),
+        "method": (form.get("method") or "post").lower(),
+        "fields": fields,
+        "number_field": inp.get("name"),
+        "ts": time.time(),
+    }
+
+
+def _load_spec(search_url: str, config: dict, refresh: bool = False) -> dict | None:
+    global _form_spec
+    if not refresh:
+        if _form_spec and time.time() - _form_spec.get("ts", 0) < FORM_TTL_SEC:
+            return _form_spec
+        try:
+            with open(FORM_CACHE, "r", encoding="utf-8") as f:
+                spec = json.load(f)
+            if spec.get("search_url") == search_url and time.time() - spec.get("ts", 0) < FORM_TTL_SEC:
+                _form_spec = spec
+                return spec
+        except Exception:
+            pass
+    spec = discover_form(search_url, config)
+    if spec is None:
+        return None
+    spec["search_url"] = search_url
+    _form_spec = spec
+    try:
+        os.makedirs(os.path.dirname(FORM_CACHE), exist_ok=True)
+        tmp = FORM_CACHE + f".{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(spec, f, ensure_ascii=False)
+        os.replace(tmp, FORM_CACHE)
+    except Exception:
+        pass
+    return spec
+
+
+def _top_level_alerts(script: str) -> list[str]:
+    # 粗略按花括号深度判断：深度 0 处的 alert 才是页面加载时就会弹出的提示
+    out = []
+    for m in _ALERT.finditer(script):
+        prefix = script[:m.start()]
+        if prefix.count("{") <= prefix.count("}"):
+            out.append(m.group(2))
+    return out
+
+
+def is_invalid_page(tree) -> bool:
+    body_text = " ".join(tree.xpath("//body//text()[not(ancestor::script) and not(ancestor::style)]"))
+    if INVALID_MARKER in http_client.norm_text(body_text):
+        return True
+    return any(INVALID_MARKER in msg for script in tree.xpath("//script/text()") for msg in _top_level_alerts(script))
+
+
+def submit(spec: dict, number: str, result_xpath: str) -> dict | None:
+    sess = http_client.get_session("shipmentlink")
+    data = dict(spec["fields"])
+    data[spec["number_field"]] = number
+    headers = {"Referer": spec.get("search_url") or spec["action"]}
+    if spec.get("method") == "get":
+        resp = sess.get(spec["action"], params=data, timeout=deadline.current().sec(15), headers=headers)
+    else:
+        resp = sess.post(spec["action"], data=data, timeout=deadline.current().sec(15), headers=headers)
+    if http_client.looks_like_challenge(resp):
+        log(f"challenge on result page (status={resp.status_code})")
+        return None
+    # 先取结果：同一个 .do 既返回查询表单也返回结果，表单页里带着含无效提示的校验脚本
+    tree = http_client.parse_html(resp.text)
+    text = http_client.xpath_first_text(tree, result_xpath)
+    if not text:
+        return {"status": "invalid"} if is_invalid_page(tree) else None
+    http_client.save_cookies("shipmentlink")
+    return {"status": "ok", "result": text}
+
+
+def lookup(number: str, config: dict) -> dict | None:
+    if not http_client.available():
+        return None
+    search_url = config.get("search_url")
+    result_xpath = config.get("result_xpath")
+    if not search_url or not result_xpath:
+        return None
+    t0 = time.time()
+    for refresh in (False, True):
+        try:
+            spec = _load_spec(search_url, config, refresh=refresh)
+            if spec is None:
+                return None
+            res = submit(spec, number, result_xpath)
+        except Exception as e:
+            log(f"request failed: {e}")
+            return None
+        if res is not None:
+            log(f"{number}: {res['status']} via form POST in {int((time.time() - t0) * 1000)}ms")
+            return res
+        if spec.get("ts", 0) >= t0:
+            break
+        # 缓存的表单可能已变（隐藏字段/令牌过期）：重新发现一次再试
+    return None
@@ -0,0 +1,134 @@
+import json
+import os
+import re
+import sys
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from datetime import datetime
+
+import deadline
+import file_lock
+
+# 同一 (carrier, number) 的并发查询合并为一次：
+#   进程内：第一个调用者执行，其余线程等待同一个 Future
+#   跨进程：锁文件 app/cache/inflight/<carrier>_<number>.lock 决定谁执行，
+#           执行者结束前把结果写入同名 .json，其余进程等锁释放后直接读取
+# 跟随者拿到的结果带 "coalesced": true，不再重复写缓存。
+
+INFLIGHT_DIR = os.path.join(os.path.dirname(__file__), "app", "cache", "inflight")
+WAIT_TIMEOUT_SEC = float(os.environ.get("AIRSEA_SINGLE_FLIGHT_WAIT", "240"))
+POLL_SEC = 0.2
+LOCK_MAX_AGE = 600
+
+_inflight: dict = {}
+_lock = threading.Lock()
+_cleaned = False
+
+
+def log(msg: str) -> None:
+    ts = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    print(f"[single-flight] {ts} {msg}", file=sys.stderr, flush=True)
+
+
+def _base(carrier: str, number: str) -> str:
+    safe = re.sub(r"[^A-Za-z0-9._-]+", "_", f"{carrier}_{number}".lower())[:120]
+    return os.path.join(INFLIGHT_DIR, safe)
+
+
+def _write_result(path: str, result) -> None:
+    tmp = path + f".{os.getpid()}.tmp"
+    try:
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"ts": time.time(), "result": result}, f, ensure_ascii=False)
+        os.replace(tmp, path)
+    except Exception as e:
+        log(f"write shared result failed: {e}")
+
+
+def _read_result(path: str, since: float):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except Exception:
+        return None
+    if data.get("ts", 0) < since:
+        return None
+    return data.get("result")
+
+
+def _cleanup(max_age: float = 3600) -> None:
+    # 每个进程清理一次早已结束的共享结果文件
+    global _cleaned
+    if _cleaned:
+        return
+    _cleaned = True
+    now = time.time()
+    for name in os.listdir(INFLIGHT_DIR):
+        path = os.path.join(INFLIGHT_DIR, name)
+        try:
+            if not name.endswith(".lock") and now - os.path.getmtime(path) > max_age:
+                os.remove(path)
+        except OSError:
+            continue
+
+
+def _run_cross_process(carrier: str, number: str, fn):
+    # 返回 (结果, 是否由本进程执行)
+    base = _base(carrier, number)
+    lock_path, result_path = base + ".lock", base + ".json"
+    os.makedirs(INFLIGHT_DIR, exist_ok=True)
+    _cleanup()
+    since = time.time()
+    # 等待不超过本次查询剩余的预算
+    wait_until = since + min(WAIT_TIMEOUT_SEC, deadline.current().remaining_sec())
+    while True:
+        if file_lock.try_lock(lock_path, max_age=LOCK_MAX_AGE):
+            try:
+                res = fn()
+                _write_result(result_path, res)
+                return res, True
+            finally:
+                file_lock.release(lock_path)
+        owner = file_lock.read_owner(lock_path).get("pid")
+        log(f"{carrier}/{number}: in flight in pid {owner}, waiting")
+        while os.path.exists(lock_path) and not file_lock.is_stale(lock_path, LOCK_MAX_AGE):
+            if time.time() > wait_until:
+                log(f"{carrier}/{number}: wait timeout, running locally")
+                return fn(), True
+            time.sleep(POLL_SEC)
+        res = _read_result(result_path, since)
+        if res is not None:
+            return res, False
+        # 执行者异常退出、未留下结果：重新竞争执行权
+
+
+def run(carrier: str, number: str, fn):
+    key = (carrier.strip().lower(), str(number).strip().upper())
+    with _lock:
+        fut = _inflight.get(key)
+        leader = fut is None
+        if leader:
+            fut = Future()
+            _inflight[key] = fut
+    if not leader:
+        log(f"{key[0]}/{key[1]}: joined in-process flight")
+        # 与跨进程等待相同：不超过剩余预算与 WAIT_TIMEOUT_SEC，超时则自己执行
+        try:
+            res = fut.result(timeout=deadline.current().sec(WAIT_TIMEOUT_SEC))
+        except FutureTimeout:
+            log(f"{key[0]}/{key[1]}: wait timeout, running locally")
+            return fn()
+        return {**res, "coalesced": True} if isinstance(res, dict) else res
+    try:
+        res, own = _run_cross_process(key[0], key[1], fn)
+        if not own and isinstance(res, dict):
+            res = {**res, "coalesced": True}
+        fut.set_result(res)
+        return res
+    except BaseException as e:
+        fut.set_exception(e)
+        raise
+    finally:
+        with _lock:
+            _inflight.pop(key, None)
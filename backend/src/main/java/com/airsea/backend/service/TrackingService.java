@@ -136,6 +136,10 @@ public class TrackingService {
         Path detA = Paths.get("backend", "app", "debug", "wanhai_ocr_detail.txt");
         Path detB = Paths.get("app", "debug", "wanhai_ocr_detail.txt");
         log.debug("[tracking][wanhai-ocr] try read eta from {} or {}", etaA.toString(), etaB.toString());
+        // 先删除上一个单号留下的结果文件，避免在本次脚本写入前读到旧 ETA
+        for (Path p : new Path[]{etaA, etaB, detA, detB}) {
+            try { Files.deleteIfExists(p); } catch (Exception ignore) {}
+        }
         // 触发 Python 抓取（后台）以生成最新 OCR 文件
         tryRunWanhaiPythonAsync(trackingNo);
         // 阻塞轮询直到 ETA 文件出现并非空
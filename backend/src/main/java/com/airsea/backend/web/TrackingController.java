@@ -134,18 +134,18 @@ public class TrackingController {
             ACTIVE_EXECUTORS.remove(exec);
             if ("java".equals(winnerSource)) {
                 Process pw = pyWanRef.get();
-                if (pw != null && pw.isAlive()) { pw.destroyForcibly(); log.debug("[tracking] wanhai python destroyed because java won"); }
+                if (pw != null && pw.isAlive()) { stopPythonAsync(pw); log.debug("[tracking] wanhai python cancelled because java won"); }
                 Process ps = pyShipRef.get();
-                if (ps != null && ps.isAlive()) { ps.destroyForcibly(); log.debug("[tracking] shipmentlink python destroyed because java won"); }
+                if (ps != null && ps.isAlive()) { stopPythonAsync(ps); log.debug("[tracking] shipmentlink python cancelled because java won"); }
             } else if ("wanhai".equals(winnerSource)) {
                 // 取消 Java；结束另一个 Python（shipmentlink）
                 try { fJava.cancel(true); } catch (Exception ignore) {}
                 Process ps = pyShipRef.get();
-                if (ps != null && ps.isAlive()) { ps.destroyForcibly(); log.debug("[tracking] shipmentlink python destroyed because wanhai won"); }
+                if (ps != null && ps.isAlive()) { stopPythonAsync(ps); log.debug("[tracking] shipmentlink python cancelled because wanhai won"); }
             } else if ("shipmentlink".equals(winnerSource)) {
                 try { fJava.cancel(true); } catch (Exception ignore) {}
                 Process pw = pyWanRef.get();
-                if (pw != null && pw.isAlive()) { pw.destroyForcibly(); log.debug("[tracking] wanhai python destroyed because shipmentlink won"); }
+                if (pw != null && pw.isAlive()) { stopPythonAsync(pw); log.debug("[tracking] wanhai python cancelled because shipmentlink won"); }
             }
             log.debug("[tracking] query-all finished in {}ms, winner={} source={}",
                     System.currentTimeMillis()-t0, winner != null, winnerSource);
@@ -193,7 +193,7 @@ public class TrackingController {
         String stderr = readFully(p.getErrorStream());
         boolean finished = p.waitFor(Duration.ofSeconds(180).toMillis(), java.util.concurrent.TimeUnit.MILLISECONDS);
         if (!finished) {
-            p.destroyForcibly();
+            stopPython(p);
             log.debug("[tracking] python scrape timeout, stderrSnippet={}", truncate(stderr));
             return null;
         }
@@ -238,7 +238,7 @@ public class TrackingController {
         String stderr = readFully(p.getErrorStream());
         boolean finished = p.waitFor(Duration.ofSeconds(180).toMillis(), java.util.concurrent.TimeUnit.MILLISECONDS);
         if (!finished) {
-            p.destroyForcibly();
+            stopPython(p);
             log.debug("[tracking] shipmentlink python timeout, stderrSnippet={}", truncate(stderr));
             return null;
         }
@@ -266,7 +266,7 @@ public class TrackingController {
         org.slf4j.Logger log = org.slf4j.LoggerFactory.getLogger(TrackingController.class);
         int killedProc = 0;
         for (Process p : ACTIVE_PY_PROCS) {
-            try { if (p != null && p.isAlive()) { p.destroyForcibly(); killedProc++; } } catch (Exception ignore) {}
+            try { if (p != null && p.isAlive()) { stopPythonAsync(p); killedProc++; } } catch (Exception ignore) {}
         }
         ACTIVE_PY_PROCS.clear();
         int shutExec = 0;
@@ -308,6 +308,29 @@ public class TrackingController {
         return s.length() > 400 ? s.substring(0, 400) : s;
     }
 
+    // 结束输掉赛跑的 Python：先经 stdin 发送 {"op":"cancel"}（非 Windows 再发 SIGTERM），
+    // 让脚本关闭浏览器、清理会话目录并写完 HAR / trace；2 秒内未退出才强杀
+    private static void stopPython(Process p) {
+        if (p == null || !p.isAlive()) return;
+        try {
+            java.io.OutputStream os = p.getOutputStream();
+            os.write("{\"op\":\"cancel\"}\n".getBytes(StandardCharsets.UTF_8));
+            os.flush();
+        } catch (Exception ignore) {}
+        // Windows 上 destroy() 等同强杀，只依赖 stdin 取消
+        if (!System.getProperty("os.name", "").toLowerCase().contains("win")) p.destroy();
+        try {
+            if (p.waitFor(2, java.util.concurrent.TimeUnit.SECONDS)) return;
+        } catch (InterruptedException e) {
+            Thread.currentThread().interrupt();
+        }
+        p.destroyForcibly();
+    }
+
+    private static void stopPythonAsync(Process p) {
+        java.util.concurrent.CompletableFuture.runAsync(() -> stopPython(p));
+    }
+
     private void streamToLog(InputStream in, String tag) {
         org.slf4j.Logger log = org.slf4j.LoggerFactory.getLogger(TrackingController.class);
         try (BufferedReader br = new BufferedReader(new InputStreamReader(in, StandardCharsets.UTF_8))) {
@@ -0,0 +1,621 @@
+import asyncio
+import re
+import sys
+from datetime import datetime
+from urllib.parse import quote
+
+from playwright.sync_api import TimeoutError as PlaywrightTimeoutError
+
+import deadline
+import page_waits
+import result_cache
+import strategy_store
+
+# 声明式步骤执行器：承运商流程写在 app/config/<carrier>.json 的 "steps" 中，由这里统一执行。
+# 每步 {"action": ..., 参数..., "optional": false, "timeout_ms": N, "snap": "label"}；
+# 字符串参数中的 {name} 取自配置项与 {number}，引用的配置为空时：optional 步骤跳过，否则报缺少字段；
+# navigate 的 url 中 {number} 按 URL 编码代入。
+# 支持的 action：
+#   init_script   context 级注入脚本（script：字符串或字符串数组）
+#   headers       额外请求头（headers：对象）
+#   dialogs       自动接受对话框；消息包含 invalid 中任一文本时结果为 invalid
+#   capture_json  记录一条 JSON 响应（url_contains 任一子串；URL 含单号者优先），供 extract 使用
+#   navigate      打开 url（首次调用时新建页面）
+#   consent       Cookie 同意：xpath / 按钮名 names / selectors，按上次命中的顺序尝试，总是可选
+#   click         点击 xpath；popup=true 时跟随新窗口，否则等待本页加载
+#   fill          填写 xpath，value 默认 {number}
+#   submit        不等待导航地点击（失败重试一次），settle_ms 后检查无效对话框
+#   wait          load_state / selector / xpath / text / loaders_hidden 任选
+#   extract       xpath 文本 → result，或 from="capture" → data；stale_fallback 时读不到文本用过期缓存
+# 超时全部取自本次查询的剩余预算（deadline）。
+# AsyncRun 是同一套步骤的 async 版本（async_engine 使用），各 action 在 ASYNC_ACTIONS 中各有一份 async 实现。
+
+_VAR = re.compile(r"\{(\w+)\}")
+ACTIONS: dict = {}
+ASYNC_ACTIONS: dict = {}
+
+
+def log(msg: str) -> None:
+    ts = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    print(f"[steps] {ts} {msg}", file=sys.stderr, flush=True)
+
+
+def action(name: str):
+    def deco(fn):
+        ACTIONS[name] = fn
+        return fn
+    return deco
+
+
+def async_action(name: str):
+    def deco(fn):
+        ASYNC_ACTIONS[name] = fn
+        return fn
+    return deco
+
+
+def stage_name(step: dict) -> str:
+    # 阶段名（部分结果的 stage 字段、耗时埋点）：navigate 记为 goto，跟随新窗口的 click 记为 popup
+    name = step.get("action")
+    if name == "navigate":
+        return "goto"
+    if name == "click" and step.get("popup"):
+        return "popup"
+    return name
+
+
+class MissingValue(ValueError):
+    pass
+
+
+class StopRun(Exception):
+    # 步骤内确定了最终结果（例如无效单号），不再执行后续步骤
+    def __init__(self, out: dict):
+        super().__init__(out.get("status"))
+        self.out = out
+
+
+class Capture:
+    # 只保留一条响应：URL 含单号者优先，否则取第一条
+    def __init__(self, number: str, url_contains: list[str], content_type: str):
+        self.number = number
+        self.url_contains = [s.lower() for s in url_contains]
+        self.content_type = content_type
+        self.url = None
+        self.request = None
+        self.response = None
+
+    def matches(self, resp) -> bool:
+        low = (resp.url or "").lower()
+        if self.url_contains and not any(s in low for s in self.url_contains):
+            return False
+        return self.content_type in ((resp.headers or {}).get("content-type", ""))
+
+    def on_response(self, resp) -> None:
+        try:
+            if not self.matches(resp):
+                return
+            if self.url is None or (self.number not in self.url and self.number in resp.url):
+                self.url = resp.url
+                self.request = resp.request
+                self.response = resp
+        except Exception:
+            pass
+
+
+class Run:
+    def __init__(self, carrier: str, context, variables: dict, dbg):
+        self.carrier = carrier
+        self.context = context
+        self.vars = {k: v for k, v in variables.items() if isinstance(v, (str, int, float))}
+        self.number = str(variables.get("number") or variables.get("search_number"))
+        self.vars["number"] = self.number
+        self.dbg = dbg
+        self.dl = deadline.current()
+        self.page = None
+        self.capture: Capture | None = None
+        self.invalid_markers: list[str] = []
+        self.invalid: str | None = None
+        self.out: dict = {}
+
+    # ---- 模板 ----
+    def expand(self, value, url: bool = False):
+        # url=True 时单号按 URL 编码代入（配置项本身即 URL 片段，原样代入）
+        if isinstance(value, list):
+            return [self.expand(v, url) for v in value]
+        if not isinstance(value, str):
+            return value
+        for _ in range(3):
+            missing = [k for k in _VAR.findall(value) if self.vars.get(k) in (None, "")]
+            if missing:
+                raise MissingValue(f"配置缺少必要字段：{' / '.join(missing)}")
+            new = _VAR.sub(lambda m: self._subst(m.group(1), url), value)
+            if new == value:
+                break
+            value = new
+        return value
+
+    def _subst(self, name: str, url: bool) -> str:
+        v = str(self.vars[name])
+        return quote(v, safe="") if url and name == "number" else v
+
+    def timeout(self, step: dict, default: int) -> int:
+        return self.dl.ms(int(step.get("timeout_ms", default)))
+
+    # ---- 页面 ----
+    def _watch_page(self, page) -> None:
+        try:
+            page.on("dialog", self._on_dialog)
+            page.on("console", lambda m: log(f"console[{m.type}] {m.text}"))
+            page.on("pageerror", lambda e: log(f"pageerror: {e}"))
+        except Exception:
+            pass
+
+    def _on_dialog(self, d) -> None:
+        try:
+            msg = d.message or ""
+        except Exception:
+            msg = ""
+        log(f"dialog: {msg}")
+        try:
+            d.accept()
+        except Exception:
+            pass
+        if any(m in msg for m in self.invalid_markers):
+            self.invalid = msg
+
+    def ensure_page(self):
+        if self.page is None:
+            self.page = self.context.new_page()
+            self.page.set_default_timeout(self.dl.ms(15000))
+        return self.page
+
+    def switch_to(self, page) -> None:
+        self.page = page
+
+    def check_invalid(self) -> None:
+        if self.invalid:
+            raise StopRun({"status": "invalid", "number": self.number, "error": self.invalid})
+
+    # ---- 执行 ----
+    def execute(self, steps: list[dict]) -> dict:
+        self.context.on("page", self._watch_page)
+        try:
+            for i, step in enumerate(steps):
+                name = step.get("action")
+                fn = ACTIONS.get(name)
+                if fn is None:
+                    raise ValueError(f"unknown step action: {name}")
+                optional = bool(step.get("optional"))
+                self.dl.mark(step.get("name") or stage_name(step))
+                try:
+                    fn(self, step)
+                except MissingValue:
+                    if not optional:
+                        raise
+                    log(f"skip step {i} ({name}): not configured")
+                except StopRun:
+                    raise
+                except Exception as e:
+                    if not optional:
+                        raise
+                    log(f"optional step {i} ({name}) failed: {e}")
+                self.check_invalid()
+                if step.get("snap") and self.page is not None:
+                    self.dbg.snap(self.page, step["snap"])
+            out = {"status": "ok", "number": self.number, **self.out}
+            self.dbg.write_json(f"{self.carrier}_result.json", out)
+            return out
+        except StopRun as stop:
+            return stop.out
+        except PlaywrightTimeoutError as e:
+            if self.invalid:
+                return {"status": "invalid", "number": self.number, "error": self.invalid}
+            self.dbg.capture_failure(self.page, "timeout")
+            log(f"timeout at step '{self.dl.stage}' after {self.dl.elapsed_ms()}ms: {e}")
+            return {"status": "timeout", "number": self.number, "error": str(e)}
+        except MissingValue:
+            raise
+        except Exception as e:
+            self.dbg.capture_failure(self.page, "error")
+            log(f"error at step '{self.dl.stage}': {e}")
+            return {"status": "error", "number": self.number, "error": str(e)}
+
+
+class AsyncRun(Run):
+    # async_engine 用：context / page 为 playwright.async_api 对象，步骤语义与 Run 相同
+    def _on_dialog(self, d) -> None:
+        try:
+            msg = d.message or ""
+        except Exception:
+            msg = ""
+        log(f"dialog: {msg}")
+        asyncio.ensure_future(self._accept(d))
+        if any(m in msg for m in self.invalid_markers):
+            self.invalid = msg
+
+    @staticmethod
+    async def _accept(d) -> None:
+        try:
+            await d.accept()
+        except Exception:
+            pass
+
+    async def ensure_page(self):
+        if self.page is None:
+            self.page = await self.context.new_page()
+            self.page.set_default_timeout(self.dl.ms(15000))
+        return self.page
+
+    async def snap(self, label: str) -> None:
+        if not self.dbg.enabled("steps"):
+            return
+        try:
+            self.dbg.save_png(label, await self.page.screenshot(full_page=self.dbg.enabled("full")))
+        except Exception:
+            pass
+
+    async def capture_failure(self, label: str) -> None:
+        if not self.dbg.enabled("errors") or self.page is None:
+            return
+        png = html = None
+        try:
+            png = await self.page.screenshot(full_page=self.dbg.enabled("full"))
+        except Exception:
+            pass
+        try:
+            html = await self.page.content()
+        except Exception:
+            pass
+        self.dbg.save_failure(label, png, html)
+
+    async def execute(self, steps: list[dict]) -> dict:
+        self.context.on("page", self._watch_page)
+        try:
+            for i, step in enumerate(steps):
+                name = step.get("action")
+                fn = ASYNC_ACTIONS.get(name)
+                if fn is None:
+                    raise ValueError(f"unknown step action: {name}")
+                optional = bool(step.get("optional"))
+                self.dl.mark(step.get("name") or stage_name(step))
+                try:
+                    await fn(self, step)
+                except MissingValue:
+                    if not optional:
+                        raise
+                    log(f"skip step {i} ({name}): not configured")
+                except StopRun:
+                    raise
+                except Exception as e:
+                    if not optional:
+                        raise
+                    log(f"optional step {i} ({name}) failed: {e}")
+                self.check_invalid()
+                if step.get("snap") and self.page is not None:
+                    await self.snap(step["snap"])
+            out = {"status": "ok", "number": self.number, **self.out}
+            self.dbg.write_json(f"{self.carrier}_result.json", out)
+            return out
+        except StopRun as stop:
+            return stop.out
+        except PlaywrightTimeoutError as e:
+            # async_api 的 TimeoutError 与 sync_api 是同一个类
+            if self.invalid:
+                return {"status": "invalid", "number": self.number, "error": self.invalid}
+            await self.capture_failure("timeout")
+            log(f"timeout at step '{self.dl.stage}' after {self.dl.elapsed_ms()}ms: {e}")
+            return {"status": "timeout", "number": self.number, "error": str(e)}
+        except MissingValue:
+            raise
+        except Exception as e:
+            await self.capture_failure("error")
+            log(f"error at step '{self.dl.stage}': {e}")
+            return {"status": "error", "number": self.number, "error": str(e)}
+
+
+# ---- 各 action ----
+@action("init_script")
+def _init_script(run: Run, step: dict) -> None:
+    script = step["script"]
+    run.context.add_init_script("\n".join(script) if isinstance(script, list) else script)
+
+
+@action("headers")
+def _headers(run: Run, step: dict) -> None:
+    run.context.set_extra_http_headers({k: run.expand(v) for k, v in step["headers"].items()})
+
+
+@action("dialogs")
+def _dialogs(run: Run, step: dict) -> None:
+    run.invalid_markers.extend(run.expand(step.get("invalid") or []))
+
+
+@action("capture_json")
+def _capture_json(run: Run, step: dict) -> None:
+    run.capture = Capture(run.number, run.expand(step.get("url_contains") or []),
+                          step.get("content_type", "application/json"))
+    run.context.on("response", run.capture.on_response)
+
+
+@action("navigate")
+def _navigate(run: Run, step: dict) -> None:
+    url = run.expand(step["url"], url=True)
+    log(f"goto: {url}")
+    run.ensure_page().goto(url, wait_until=step.get("wait_until", "domcontentloaded"),
+                           timeout=run.timeout(step, 30000))
+
+
+@action("consent")
+def _consent(run: Run, step: dict) -> None:
+    # 各写法按 strategy_store 学到的顺序尝试，上次点中的先试
+    page = run.ensure_page()
+    cands = []
+    if step.get("xpath"):
+        try:
+            cands.append(("config xpath", page.locator(f"xpath={run.expand(step['xpath'])}")))
+        except MissingValue:
+            pass
+    names = step.get("names") or []
+    if names:
+        rx = re.compile("|".join(re.escape(n) for n in names), re.I)
+        cands.append(("role-button", page.get_by_role("button", name=rx)))
+    for sel in step.get("selectors") or []:
+        cands.append((sel, page.locator(sel)))
+
+    def attempt(label, loc):
+        def fn():
+            if not (loc.count() > 0 and loc.first.is_visible()):
+                return None
+            loc.first.click(timeout=run.dl.ms(2000))
+            log(f"clicked cookie consent via {label}")
+            try:
+                loc.first.wait_for(state="hidden", timeout=run.dl.ms(3000))
+            except Exception:
+                pass
+            return True
+        return fn
+
+    strategy_store.first_success(run.carrier, step.get("name") or "consent",
+                                 [(label, attempt(label, loc)) for label, loc in cands],
+                                 record_all_miss=False)
+
+
+@action("click")
+def _click(run: Run, step: dict) -> None:
+    page = run.ensure_page()
+    btn = page.locator(f"xpath={run.expand(step['xpath'])}")
+    btn.wait_for(timeout=run.timeout(step, 15000))
+    if step.get("popup"):
+        try:
+            with run.context.expect_page(timeout=run.dl.ms(int(step.get("popup_timeout_ms", 5000)))) as pinfo:
+                btn.click()
+            new_page = pinfo.value
+            new_page.wait_for_load_state("domcontentloaded", timeout=run.dl.ms(15000))
+            run.switch_to(new_page)
+            log("detected new page after click")
+            return
+        except PlaywrightTimeoutError:
+            pass
+    btn.click()
+    try:
+        page.wait_for_load_state("domcontentloaded", timeout=run.dl.ms(15000))
+    except Exception:
+        pass
+
+
+@action("fill")
+def _fill(run: Run, step: dict) -> None:
+    loc = run.ensure_page().locator(f"xpath={run.expand(step['xpath'])}")
+    loc.wait_for(timeout=run.timeout(step, 20000))
+    loc.fill(run.expand(step.get("value", "{number}")))
+    log(f"filled search number: {run.number}")
+
+
+@action("submit")
+def _submit(run: Run, step: dict) -> None:
+    page = run.ensure_page()
+    btn = page.locator(f"xpath={run.expand(step['xpath'])}")
+    log("click search button ...")
+    try:
+        btn.click(no_wait_after=True, timeout=run.timeout(step, 15000))
+    except Exception:
+        # 重试一次
+        page.wait_for_timeout(run.dl.ms(200))
+        btn.click(no_wait_after=True, timeout=run.timeout(step, 15000))
+    settle = int(step.get("settle_ms", 0))
+    if settle:
+        page.wait_for_timeout(run.dl.ms(settle))
+
+
+@action("wait")
+def _wait(run: Run, step: dict) -> None:
+    page = run.ensure_page()
+    ms = run.timeout(step, 15000)
+    if step.get("load_state"):
+        page.wait_for_load_state(step["load_state"], timeout=ms)
+    if step.get("selector"):
+        page.wait_for_selector(run.expand(step["selector"]), timeout=ms)
+    if step.get("xpath"):
+        page.locator(f"xpath={run.expand(step['xpath'])}").wait_for(timeout=ms)
+    if step.get("text"):
+        page.wait_for_selector(f"text={run.expand(step['text'])}", timeout=ms)
+    if step.get("loaders_hidden"):
+        page_waits.wait_loaders_hidden(page, ms)
+
+
+@action("extract")
+def _extract(run: Run, step: dict) -> None:
+    if step.get("from") == "capture":
+        cap = run.capture
+        if cap is None or cap.response is None:
+            if not step.get("optional"):
+                log("no captured response")
+            return
+        run.out["api_url"] = cap.url
+        run.out["data"] = cap.response.json()
+        return
+    page = run.ensure_page()
+    loc = page.locator(f"xpath={run.expand(step['xpath'])}")
+    loc.wait_for(timeout=run.timeout(step, 60000))
+    text = (loc.text_content(timeout=run.dl.ms(10000)) or "").strip()
+    if not text and step.get("stale_fallback"):
+        # 页面读取不到结果时，兜底使用缓存中（可能已过期）的上次结果
+        stale = result_cache.get_cache().get(run.carrier, run.number, allow_stale=True)
+        if stale and stale.get("status") == "ok" and stale.get("result"):
+            text = str(stale.get("result")).strip()
+            log(f"fallback to cached result ({stale.get('cache')})")
+    log(f"result: {text}")
+    run.out[step.get("field", "result")] = text
+
+
+# ---- 各 action 的 async 版本（AsyncRun）----
+@async_action("init_script")
+async def _init_script_async(run: AsyncRun, step: dict) -> None:
+    script = step["script"]
+    await run.context.add_init_script("\n".join(script) if isinstance(script, list) else script)
+
+
+@async_action("headers")
+async def _headers_async(run: AsyncRun, step: dict) -> None:
+    await run.context.set_extra_http_headers({k: run.expand(v) for k, v in step["headers"].items()})
+
+
+@async_action("dialogs")
+async def _dialogs_async(run: AsyncRun, step: dict) -> None:
+    _dialogs(run, step)
+
+
+@async_action("capture_json")
+async def _capture_json_async(run: AsyncRun, step: dict) -> None:
+    # Capture.on_response 只读 url / headers / request 属性，async 对象上同样适用
+    _capture_json(run, step)
+
+
+@async_action("navigate")
+async def _navigate_async(run: AsyncRun, step: dict) -> None:
+    url = run.expand(step["url"], url=True)
+    log(f"goto: {url}")
+    await (await run.ensure_page()).goto(url, wait_until=step.get("wait_until", "domcontentloaded"),
+                                         timeout=run.timeout(step, 30000))
+
+
+@async_action("consent")
+async def _consent_async(run: AsyncRun, step: dict) -> None:
+    page = await run.ensure_page()
+    cands = []
+    if step.get("xpath"):
+        try:
+            cands.append(("config xpath", page.locator(f"xpath={run.expand(step['xpath'])}")))
+        except MissingValue:
+            pass
+    names = step.get("names") or []
+    if names:
+        rx = re.compile("|".join(re.escape(n) for n in names), re.I)
+        cands.append(("role-button", page.get_by_role("button", name=rx)))
+    for sel in step.get("selectors") or []:
+        cands.append((sel, page.locator(sel)))
+
+    def attempt(label, loc):
+        async def fn():
+            if not (await loc.count() > 0 and await loc.first.is_visible()):
+                return None
+            await loc.first.click(timeout=run.dl.ms(2000))
+            log(f"clicked cookie consent via {label}")
+            try:
+                await loc.first.wait_for(state="hidden", timeout=run.dl.ms(3000))
+            except Exception:
+                pass
+            return True
+        return fn
+
+    await strategy_store.first_success_async(run.carrier, step.get("name") or "consent",
+                                             [(label, attempt(label, loc)) for label, loc in cands],
+                                             record_all_miss=False)
+
+
+@async_action("click")
+async def _click_async(run: AsyncRun, step: dict) -> None:
+    page = await run.ensure_page()
+    btn = page.locator(f"xpath={run.expand(step['xpath'])}")
+    await btn.wait_for(timeout=run.timeout(step, 15000))
+    if step.get("popup"):
+        try:
+            async with run.context.expect_page(timeout=run.dl.ms(int(step.get("popup_timeout_ms", 5000)))) as pinfo:
+                await btn.click()
+            new_page = await pinfo.value
+            await new_page.wait_for_load_state("domcontentloaded", timeout=run.dl.ms(15000))
+            run.switch_to(new_page)
+            log("detected new page after click")
+            return
+        except PlaywrightTimeoutError:
+            pass
+    await btn.click()
+    try:
+        await page.wait_for_load_state("domcontentloaded", timeout=run.dl.ms(15000))
+    except Exception:
+        pass
+
+
+@async_action("fill")
+async def _fill_async(run: AsyncRun, step: dict) -> None:
+    loc = (await run.ensure_page()).locator(f"xpath={run.expand(step['xpath'])}")
+    await loc.wait_for(timeout=run.timeout(step, 20000))
+    await loc.fill(run.expand(step.get("value", "{number}")))
+    log(f"filled search number: {run.number}")
+
+
+@async_action("submit")
+async def _submit_async(run: AsyncRun, step: dict) -> None:
+    page = await run.ensure_page()
+    btn = page.locator(f"xpath={run.expand(step['xpath'])}")
+    log("click search button ...")
+    try:
+        await btn.click(no_wait_after=True, timeout=run.timeout(step, 15000))
+    except Exception:
+        # 重试一次
+        await page.wait_for_timeout(run.dl.ms(200))
+        await btn.click(no_wait_after=True, timeout=run.timeout(step, 15000))
+    settle = int(step.get("settle_ms", 0))
+    if settle:
+        await page.wait_for_timeout(run.dl.ms(settle))
+
+
+@async_action("wait")
+async def _wait_async(run: AsyncRun, step: dict) -> None:
+    page = await run.ensure_page()
+    ms = run.timeout(step, 15000)
+    if step.get("load_state"):
+        await page.wait_for_load_state(step["load_state"], timeout=ms)
+    if step.get("selector"):
+        await page.wait_for_selector(run.expand(step["selector"]), timeout=ms)
+    if step.get("xpath"):
+        await page.locator(f"xpath={run.expand(step['xpath'])}").wait_for(timeout=ms)
+    if step.get("text"):
+        await page.wait_for_selector(f"text={run.expand(step['text'])}", timeout=ms)
+    if step.get("loaders_hidden"):
+        await page_waits.async_wait_loaders_hidden(page, ms)
+
+
+@async_action("extract")
+async def _extract_async(run: AsyncRun, step: dict) -> None:
+    if step.get("from") == "capture":
+        cap = run.capture
+        if cap is None or cap.response is None:
+            if not step.get("optional"):
+                log("no captured response")
+            return
+        run.out["api_url"] = cap.url
+        run.out["data"] = await cap.response.json()
+        return
+    page = await run.ensure_page()
+    loc = page.locator(f"xpath={run.expand(step['xpath'])}")
+    await loc.wait_for(timeout=run.timeout(step, 60000))
+    text = (await loc.text_content(timeout=run.dl.ms(10000)) or "").strip()
+    if not text and step.get("stale_fallback"):
+        stale = await asyncio.to_thread(result_cache.get_cache().get, run.carrier, run.number, allow_stale=True)
+        if stale and stale.get("status") == "ok" and stale.get("result"):
+            text = str(stale.get("result")).strip()
+            log(f"fallback to cached result ({stale.get('cache')})")
+    log(f"result: {text}")
+    run.out[step.get("field", "result")] = text
@@ -0,0 +1,133 @@
+import json
+import os
+import sys
+import threading
+import time
+from datetime import datetime
+
+# 选择器 / 点击策略的学习记录：页面上的同一个操作往往有一串兜底写法（配置 XPath → get_by_role → CSS → 写死的 XPath，
+# 或 popup → 本页导航 → href goto），每个尝试都是一次 CDP 往返，等错了还要白等超时。
+# 这里按 承运商 / 操作点 记录每个策略的命中与未命中次数和上次命中的策略，下次先试上次成功的那个。
+#   name, value = strategy_store.first_success("wanhai", "detail_link", [("popup", fn1), ("navigation", fn2)])
+# 策略函数返回非 None 即为成功，返回 None 或抛异常记为未命中。
+# 记录在 app/cache/selector_strategies.json，文件整体原子替换；多进程并发时偶有计数丢失可以接受。
+
+STORE_PATH = os.path.join(os.path.dirname(__file__), "app", "cache", "selector_strategies.json")
+
+_lock = threading.Lock()
+_store: dict | None = None
+
+
+def log(msg: str) -> None:
+    ts = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    print(f"[strategy] {ts} {msg}", file=sys.stderr, flush=True)
+
+
+def _load() -> dict:
+    global _store
+    if _store is None:
+        try:
+            with open(STORE_PATH, "r", encoding="utf-8") as f:
+                _store = json.load(f)
+        except Exception:
+            _store = {}
+    return _store
+
+
+def _save() -> None:
+    try:
+        os.makedirs(os.path.dirname(STORE_PATH), exist_ok=True)
+        tmp = STORE_PATH + f".{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(_store, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, STORE_PATH)
+    except Exception as e:
+        log(f"save strategies failed: {e}")
+
+
+def order(carrier: str, point: str, names: list[str]) -> list[str]:
+    # 上次命中的排第一，其余按命中率降序；从未试过的保持原顺序排在命中率为 0 的之前
+    with _lock:
+        entry = _load().get(carrier, {}).get(point, {})
+    last = entry.get("last")
+    stats = entry.get("strategies", {})
+
+    def key(item):
+        i, name = item
+        s = stats.get(name)
+        if name == last:
+            return (0, 0.0, i)
+        if not s:
+            return (1, 0.0, i)
+        tried = s.get("hit", 0) + s.get("miss", 0)
+        rate = s.get("hit", 0) / tried if tried else 0.0
+        return (1 if rate > 0 else 2, -rate, i)
+
+    return [name for _, name in sorted(enumerate(names), key=key)]
+
+
+def record(carrier: str, point: str, hit: str | None, missed: list[str]) -> None:
+    with _lock:
+        entry = _load().setdefault(carrier, {}).setdefault(point, {})
+        stats = entry.setdefault("strategies", {})
+        for name in missed:
+            s = stats.setdefault(name, {"hit": 0, "miss": 0})
+            s["miss"] = int(s.get("miss", 0)) + 1
+        if hit is not None:
+            s = stats.setdefault(hit, {"hit": 0, "miss": 0})
+            s["hit"] = int(s.get("hit", 0)) + 1
+            s["last_hit"] = int(time.time())
+            entry["last"] = hit
+        _save()
+
+
+def first_success(carrier: str, point: str, attempts: list[tuple], record_all_miss: bool = True):
+    # 按学习到的顺序尝试，返回 (策略名, 结果)；全部失败返回 (None, None)
+    # record_all_miss=False：全部未命中时不计数（例如本次根本没有 Cookie 弹窗，不应惩罚任何策略）
+    fns = dict(attempts)
+    ranked = order(carrier, point, [name for name, _ in attempts])
+    missed = []
+    for name in ranked:
+        try:
+            value = fns[name]()
+        except Exception as e:
+            log(f"{carrier}/{point}: {name} failed: {e}")
+            value = None
+        if value is not None:
+            if missed:
+                log(f"{carrier}/{point}: {name} succeeded after {missed}")
+            record(carrier, point, name, missed)
+            return name, value
+        missed.append(name)
+    if record_all_miss and missed:
+        record(carrier, point, None, missed)
+    return None, None
+
+
+async def first_success_async(carrier: str, point: str, attempts: list[tuple], record_all_miss: bool = True):
+    # first_success 的 async 版本：attempts 中的函数返回 awaitable
+    fns = dict(attempts)
+    ranked = order(carrier, point, [name for name, _ in attempts])
+    missed = []
+    for name in ranked:
+        try:
+            value = await fns[name]()
+        except Exception as e:
+            log(f"{carrier}/{point}: {name} failed: {e}")
+            value = None
+        if value is not None:
+            if missed:
+                log(f"{carrier}/{point}: {name} succeeded after {missed}")
+            record(carrier, point, name, missed)
+            return name, value
+        missed.append(name)
+    if record_all_miss and missed:
+        record(carrier, point, None, missed)
+    return None, None
+
+
+def stats(carrier: str | None = None) -> dict:
+    # 命中统计快照：{carrier: {point: {"last": ..., "strategies": {name: {"hit", "miss", "last_hit"}}}}}
+    with _lock:
+        data = json.loads(json.dumps(_load()))
+    return data.get(carrier, {}) if carrier else data
@@ -0,0 +1,35 @@
+import os
+import signal
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cancellation  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def clean_state(monkeypatch):
+    monkeypatch.setattr(cancellation, "_terminating", False)
+    monkeypatch.setattr(cancellation, "_armed", False)
+    cancellation.reset()
+    yield
+    monkeypatch.setattr(cancellation, "_terminating", False)
+    cancellation.reset()
+
+
+def test_signal_outside_scope_only_sets_flag():
+    # 输出结果 / 关闭浏览器池时收到 SIGTERM：不抛出，由下一个检查点处理
+    cancellation._on_signal(signal.SIGTERM, None)
+    assert cancellation.terminating()
+    assert cancellation.exit_code() == 143
+    with pytest.raises(cancellation.Cancelled):
+        with cancellation.cancellable():
+            pass
+
+
+def test_signal_inside_scope_raises():
+    with pytest.raises(cancellation.Cancelled):
+        with cancellation.cancellable():
+            cancellation._on_signal(signal.SIGTERM, None)
@@ -0,0 +1,49 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import carrier_detect  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def empty_history(tmp_path, monkeypatch):
+    monkeypatch.setattr(carrier_detect, "HISTORY_PATH", str(tmp_path / "carrier_history.json"))
+    monkeypatch.setattr(carrier_detect, "_history", None)
+
+
+def _top(number: str) -> str:
+    return carrier_detect.detect(number)[0]["carrier"]
+
+
+def test_iso6346_check_digit():
+    # ISO 6346 标准中的示例箱号 CSQU 305438 3
+    assert carrier_detect.iso6346_check_digit("CSQU305438") == 3
+    assert carrier_detect.is_container_number("CSQU3054383")
+    assert not carrier_detect.is_container_number("CSQU3054384")
+    assert not carrier_detect.is_container_number("CSQU30543")
+
+
+@pytest.mark.parametrize("number,carrier", [
+    ("ZIMUNGB1234567", "zim"),
+    ("026F537809", "wanhai"),
+    ("EGLV 1234-56789", "shipmentlink"),
+    ("123456789012", "shipmentlink"),
+    ("WHLU1234560", "wanhai"),
+])
+def test_prefix_and_owner_rules(number, carrier):
+    assert _top(number) == carrier
+
+
+def test_owner_code_needs_valid_check_digit():
+    ranked = carrier_detect.detect("WHLU1234561")
+    assert all(r["score"] < 0.9 for r in ranked)
+
+
+def test_history_breaks_ties():
+    number = "ABCD1234"
+    assert {r["score"] for r in carrier_detect.detect(number)} == {carrier_detect.BASE_SCORE}
+    carrier_detect.learn("ABCD5678", "zim")  # 同一形状签名 ABCD/8
+    assert _top(number) == "zim"
@@ -0,0 +1,33 @@
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import deadline  # noqa: E402
+
+
+def test_step_timeouts_are_capped_by_remaining_budget():
+    with deadline.scope(2) as dl:
+        assert dl.ms(30000) <= 2000
+        assert dl.ms(500) == 500
+        assert 0 < dl.sec(60) <= 2
+
+
+def test_unbounded_outside_scope():
+    assert deadline.current().ms(15000) == 15000
+
+
+def test_inner_scope_keeps_tighter_outer_budget():
+    with deadline.scope(1) as outer:
+        with deadline.scope(60) as inner:
+            assert inner is outer
+
+
+def test_finish_marks_partial_only_without_answer():
+    with deadline.scope(0.01) as dl:
+        time.sleep(0.03)
+        assert deadline.finish({"status": "ok", "result": "2026-11-01"}, dl) == {"status": "ok", "result": "2026-11-01"}
+        assert deadline.finish({"status": "no_data"}, dl) == {"status": "no_data"}
+        out = deadline.finish({"status": "error"}, dl)
+        assert out["status"] == "timeout" and out["partial"] is True
@@ -0,0 +1,80 @@
+import os
+import sys
+from datetime import date, timedelta
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import result_cache  # noqa: E402
+import single_flight  # noqa: E402
+from result_cache import HOUR, ResultCache  # noqa: E402
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    c = ResultCache(str(tmp_path / "results.db"))
+    monkeypatch.setattr(result_cache, "get_cache", lambda: c)
+    monkeypatch.setattr(result_cache, "enabled", lambda: True)
+    monkeypatch.setattr(single_flight, "INFLIGHT_DIR", str(tmp_path / "inflight"))
+    return c
+
+
+def _eta(days: int) -> dict:
+    return {"status": "ok", "result": (date.today() + timedelta(days=days)).isoformat()}
+
+
+@pytest.mark.parametrize("days,ttl", [(1, 1 * HOUR), (5, 3 * HOUR), (14, 6 * HOUR), (60, 12 * HOUR), (-3, 24 * HOUR)])
+def test_ttl_follows_eta_distance(days, ttl):
+    assert result_cache.ttl_for(_eta(days)) == ttl
+
+
+def test_ttl_skips_unanswered_results():
+    assert result_cache.ttl_for({"status": "ok", "result": "soon"}) == result_cache.OK_TTL_UNKNOWN
+    assert result_cache.ttl_for({"status": "timeout"}) == 0
+    assert result_cache.ttl_for({"status": "ok", "result": ""}) == 0
+    assert result_cache.ttl_for({**_eta(3), "partial": True}) == 0
+
+
+def test_put_get_and_expiry(cache, monkeypatch):
+    assert cache.put("WanHai", " a1 ", _eta(30))
+    hit = cache.get("wanhai", "A1")
+    assert hit["cache"] == "hit" and hit["status"] == "ok"
+    later = result_cache.time.time() + 13 * HOUR
+    monkeypatch.setattr(result_cache.time, "time", lambda: later)
+    assert cache.get("wanhai", "A1") is None
+    assert cache.get("wanhai", "A1", allow_stale=True)["cache"] == "stale"
+
+
+def test_negative_hits_are_counted(cache):
+    assert cache.put_negative("zim", "N1", {"status": "no_data", "error": "No Data."})
+    assert not cache.put_negative("zim", "N2", {"status": "timeout"})
+    first = cache.get_negative("zim", "N1")
+    second = cache.get_negative("zim", "N1")
+    assert first["cache"] == "negative" and second["launchesSaved"] == 2
+    assert cache.launches_saved("zim") == 2
+
+
+def test_negative_replaces_positive_and_back(cache):
+    # 刷新得到 no_data 后旧的 ok 不能继续命中，反之亦然
+    cache.put("wanhai", "X1", _eta(30))
+    cache.put_negative("wanhai", "X1", {"status": "no_data"})
+    assert cache.get("wanhai", "X1") is None
+    assert result_cache.lookup_cached("wanhai", "X1")["status"] == "no_data"
+    cache.put("wanhai", "X1", _eta(30))
+    assert cache.get_negative("wanhai", "X1") is None
+    assert result_cache.lookup_cached("wanhai", "X1")["status"] == "ok"
+
+
+def test_cached_lookup_serves_hits_without_producing(cache):
+    calls = []
+
+    def produce():
+        calls.append(1)
+        return {"status": "no_data", "number": "Q1"}
+
+    assert result_cache.cached_lookup("zim", "Q1", produce)["status"] == "no_data"
+    again = result_cache.cached_lookup("zim", "Q1", produce)
+    assert again["cache"] == "negative" and len(calls) == 1
+    result_cache.cached_lookup("zim", "Q1", produce, refresh=True)
+    assert len(calls) == 2
@@ -0,0 +1,41 @@
+import io
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cancellation  # noqa: E402
+import serve_loop  # noqa: E402
+
+
+def _run(monkeypatch, lines, handle):
+    monkeypatch.setattr(sys, "stdin", io.StringIO("".join(json.dumps(x) + "\n" for x in lines)))
+    out = io.StringIO()
+    monkeypatch.setattr(sys, "stdout", out)
+    rc = serve_loop.serve(handle)
+    cancellation.reset()
+    return rc, [json.loads(line) for line in out.getvalue().splitlines()]
+
+
+def test_cancel_while_idle_does_not_cancel_next_request(monkeypatch):
+    # 空闲时的取消不应残留到下一条请求
+    seen = []
+
+    def handle(req):
+        seen.append(req["number"])
+        cancellation.check()
+        return {"status": "ok", "number": req["number"]}
+
+    rc, replies = _run(monkeypatch, [{"op": "cancel"}, {"id": 1, "number": "A1"}], handle)
+    assert rc == 0
+    assert replies[0] == {"id": None, "status": "ok", "op": "cancel", "running": False}
+    assert replies[1]["id"] == 1 and replies[1]["status"] == "ok"
+    assert seen == ["A1"]
+
+
+def test_cancel_queued_id_drops_request(monkeypatch):
+    rc, replies = _run(monkeypatch, [{"op": "cancel", "id": 7}, {"id": 7, "number": "B7"}],
+                       lambda req: {"status": "ok", "number": req["number"]})
+    assert replies[0]["running"] is False
+    assert replies[1] == {"id": 7, "status": "cancelled", "number": "B7"}
@@ -0,0 +1,34 @@
+import os
+import sys
+
+import pytest
+
+pytest.importorskip("lxml")
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND)
+
+import http_client  # noqa: E402
+import shipmentlink_http  # noqa: E402
+
+FIXTURES = os.path.join(BACKEND, "bench", "fixtures", "shipmentlink")
+
+
+def _page(name: str):
+    with open(os.path.join(FIXTURES, name), encoding="utf-8") as f:
+        return http_client.parse_html(f.read())
+
+
+@pytest.mark.parametrize("name,invalid", [
+    ("search.html", False),   # doSearch() 校验脚本里的提示不算
+    ("result.html", False),
+    ("no_data.html", False),
+    ("invalid.html", True),
+])
+def test_invalid_page_detection(name, invalid):
+    assert shipmentlink_http.is_invalid_page(_page(name)) is invalid
+
+
+def test_only_top_level_alerts_count():
+    script = 'function f() { alert("Booking No. is not valid"); }\nalert("hello");'
+    assert shipmentlink_http._top_level_alerts(script) == ["hello"]
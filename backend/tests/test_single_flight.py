@@ -0,0 +1,102 @@
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import deadline  # noqa: E402
+import single_flight  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def inflight_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(single_flight, "INFLIGHT_DIR", str(tmp_path))
+
+
+def _leader(carrier: str, number: str, fn, started: threading.Event):
+    box = {}
+
+    def run():
+        box["res"] = single_flight.run(carrier, number, fn)
+
+    t = threading.Thread(target=run)
+    t.start()
+    assert started.wait(2)
+    return t, box
+
+
+def test_follower_shares_leader_result():
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def fn():
+        calls.append(1)
+        started.set()
+        release.wait(2)
+        return {"status": "ok", "result": "2026-11-01"}
+
+    t, box = _leader("WanHai", "a1", fn, started)
+    threading.Timer(0.1, release.set).start()
+    res = single_flight.run("wanhai", "A1 ", lambda: {"status": "error"})
+    t.join()
+    assert len(calls) == 1
+    assert res == {"status": "ok", "result": "2026-11-01", "coalesced": True}
+    assert "coalesced" not in box["res"]
+
+
+def test_follower_wait_is_bounded_by_budget():
+    # 执行者卡住时跟随者不能无限等待：超过剩余预算后自己执行
+    started, release = threading.Event(), threading.Event()
+
+    def stuck():
+        started.set()
+        release.wait(5)
+        return {"status": "ok", "result": "late"}
+
+    t, _ = _leader("zim", "B2", stuck, started)
+    try:
+        t0 = time.monotonic()
+        with deadline.scope(0.3):
+            res = single_flight.run("zim", "B2", lambda: {"status": "ok", "result": "local"})
+        assert res == {"status": "ok", "result": "local"}
+        assert time.monotonic() - t0 < 2
+    finally:
+        release.set()
+        t.join()
+
+
+def test_leader_exception_reaches_follower():
+    started, release = threading.Event(), threading.Event()
+
+    def boom():
+        started.set()
+        release.wait(2)
+        raise RuntimeError("boom")
+
+    box = {}
+
+    def run():
+        try:
+            single_flight.run("zim", "C3", boom)
+        except RuntimeError as e:
+            box["leader"] = str(e)
+
+    t = threading.Thread(target=run)
+    t.start()
+    assert started.wait(2)
+    threading.Timer(0.1, release.set).start()
+    with pytest.raises(RuntimeError):
+        single_flight.run("zim", "C3", lambda: {"status": "ok"})
+    t.join()
+    assert box["leader"] == "boom"
+
+
+def test_cross_process_result_file_is_shared(tmp_path):
+    base = single_flight._base("zim", "D4")
+    single_flight._write_result(base + ".json", {"status": "ok", "result": "x"})
+    assert single_flight._read_result(base + ".json", since=0) == {"status": "ok", "result": "x"}
+    # 本次等待开始之前写下的结果不算
+    assert single_flight._read_result(base + ".json", since=time.time() + 1) is None
@@ -0,0 +1,46 @@
+import json
+import os
+import stat
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import http_client  # noqa: E402
+import zim_api  # noqa: E402
+
+
+def test_classify():
+    assert zim_api.classify({"IsSuccess": True, "Data": {"ETA": "2026-11-01"}}) == ("ok", None)
+    assert zim_api.classify({"IsSuccess": True, "Data": None, "Message": "No results"}) == ("no_data", "No results")
+    assert zim_api.classify({"IsSuccess": False, "Message": "bad"}) == ("invalid", "bad")
+    # 认不出的结构不进负缓存
+    assert zim_api.classify([{"Date": "2026-10-20"}]) == ("ok", None)
+    assert zim_api.classify({"events": []}) == ("ok", None)
+
+
+@pytest.fixture
+def paths(tmp_path, monkeypatch):
+    monkeypatch.setattr(zim_api, "TEMPLATE_PATH", str(tmp_path / "zim_api.json"))
+    monkeypatch.setattr(zim_api, "SECRET_PATH", str(tmp_path / "zim_api.secret.json"))
+    monkeypatch.setattr(zim_api, "_template", None)
+    monkeypatch.setattr(http_client, "import_cookies", lambda *a: None)
+
+
+def test_auth_headers_kept_out_of_template(paths):
+    headers = {"Authorization": "Bearer t", "Accept": "application/json", "Cookie": "a=b"}
+    assert zim_api.learn("ZIMU1", "https://x/api/track?n=ZIMU1", "GET", headers, None, [])
+    with open(zim_api.TEMPLATE_PATH, encoding="utf-8") as f:
+        stored = json.load(f)
+    assert stored["url"] == f"https://x/api/track?n={zim_api.PLACEHOLDER}"
+    assert stored["headers"] == {"Accept": "application/json"}
+    if os.name == "posix":
+        assert stat.S_IMODE(os.stat(zim_api.SECRET_PATH).st_mode) == 0o600
+    # 新进程：从磁盘加载时合并回鉴权头
+    zim_api._template = None
+    assert zim_api.load_template()["headers"]["Authorization"] == "Bearer t"
+    # 鉴权头缺失时不回放
+    os.remove(zim_api.SECRET_PATH)
+    zim_api._template = None
+    assert zim_api.load_template() is None
@@ -0,0 +1,115 @@
+import re
+import sys
+from datetime import datetime
+
+import deadline
+import http_client
+
+# WanHai 详情页的纯 HTTP 快速通道：直接 GET tracking_data_page.xhtml，
+# 解析 ETA 与各节点时间；遇到 WAF 验证或 JSF view-state 错误返回 None，由调用方启动浏览器。
+
+DEFAULT_DETAIL_BASE = "https://www.wanhai.com/views/cargo_track_v2"
+ETA_LABELS = ("ESTIMATED ARRIVAL DATE", "EST. ARRIVAL DATE", "EST ARRIVAL DATE", "ETA")
+VIEW_STATE_ERRORS = (
+    "viewexpiredexception",
+    "javax.faces.application.viewexpired",
+    "view could not be restored",
+)
+DATEISH = re.compile(
+    r"^(\d{4}[-/.]\d{1,2}[-/.]\d{1,2}|\d{1,2}[-/.][A-Z]{3}[-/.]\d{4}|[A-Z]{3}[-/.]\d{1,2}[-/.]\d{4})",
+    re.I,
+)
+
+
+def log(msg: str) -> None:
+    ts = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    print(f"[wanhai-http] {ts} {msg}", file=sys.stderr, flush=True)
+
+
+def detail_base(search_url: str | None) -> str:
+    # 详情页与查询页同目录：.../cargo_track_v2/tracking_query.xhtml
+    if search_url and "/" in search_url:
+        return search_url.rsplit("/", 1)[0]
+    return DEFAULT_DETAIL_BASE
+
+
+def parse_eta(tree) -> str:
+    for td in tree.iter("td"):
+        label = http_client.cell_text(td).upper()
+        if label not in ETA_LABELS:
+            continue
+        sib = td.getnext()
+        while sib is not None and sib.tag != "td":
+            sib = sib.getnext()
+        if sib is None:
+            continue
+        val = http_client.cell_text(sib)
+        if label == "ETA" and not DATEISH.match(val):
+            continue
+        if val:
+            return val
+    return ""
+
+
+def parse_milestones(tree) -> list[dict]:
+    # 节点表：每行至少一个日期格，其余列拼成事件描述
+    out = []
+    for tr in tree.iter("tr"):
+        cells = [http_client.cell_text(td) for td in tr if td.tag in ("td", "th")]
+        if len(cells) < 2 or tr.find(".//table") is not None:
+            continue
+        dates = [c for c in cells if DATEISH.match(c)]
+        if not dates:
+            continue
+        event = " | ".join(c for c in cells if c and c not in dates)
+        if event.upper() in ETA_LABELS:
+            continue
+        out.append({"date": dates[0], "event": event})
+    return out
+
+
+def is_no_data(tree) -> bool:
+    return any(http_client.cell_text(td) == "No Data." for td in tree.iter("td"))
+
+
+def fetch_detail(number: str, ref_type: str, base_url: str, timeout: float = 15) -> dict | None:
+    url = f"{base_url}/tracking_data_page.xhtml?ref_no={number}&ref_type={ref_type}"
+    sess = http_client.get_session("wanhai")
+    try:
+        resp = sess.get(url, timeout=deadline.current().sec(timeout), headers={"Referer": f"{base_url}/tracking_query.xhtml"})
+    except Exception as e:
+        log(f"GET failed: {e}")
+        return None
+    if http_client.looks_like_challenge(resp):
+        log(f"challenge detected (status={resp.status_code}), need browser")
+        return None
+    low = (resp.text or "")[:50000].lower()
+    if any(m in low for m in VIEW_STATE_ERRORS):
+        log("JSF view-state error, need browser")
+        return None
+    tree = http_client.parse_html(resp.text)
+    if is_no_data(tree):
+        return {"status": "no_data", "refType": ref_type}
+    eta = parse_eta(tree)
+    if not eta:
+        log(f"ETA not found in HTML (ref_type={ref_type}, {len(resp.content)} bytes)")
+        return None
+    http_client.save_cookies("wanhai")
+    return {"status": "ok", "eta": eta, "milestones": parse_milestones(tree), "refType": ref_type}
+
+
+def lookup(number: str, search_url: str | None = None, timeout: float = 15) -> dict | None:
+    # 先按 B/L（MFT）查，No Data 时再按 Booking（BKG）查；两者都无数据才判定 no_data
+    if not http_client.available():
+        return None
+    base = detail_base(search_url)
+    no_data = None
+    for ref_type in ("MFT", "BKG"):
+        res = fetch_detail(number, ref_type, base, timeout)
+        if res is None:
+            return None
+        if res["status"] == "ok":
+            log(f"{number}: ETA via HTTP ({ref_type})")
+            return res
+        no_data = res
+    return no_data
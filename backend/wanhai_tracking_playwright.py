@@ -6,7 +6,21 @@ import time
 import re
 from datetime import datetime
 
-from playwright.sync_api import sync_playwright, TimeoutError as PlaywrightTimeoutError
+from playwright.sync_api import TimeoutError as PlaywrightTimeoutError
+
+from browser_pool import close_pool, get_pool
+from resource_blocking import install_blocking
+from debug_artifacts import DebugArtifacts, LEVELS
+import wanhai_http
+import ocr_pipeline
+import page_waits
+import har_replay
+import session_state
+import strategy_store
+import deadline
+import carriers
+import serve_loop
+import cancellation
 
 def normalize_date_text(s: str) -> str:
                 import re
@@ -27,12 +41,65 @@ def normalize_date_text(s: str) -> str:
                     return f"{m.group(3)}-{months[m.group(1)]}-{int(m.group(2)):02d}"
                 return s
 
+# 详情页 ETA 扫描脚本：返回 ETA 文本、'__NO_DATA__' 或空串（同步/异步两套流程共用）
+SCAN_ETA_JS = """
+() => {
+  const norm = s => (s||'').replace(/\u00A0/g,' ').replace(/\s+/g,' ').trim();
+  const isDateish = s => {
+    if (!s) return false;
+    const t = norm(s).toUpperCase();
+    // very permissive: 2025-10-10, 10/10/2025, 10-OCT-2025, OCT-10-2025, 2025/10/10, etc.
+    return (
+      /^\d{4}[-\/.]\d{1,2}[-\/.]\d{1,2}/.test(t) ||
+      /^\d{1,2}[-\/.][A-Z]{3}[-\/.]\d{4}/.test(t) ||
+      /^[A-Z]{3}[-\/.]\d{1,2}[-\/.]\d{4}/.test(t)
+    );
+  };
+
+  // Fast exit: No Data.
+  const noData = Array.from(document.querySelectorAll('td')).some(td => norm(td.textContent) === 'No Data.');
+  if (noData) return '__NO_DATA__';
+
+  const labels = ['ESTIMATED ARRIVAL DATE','EST. ARRIVAL DATE','EST ARRIVAL DATE','ETA'];
+  const tds = Array.from(document.querySelectorAll('td'));
+  for (const td of tds) {
+    const txt = norm(td.textContent).toUpperCase();
+    if (labels.includes(txt)) {
+      const sib = td.nextElementSibling;
+      if (sib) {
+        const val = norm(sib.textContent);
+        if (txt === 'ETA') {
+          if (isDateish(val)) return val;
+        } else {
+          if (val) return val;
+        }
+      }
+    }
+  }
+  return '';
+}
+"""
+
+def scan_eta_everywhere_quick(page) -> str:
+    # 一次性扫描主文档与各 frame，不等待；返回 ETA 文本、'__NO_DATA__' 或空串
+    for fr in [page.main_frame] + [f for f in page.frames if f is not page.main_frame]:
+        try:
+            val = fr.evaluate(SCAN_ETA_JS)
+            if val:
+                return val
+        except Exception:
+            continue
+    return ''
+
 def log(msg: str) -> None:
     ts = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     # 将日志写到 stderr，避免干扰 stdout 的 JSON
     print(f"[wanhai] {ts} {msg}", file=sys.stderr, flush=True)
 
 
+PROVIDER = carriers.get("wanhai")
+
+
 def load_config(path: str) -> dict:
     with open(path, "r", encoding="utf-8") as f:
         return json.load(f)
@@ -52,9 +119,10 @@ def debug_link_info(p, el):
     except Exception as e:
         log(f"link info failed: {e}")
 def click_detail_link(curr_page, link_locator, ctx):
+    dl = deadline.current()
     el = link_locator.first
     try:
-        link_locator.first.scroll_into_view_if_needed(timeout=2000)
+        link_locator.first.scroll_into_view_if_needed(timeout=dl.ms(2000))
     except Exception:
         pass
     debug_link_info(curr_page, el)
@@ -65,7 +133,7 @@ def click_detail_link(curr_page, link_locator, ctx):
     except Exception:
         pass
     try:
-        with curr_page.expect_navigation(timeout=12000):
+        with curr_page.expect_navigation(timeout=dl.ms(12000)):
             el.click()
         log(f"same-page navigation to {curr_page.url}")
         return curr_page
@@ -74,10 +142,10 @@ def click_detail_link(curr_page, link_locator, ctx):
 
     # 2) 弹窗
     try:
-        with curr_page.expect_popup(timeout=8000) as pinfo:
+        with curr_page.expect_popup(timeout=dl.ms(8000)) as pinfo:
             el.click()
         new_pg = pinfo.value
-        new_pg.wait_for_load_state("domcontentloaded", timeout=15000)
+        new_pg.wait_for_load_state("domcontentloaded", timeout=dl.ms(15000))
         log(f"popup opened: {new_pg.url}")
         return new_pg
     except Exception as e:
@@ -90,7 +158,7 @@ def click_detail_link(curr_page, link_locator, ctx):
             log(f"eval onclick: {onclick[:120]}")
             curr_page.evaluate("(el)=>{el.target='_self'; el.click();}", el)
             try:
-                curr_page.wait_for_load_state("domcontentloaded", timeout=12000)
+                curr_page.wait_for_load_state("domcontentloaded", timeout=dl.ms(12000))
             except Exception:
                 pass
             return curr_page
@@ -102,14 +170,137 @@ def click_detail_link(curr_page, link_locator, ctx):
         if href and href != '#':
             abs_url = curr_page.evaluate("(u)=>new URL(u, location.href).toString()", href)
             log(f"goto href: {abs_url}")
-            curr_page.goto(abs_url, wait_until="domcontentloaded")
+            curr_page.goto(abs_url, wait_until="domcontentloaded", timeout=dl.ms(30000))
             return curr_page
     except Exception as e:
         log(f"goto href failed: {e}")
 
     log("click attempts exhausted for this link")
     return None
+def open_link(curr_page, el, point: str):
+    # popup / 本页导航 / href goto 三种打开方式，按 strategy_store 学到的顺序尝试（猜错一次要白等 8~15 秒）
+    # 返回 (策略名, 打开后的页面)；都失败返回 (None, None)
+    # 点击有副作用：失败的尝试要恢复元素原样，并检查点击是否已让本页跳走或开了新窗口，再交给下一种方式。
+    # 点击“意外”打开的页面记在实际发生的方式名下（本页跳走算 navigation、新窗口算 popup），
+    # 该方式还没轮到时本次记为未命中，由它在轮到时直接认领，strategy_store 学到的顺序才不会错。
+    dl = deadline.current()
+    start_url = curr_page.url
+    start_pages = list(curr_page.context.pages)
+    tried: set = set()
+
+    def new_popup():
+        try:
+            new_pages = [p for p in curr_page.context.pages if p not in start_pages]
+        except Exception:
+            return None
+        return new_pages[-1] if new_pages else None
+
+    def moved() -> bool:
+        try:
+            return curr_page.url != start_url
+        except Exception:
+            return False
+
+    def settle(pg):
+        try:
+            pg.wait_for_load_state("domcontentloaded", timeout=dl.ms(15000))
+        except Exception:
+            pass
+        log(f"link opened {pg.url}")
+        return pg
+
+    def restore_target(old_target) -> None:
+        try:
+            el.evaluate("(e, t) => t === null ? e.removeAttribute('target') : e.setAttribute('target', t)", old_target)
+        except Exception:
+            pass
+
+    def popup():
+        tried.add("popup")
+        pg = new_popup()
+        if pg is not None:
+            return settle(pg)  # 之前的点击已经开了新窗口，不再点一次
+        try:
+            with curr_page.expect_popup(timeout=dl.ms(8000)) as ppop:
+                el.click()
+        except PlaywrightTimeoutError:
+            if not moved():
+                raise
+            # 本页跳走了：这是 navigation 的结果
+            return settle(curr_page) if "navigation" in tried else None
+        new_pg = ppop.value
+        new_pg.wait_for_load_state("domcontentloaded", timeout=dl.ms(30000))
+        return new_pg
+
+    def navigation():
+        tried.add("navigation")
+        if moved():
+            return settle(curr_page)  # 之前的点击已经让本页跳走
+        old_target = None
+        try:
+            old_target = el.evaluate("e => { const t = e.getAttribute('target'); e.target = '_self'; return t; }")
+        except Exception:
+            pass
+        try:
+            with curr_page.expect_navigation(timeout=dl.ms(15000)):
+                el.click()
+            return curr_page
+        except PlaywrightTimeoutError:
+            # 恢复原 target，之后的 popup 尝试点的仍是原来的元素
+            restore_target(old_target)
+            pg = new_popup()
+            if pg is not None:
+                # 开了新窗口：这是 popup 的结果
+                return settle(pg) if "popup" in tried else None
+            if moved():
+                return settle(curr_page)
+            raise
+
+    def href():
+        if moved() or new_popup() is not None:
+            return None  # 已由之前的点击打开，留给对应的方式认领
+        url = curr_page.evaluate("el => el.href || el.getAttribute('href')", el)
+        if not url or url == '#':
+            return None
+        curr_page.goto(url, wait_until="domcontentloaded", timeout=dl.ms(30000))
+        log(f"goto href: {url}")
+        return curr_page
+
+    return strategy_store.first_success("wanhai", point, [("popup", popup), ("navigation", navigation), ("href", href)])
+
+
+def http_fast_path(config: dict) -> dict | None:
+    # 纯 HTTP 直取详情页（几 KB），失败（WAF / JSF 错误 / 依赖缺失）返回 None 再走浏览器
+    if not config.get("http_fast_path", True):
+        return None
+    search_number = str(config.get("search_number"))
+    try:
+        res = wanhai_http.lookup(search_number, config.get("search_url"))
+    except Exception as e:
+        log(f"http fast path error: {e}")
+        return None
+    if not res:
+        return None
+    if res["status"] == "no_data":
+        return {"status": "no_data", "number": search_number, "error": "No Data.", "source": "http"}
+    eta_text = normalize_date_text(res["eta"])
+    log(f"ETA (via HTTP fast path): before='{res['eta']}' after='{eta_text}'")
+    return {
+        "status": "ok",
+        "number": search_number,
+        "result": eta_text,
+        "milestones": res.get("milestones") or [],
+        "refType": res.get("refType"),
+        "source": "http",
+    }
+
+
 def scrape(config: dict) -> dict:
+    # 缓存 / 预算 / 快速通道 / profile 租约由 carriers 统一处理，浏览器部分回到本模块的 _scrape()
+    return PROVIDER.scrape(config)
+
+
+def _scrape(config: dict, profile_dir: str | None = None) -> dict:
     
     search_url = config.get("search_url")
     search_input_xpath = config.get("search_input_xpath")
@@ -120,56 +311,36 @@ def scrape(config: dict) -> dict:
     search_number = config.get("search_number")
     headless = bool(config.get("headless", True))
     manual_verify = bool(config.get("manual_verify", False))
-    user_data_dir = config.get("user_data_dir")
 
     if not search_url or not search_input_xpath or not search_button_xpath or not result_xpath:
         raise ValueError("配置缺少必要字段：search_url / search_input_xpath / search_button_xpath / result_xpath")
     if not more_details_button_xpath:
         raise ValueError("配置缺少必要字段：more_details_button_xpath")
 
-    if not user_data_dir:
-        # fallback 到项目内目录
-        user_data_dir = os.path.join(os.path.dirname(__file__), "app", "userdata")
-    # 为每次运行创建独立会话目录，避免并发互相锁定/干扰
-    provider_root = os.path.join(user_data_dir, "wanhai")
-    session_dir = os.path.join(provider_root, f"session_{int(time.time()*1000)}_{os.getpid()}")
-    ensure_dir(session_dir)
-
-    # 调试目录（用于截图与 HAR）
-    debug_dir = os.path.join(os.path.dirname(__file__), "app", "debug")
-    ensure_dir(debug_dir)
-
-    # 仅保留 after_open_detail 的多页面截图
-    only_detail_snaps = True
-
-    # 通用截图工具：为每一步保存带序号和编号的截图
-    screenshot_seq = 0
-    def _san_label(s: str) -> str:
-        try:
-            return re.sub(r"[^a-zA-Z0-9._-]+", "_", str(s))[:80]
-        except Exception:
-            return "snap"
-    def snap(page, label: str):
-        nonlocal screenshot_seq
-        if only_detail_snaps and not str(label).startswith("all_after_open_detail__"):
-            return None
-        try:
-            screenshot_seq += 1
-            fname = f"wanhai_{str(search_number)}_{screenshot_seq:03d}_{_san_label(label)}.png"
-            out_path = os.path.join(debug_dir, fname)
-            page.screenshot(path=out_path, full_page=True)
-            return out_path
-        except Exception:
-            return None
-
-    log(f"launch chromium persistent context, headless={headless}, user_data_dir={session_dir}")
-    with sync_playwright() as p:
-        context = p.chromium.launch_persistent_context(
-            user_data_dir=session_dir,
-            headless=headless,
-            viewport={"width": 1280, "height": 900},
-            record_har_path=os.path.join(debug_dir, "wanhai.har")
-        )
+    # 各步超时取自本次查询的剩余预算
+    dl = deadline.current()
+    # 调试产物按 --debug-level 分级：默认只在失败时落盘
+    dbg = DebugArtifacts("wanhai", search_number, config.get("debug_level"))
+    # 每一步的截图（steps 级别以上才会真正截图）
+    snap = dbg.snap
+
+    # 从浏览器池借一个全新 context（每次查询互相隔离，等价于原先的空会话目录）
+    log(f"acquire pooled browser context, headless={headless}, profile_dir={profile_dir}")
+    with get_pool().context(
+        headless=headless,
+        user_data_dir=profile_dir,
+        viewport={"width": 1280, "height": 900},
+        record_har_path=None if har_replay.active(config) else dbg.har_path(),
+        **session_state.context_kwargs("wanhai", config, profile_dir),
+        **har_replay.context_kwargs(config),
+    ) as context:
+        har_replay.install(context, "wanhai", config)
+        install_blocking(context, "wanhai", config.get("resource_blocking"))
+        # 拿到结果：写结果文件，并保存会话状态供后续 context 复用
+        def result_ready(out: dict) -> None:
+            dbg.write_json("wanhai_result.json", out)
+            if not profile_dir and session_state.enabled(config):
+                session_state.save("wanhai", context)
         # 截取当前上下文内所有已打开页面的工具
         def snap_all_pages(label: str) -> None:
             try:
@@ -182,72 +353,14 @@ def scrape(config: dict) -> dict:
                         continue
             except Exception:
                 pass
-        # 监听新页面出现，自动截图（禁用，避免产生非 after_open_detail 的截图）
-        try:
-            def _on_new_page(pg):
-                return
-            context.on("page", _on_new_page)
-        except Exception:
-            pass
-        try:
-            context.tracing.start(screenshots=True, snapshots=True, sources=True)
-            log("tracing started")
-        except Exception as e:
-            log(f"tracing start failed: {e}")
+        dbg.start_tracing(context)
         
-        # 等待页面从加载态恢复为稳定态的工具（解决截图时仍在转圈的问题）
-        def _is_loader_visible(pg) -> bool:
-            try:
-                res = pg.evaluate(
-                    """
-                    () => {
-                        const visible = el => el && !!(el.offsetParent);
-                        const sels = [
-                          '.ui-widget-overlay', '.ui-blockui', '.ui-blockui-content', '.blockUI',
-                          '.loading', '.spinner', '.fa-spinner', 'img[src*="loading"]'
-                        ];
-                        for (const s of sels) {
-                          const el = document.querySelector(s);
-                          if (visible(el)) return true;
-                        }
-                        return false;
-                    }
-                    """
-                )
-                return bool(res)
-            except Exception:
-                return False
-
-        def wait_page_stable(pg, max_wait_sec: int = 12):
-            deadline = time.time() + max_wait_sec
-            last_len = -1
-            stable_hits = 0
-            while time.time() < deadline:
-                try:
-                    pg.wait_for_load_state('domcontentloaded', timeout=1500)
-                except Exception:
-                    pass
-                try:
-                    pg.wait_for_load_state('networkidle', timeout=1200)
-                except Exception:
-                    pass
-                try:
-                    cur_len = pg.evaluate("() => (document.body && document.body.innerText || '').length")
-                except Exception:
-                    cur_len = -1
-                has_loader = _is_loader_visible(pg)
-                if not has_loader and cur_len == last_len and cur_len > 0:
-                    stable_hits += 1
-                    if stable_hits >= 2:
-                        break
-                else:
-                    stable_hits = 0
-                last_len = cur_len
-                time.sleep(0.4)
+        # JSF 局部刷新请求跟踪：等待结果前确认 partial/ajax 已全部返回
+        jsf = page_waits.JsfActivity(context)
         try:
-            context.set_default_timeout(15000)
+            context.set_default_timeout(dl.ms(15000))
             page = context.new_page()
-            page.set_default_timeout(15000)
+            page.set_default_timeout(dl.ms(15000))
             try:
                 page.on("dialog", lambda d: (log(f"dialog: {d.message}"), d.accept()))
                 page.on("console", lambda m: log(f"console[{m.type}] {m.text}"))
@@ -255,21 +368,15 @@ def scrape(config: dict) -> dict:
             except Exception:
                 pass
 
-            start_ts = time.time()
-            def elapsed_ms() -> int:
-                try:
-                    return int((time.time() - start_ts) * 1000)
-                except Exception:
-                    return -1
-            def expired(limit: int = 90) -> bool:
-                return (time.time() - start_ts) > limit
+            dl.mark("goto")
             log(f"goto: {search_url}")
-            page.goto(search_url, wait_until="domcontentloaded")
+            page.goto(search_url, wait_until="domcontentloaded", timeout=dl.ms(30000))
             # 禁用早期截图：wanhai_after_goto.png
             snap(page, "after_goto")
 
             # 等待与输入
-            page.locator(f"xpath={search_input_xpath}").wait_for(timeout=15000)
+            dl.mark("fill")
+            page.locator(f"xpath={search_input_xpath}").wait_for(timeout=dl.ms(15000))
             page.locator(f"xpath={search_input_xpath}").fill(str(search_number))
             log(f"filled search number: {search_number}")
             # 禁用早期截图：wanhai_after_fill.png
@@ -283,6 +390,7 @@ def scrape(config: dict) -> dict:
             url_before = page.url
             log(f"before search click: url={url_before} title={page_title_before}")
 
+            dl.mark("submit")
             # 第一次点击：查询按钮，可能新开窗口或当前页跳转
             search_btn = page.locator(f"xpath={search_button_xpath}")
             vis = search_btn.is_visible()
@@ -293,10 +401,10 @@ def scrape(config: dict) -> dict:
             clicked_search_ok = False
             # 优先捕获新页
             try:
-                with context.expect_page(timeout=8000) as pinfo:
+                with context.expect_page(timeout=dl.ms(8000)) as pinfo:
                     search_btn.click()
                 new_page = pinfo.value
-                new_page.wait_for_load_state("domcontentloaded", timeout=30000)
+                new_page.wait_for_load_state("domcontentloaded", timeout=dl.ms(30000))
                 clicked_search_ok = True
                 log("new page opened after search click")
                 snap(new_page, "popup_after_search")
@@ -304,7 +412,7 @@ def scrape(config: dict) -> dict:
                 log(f"no new page after search click: {e}")
                 # 退回本页导航
                 try:
-                    with page.expect_navigation(timeout=15000):
+                    with page.expect_navigation(timeout=dl.ms(15000)):
                         search_btn.click()
                     clicked_search_ok = True
                     log("navigated on same page after search click")
@@ -313,7 +421,7 @@ def scrape(config: dict) -> dict:
                     log(f"no navigation after search click, fallback no_wait_after: {e2}")
                     try:
                         search_btn.click(no_wait_after=True)
-                        page.wait_for_load_state("domcontentloaded", timeout=15000)
+                        page.wait_for_load_state("domcontentloaded", timeout=dl.ms(15000))
                         clicked_search_ok = True
                         snap(page, "after_search_nowait")
                     except Exception as e3:
@@ -329,6 +437,7 @@ def scrape(config: dict) -> dict:
                 cur_title = ""
             log(f"after search click: new_page={bool(new_page)} url={current_page.url} title={cur_title} clicked_ok={clicked_search_ok}")
 
+            dl.mark("detail")
             # 第二次点击：更多详情（优先点击 "B/L Data"/"Booking Data"），同样可能新开窗口或当前页跳转
             final_page = None
             clicked_more_ok = False
@@ -362,47 +471,20 @@ def scrape(config: dict) -> dict:
                             ref_type_detected = tag
                             clicked_kind = pat
                             try:
-                                link.first.scroll_into_view_if_needed(timeout=2000)
+                                link.first.scroll_into_view_if_needed(timeout=dl.ms(2000))
                             except Exception:
                                 pass
-                            # 依次尝试：popup → navigation → href goto
-                            el = link.first
-                            try:
-                                with current_page.expect_popup(timeout=8000) as ppop:
-                                    el.click()
-                                final_page = ppop.value
-                                final_page.wait_for_load_state("domcontentloaded", timeout=30000)
+                            # popup / navigation / href goto，上次成功的方式先试
+                            how, opened = open_link(current_page, link.first, "detail_link")
+                            if opened is not None:
                                 clicked_more_ok = True
                                 link_clicked = True
-                                log("opened popup after detail link click")
-                                snap(final_page, "popup_after_detail")
-                            except Exception as e_pop:
-                                log(f"no popup on detail link: {e_pop}")
-                                if not link_clicked:
-                                    try:
-                                        try:
-                                            current_page.evaluate("el => el.target='_self'", el)
-                                        except Exception:
-                                            pass
-                                        with current_page.expect_navigation(timeout=15000):
-                                            el.click()
-                                        clicked_more_ok = True
-                                        link_clicked = True
-                                        log("navigated on same page after detail link click")
-                                        snap(current_page, "after_detail_nav")
-                                    except Exception as e_nav:
-                                        log(f"no navigation after detail link: {e_nav}")
-                            if not link_clicked:
-                                try:
-                                    href = current_page.evaluate("el => el.href || el.getAttribute('href')", el)
-                                    if href and href != '#':
-                                        current_page.goto(href, wait_until="domcontentloaded")
-                                        clicked_more_ok = True
-                                        link_clicked = True
-                                        log(f"goto href after detail link: {href}")
-                                        snap(current_page, "after_detail_goto")
-                                except Exception as e_goto:
-                                    log(f"goto href failed: {e_goto}")
+                                log(f"opened detail link via {how}")
+                                if how == "popup":
+                                    final_page = opened
+                                    snap(final_page, "popup_after_detail")
+                                else:
+                                    snap(current_page, "after_detail_nav" if how == "navigation" else "after_detail_goto")
                             break
                     except Exception:
                         continue
@@ -413,44 +495,21 @@ def scrape(config: dict) -> dict:
                 # 退回 XPath
                 try:
                     log("wait more-details button (xpath) ...")
-                    current_page.locator(f"xpath={more_details_button_xpath}").wait_for(timeout=15000)
+                    current_page.locator(f"xpath={more_details_button_xpath}").wait_for(timeout=dl.ms(15000))
                     more_btn = current_page.locator(f"xpath={more_details_button_xpath}")
                     m_vis = more_btn.is_visible()
                     m_en = more_btn.is_enabled()
                     log(f"more-details button state: visible={m_vis} enabled={m_en}")
-                    # 捕捉 popup → 本页导航 → href goto
-                    el2 = more_btn.first
-                    try:
-                        with current_page.expect_popup(timeout=8000) as ppop2:
-                            el2.click()
-                        final_page = ppop2.value
-                        final_page.wait_for_load_state("domcontentloaded", timeout=30000)
+                    # popup / navigation / href goto，上次成功的方式先试
+                    how, opened = open_link(current_page, more_btn.first, "more_details")
+                    if opened is not None:
                         clicked_more_ok = True
-                        log("opened popup after more-details click")
-                        snap(final_page, "popup_after_more_details")
-                    except Exception as e:
-                        log(f"no popup after more-details click: {e}")
-                        try:
-                            try:
-                                current_page.evaluate("el => el.target='_self'", el2)
-                            except Exception:
-                                pass
-                            with current_page.expect_navigation(timeout=15000):
-                                el2.click()
-                            clicked_more_ok = True
-                            log("navigated on same page after more-details click")
-                            snap(current_page, "after_more_details_nav")
-                        except Exception as e2:
-                            log(f"no navigation after more-details, try goto href: {e2}")
-                            try:
-                                href2 = current_page.evaluate("el => el.href || el.getAttribute('href')", el2)
-                                if href2 and href2 != '#':
-                                    current_page.goto(href2, wait_until="domcontentloaded")
-                                    clicked_more_ok = True
-                                    log(f"goto href after more-details: {href2}")
-                                    snap(current_page, "after_more_details_goto")
-                            except Exception as e3:
-                                log(f"goto href failed: {e3}")
+                        log(f"opened more-details via {how}")
+                        if how == "popup":
+                            final_page = opened
+                            snap(final_page, "popup_after_more_details")
+                        else:
+                            snap(current_page, "after_more_details_nav" if how == "navigation" else "after_more_details_goto")
                 except Exception as e:
                     log(f"xpath more-details click error: {e}")
                     # 最后兜底：JS 查找包含文本的链接
@@ -477,7 +536,7 @@ def scrape(config: dict) -> dict:
                 pass
             last_page = final_page or current_page
             try:
-                last_page.wait_for_load_state("domcontentloaded", timeout=15000)
+                last_page.wait_for_load_state("domcontentloaded", timeout=dl.ms(15000))
             except Exception:
                 pass
             snap(last_page, "after_last_page_ready")
@@ -517,8 +576,8 @@ def scrape(config: dict) -> dict:
                             if list_bl_data_xpath:
                                 bl_btn = last_page.locator(f"xpath={list_bl_data_xpath}")
                                 if bl_btn.count() > 0:
-                                    bl_btn.first.scroll_into_view_if_needed(timeout=2000)
-                                    with last_page.context.expect_page(timeout=8000) as ppop:
+                                    bl_btn.first.scroll_into_view_if_needed(timeout=dl.ms(2000))
+                                    with last_page.context.expect_page(timeout=dl.ms(8000)) as ppop:
                                         bl_btn.first.click()
                                     found_detail = ppop.value
                                     clicked = True
@@ -527,8 +586,8 @@ def scrape(config: dict) -> dict:
                                 xp = "//a[contains(normalize-space(.),'B/L Data')]"
                                 l = last_page.locator(f"xpath={xp}")
                                 if l.count() > 0:
-                                    l.first.scroll_into_view_if_needed(timeout=2000)
-                                    with last_page.context.expect_page(timeout=8000) as ppop2:
+                                    l.first.scroll_into_view_if_needed(timeout=dl.ms(2000))
+                                    with last_page.context.expect_page(timeout=dl.ms(8000)) as ppop2:
                                         l.first.click()
                                     found_detail = ppop2.value
                                     clicked = True
@@ -540,14 +599,8 @@ def scrape(config: dict) -> dict:
                     if clicked and not found_detail:
                         log("waiting for popup detail window (including JS-opened) ...")
                         target_url_part = "tracking_data_page_by_bl_redirect"
-                        for _ in range(12):  # 最多12秒
-                            for p in context.pages:
-                                if target_url_part in (p.url or ""):
-                                    found_detail = p
-                                    break
-                            if found_detail:
-                                break
-                            time.sleep(1)
+                        # 新窗口出现并导航到目标地址即返回，最多 12 秒
+                        found_detail = page_waits.wait_for_page(context, target_url_part, dl.ms(12000))
 
                     # Step 4️⃣: 如果仍未检测到弹窗，强制构造 URL 跳转
                     # Step 4️⃣: 如果仍未检测到弹窗，强制构造 URL 跳转
@@ -562,7 +615,7 @@ def scrape(config: dict) -> dict:
                                 f"{redirect_page}.xhtml?ref_no={search_number}&ref_type={ref_type_detected}"
                             )
                             log(f"force goto detail page: {forced_url}")
-                            last_page.goto(forced_url, wait_until="domcontentloaded", timeout=20000)
+                            last_page.goto(forced_url, wait_until="domcontentloaded", timeout=dl.ms(20000))
                             log("force goto success (detail page in same tab)")
                             snap(last_page, "after_force_redirect")
 
@@ -572,7 +625,7 @@ def scrape(config: dict) -> dict:
                                 f"tracking_data_page.xhtml?ref_no={search_number}&ref_type={ref_type_detected}"
                             )
                             log(f"manual goto REAL detail page: {real_detail_url}")
-                            last_page.goto(real_detail_url, wait_until="domcontentloaded", timeout=25000)
+                            last_page.goto(real_detail_url, wait_until="domcontentloaded", timeout=dl.ms(25000))
                             log("navigated to REAL detail page successfully")
                             snap(last_page, "after_force_real_detail")
 
@@ -638,8 +691,8 @@ def scrape(config: dict) -> dict:
                             xp = "//a[contains(normalize-space(.),'B/L Data')]"
                             l = last_page.locator(f"xpath={xp}")
                             if l.count() > 0:
-                                l.first.scroll_into_view_if_needed(timeout=2000)
-                                with last_page.context.expect_page(timeout=8000) as ppop:
+                                l.first.scroll_into_view_if_needed(timeout=dl.ms(2000))
+                                with last_page.context.expect_page(timeout=dl.ms(8000)) as ppop:
                                     l.first.click()
                                 found_detail = ppop.value
                                 clicked = True
@@ -652,14 +705,7 @@ def scrape(config: dict) -> dict:
                     if clicked and not found_detail:
                         log("waiting for popup detail window (including JS-opened) ...")
                         target_url_part = "tracking_data_page_by_bl_redirect"
-                        for _ in range(12):
-                            for p in context.pages:
-                                if target_url_part in (p.url or ""):
-                                    found_detail = p
-                                    break
-                            if found_detail:
-                                break
-                            time.sleep(1)
+                        found_detail = page_waits.wait_for_page(context, target_url_part, dl.ms(12000))
 
                     # Step 4️⃣: 如果仍未检测到弹窗 -> 强制进入真实页面
                     if not found_detail:
@@ -672,7 +718,7 @@ def scrape(config: dict) -> dict:
                                 f"{redirect_page}.xhtml?ref_no={search_number}&ref_type={ref_type_detected}"
                             )
                             log(f"force goto redirect page: {forced_url}")
-                            last_page.goto(forced_url, wait_until="domcontentloaded", timeout=20000)
+                            last_page.goto(forced_url, wait_until="domcontentloaded", timeout=dl.ms(20000))
                             log("force goto redirect success")
                             snap(last_page, "after_force_redirect_v2")
 
@@ -682,7 +728,7 @@ def scrape(config: dict) -> dict:
                                 f"tracking_data_page.xhtml?ref_no={search_number}&ref_type={ref_type_detected}"
                             )
                             log(f"manual goto REAL detail page: {real_detail_url}")
-                            last_page.goto(real_detail_url, wait_until="domcontentloaded", timeout=25000)
+                            last_page.goto(real_detail_url, wait_until="domcontentloaded", timeout=dl.ms(25000))
                             log("navigated to REAL detail page successfully")
                             snap(last_page, "after_force_real_detail_v2")
 
@@ -695,7 +741,7 @@ def scrape(config: dict) -> dict:
                         log(f"found new detail page: {found_detail.url}")
                         last_page = found_detail
                         try:
-                            last_page.wait_for_load_state("domcontentloaded", timeout=15000)
+                            last_page.wait_for_load_state("domcontentloaded", timeout=dl.ms(15000))
                         except Exception:
                             pass
 
@@ -711,7 +757,7 @@ def scrape(config: dict) -> dict:
                 if re.search(r"tracking_data_list", (last_page.url or ""), re.I):
                     def extract_eta_from_list(page):
                         try:
-                            page.wait_for_selector("table.ui-datatable, .ui-datatable-tablewrapper table", timeout=8000)
+                            page.wait_for_selector("table.ui-datatable, .ui-datatable-tablewrapper table", timeout=dl.ms(8000))
                         except Exception:
                             return '', 'datatable not found'
 
@@ -754,7 +800,7 @@ def scrape(config: dict) -> dict:
                                 f"tracking_data_page.xhtml?ref_no={search_number}&ref_type={ref_type_detected}"
                             )
                             log(f"fallback: manually goto REAL detail page: {real_detail_url}")
-                            last_page.goto(real_detail_url, wait_until="domcontentloaded", timeout=25000)
+                            last_page.goto(real_detail_url, wait_until="domcontentloaded", timeout=dl.ms(25000))
                             log("fallback: navigated to REAL detail page successfully")
                             # 禁用早期截图：wanhai_after_real_detail_fallback.png
                         except Exception as e:
@@ -769,7 +815,7 @@ def scrape(config: dict) -> dict:
                     def extract_eta_from_list(page):
                         # 返回 (eta_text, debug)；找不到返回 ('', why)
                         try:
-                            page.wait_for_selector("table.ui-datatable, .ui-datatable-tablewrapper table", timeout=8000)
+                            page.wait_for_selector("table.ui-datatable, .ui-datatable-tablewrapper table", timeout=dl.ms(8000))
                         except Exception:
                             return '', 'datatable not found'
 
@@ -839,11 +885,7 @@ def scrape(config: dict) -> dict:
                             "clickedSearch": clicked_search_ok,
                             "clickedMoreDetails": clicked_more_ok,
                         }
-                        print(json.dumps(out_obj, ensure_ascii=False), flush=True)
-                        out_file = os.path.join(debug_dir, "wanhai_result.json")
-                        with open(out_file, "w", encoding="utf-8") as f:
-                            json.dump({"timestamp": datetime.now().isoformat(), **out_obj}, f, ensure_ascii=False, indent=2)
-                        log(f"written debug: {out_file}")
+                        result_ready(out_obj)
                         return out_obj
                     else:
                         log(f"list page ETA not found: {why}; fallback to detail/poller strategy")
@@ -852,7 +894,7 @@ def scrape(config: dict) -> dict:
             # ---- 强制打开详情页的工具函数（放在守卫前面）----
             def open_detail_via_query_form(pg, ref_no: str, ref_type: str):
                 try:
-                    pg.wait_for_selector("#cargoType", timeout=8000)
+                    pg.wait_for_selector("#cargoType", timeout=dl.ms(8000))
                     # 对于 Booking/BL 都选 value=2（Book No. / BL no.）
                     try:
                         pg.select_option("#cargoType", "2")
@@ -866,17 +908,17 @@ def scrape(config: dict) -> dict:
 
                     # Query 按钮会 target=_blank -> 新开页
                     try:
-                        with pg.context.expect_page(timeout=20000) as pinfo:
+                        with pg.context.expect_page(timeout=dl.ms(20000)) as pinfo:
                             pg.click("input#Query")
                         np = pinfo.value
-                        np.wait_for_load_state("domcontentloaded", timeout=25000)
+                        np.wait_for_load_state("domcontentloaded", timeout=dl.ms(25000))
                         log(f'query form opened new page: {np.url}')
                         return np
                     except Exception as e1:
                         log(f"query click no new page: {e1}")
                         # 兜底：同页导航
                         try:
-                            with pg.expect_navigation(timeout=20000):
+                            with pg.expect_navigation(timeout=dl.ms(20000)):
                                 pg.click("input#Query")
                             log("query form navigated on same page")
                             return pg
@@ -894,12 +936,12 @@ def scrape(config: dict) -> dict:
                                 """)
                                 # 再试抓新页
                                 try:
-                                    with pg.context.expect_page(timeout=20000) as p2:
+                                    with pg.context.expect_page(timeout=dl.ms(20000)) as p2:
                                         pass
                                 except Exception:
                                     pass
                                 # 等待任意可见结果表/详情
-                                pg.wait_for_load_state("domcontentloaded", timeout=20000)
+                                pg.wait_for_load_state("domcontentloaded", timeout=dl.ms(20000))
                                 return pg
                             except Exception as e3:
                                 log(f"mojarra submit failed: {e3}")
@@ -913,7 +955,7 @@ def scrape(config: dict) -> dict:
                 try:
                     url = f"{base}/tracking_data_page.xhtml?ref_no={ref_no}&ref_type={ref_type}"
                     log(f"force goto REAL detail: {url}")
-                    pg.goto(url, wait_until="domcontentloaded", timeout=25000)
+                    pg.goto(url, wait_until="domcontentloaded", timeout=dl.ms(25000))
                     return True
                 except Exception as e1:
                     log(f"real detail goto failed: {e1}")
@@ -923,7 +965,7 @@ def scrape(config: dict) -> dict:
                                      "tracking_data_page_by_booking_redirect")
                         url2 = f"{base}/{page_name}.xhtml?ref_no={ref_no}&ref_type={ref_type}"
                         log(f"fallback redirect goto: {url2}")
-                        pg.goto(url2, wait_until="domcontentloaded", timeout=20000)
+                        pg.goto(url2, wait_until="domcontentloaded", timeout=dl.ms(20000))
                         return True
                     except Exception as e2:
                         log(f"redirect goto failed: {e2}")
@@ -936,7 +978,7 @@ def scrape(config: dict) -> dict:
                 if np:
                     last_page = np
                     try:
-                        last_page.wait_for_load_state("domcontentloaded", timeout=15000)
+                        last_page.wait_for_load_state("domcontentloaded", timeout=dl.ms(15000))
                     except Exception:
                         pass
                     # 禁用早期截图：wanhai_after_query_submit.png
@@ -945,13 +987,10 @@ def scrape(config: dict) -> dict:
                     ok_force = force_open_detail(last_page, str(search_number), ref_type_detected)
                     if ok_force:
                         try:
-                            last_page.wait_for_load_state("domcontentloaded", timeout=15000)
-                        except Exception:
-                            pass
-                        try:
-                            last_page.screenshot(path=os.path.join(debug_dir, "wanhai_after_force_detail.png"))
+                            last_page.wait_for_load_state("domcontentloaded", timeout=dl.ms(15000))
                         except Exception:
                             pass
+                        snap(last_page, "after_force_detail")
                     else:
                         log("force_open_detail failed; still on query page")
 
@@ -960,7 +999,7 @@ def scrape(config: dict) -> dict:
                 ok_force = force_open_detail(last_page, str(search_number), ref_type_detected)
                 if ok_force:
                     try:
-                        last_page.wait_for_load_state("domcontentloaded", timeout=15000)
+                        last_page.wait_for_load_state("domcontentloaded", timeout=dl.ms(15000))
                     except Exception:
                         pass
                     # 禁用早期截图：wanhai_after_force_detail.png
@@ -968,97 +1007,111 @@ def scrape(config: dict) -> dict:
 
                         # ---- 通过 tracking_query.xhtml 表单提交打开详情（避免WAF/JSF校验）----
             
-            # 在最终页面等待结果并提取（按需：出现该日志后等待 2 秒即可退出）
+            dl.mark("extract")
+            # 在最终页面等待结果：JSF 局部刷新返回 → 加载遮罩消失 → ETA 单元格出现（任一就绪即继续）
             log("waiting result on final page ...")
-            try:
-                time.sleep(2)
-            except Exception:
-                pass
-            # 截取所有页面，并对以 __3 结尾的那张做 OCR 提取文字
+            wait_t0 = time.time()
+            jsf.wait_idle(dl.ms(10000))
+            page_waits.wait_loaders_hidden(last_page, dl.ms(10000))
+            ready_val = page_waits.wait_for_dom_value(last_page, SCAN_ETA_JS, dl.ms(8000))
+            log(f"final page ready in {int((time.time() - wait_t0) * 1000)}ms (eta_found={bool(ready_val)})")
+            # DOM 里已经读到 ETA（或 No Data.）就直接返回，OCR 只在 DOM 取不到时兜底
+            if ready_val:
+                if ready_val == "__NO_DATA__":
+                    dbg.write_text("wanhai_ocr_eta.txt", "null")
+                    out_obj_early = {"status": "no_data", "number": str(search_number), "error": "No Data.", "source": "dom"}
+                else:
+                    eta_norm = normalize_date_text(ready_val)
+                    log(f"ETA (DOM): before='{ready_val}' after='{eta_norm}'")
+                    dbg.write_text("wanhai_ocr_eta.txt", eta_norm)
+                    out_obj_early = {"status": "ok", "number": str(search_number), "result": eta_norm, "source": "dom"}
+                result_ready(out_obj_early)
+                return out_obj_early
+            # 选定目标页（idx==3 若存在，否则最后一张）；截图只在内存中传递，
+            # steps 级别以上才把其它页面落盘
             taken = []
             try:
                 for idx, pg in enumerate(context.pages):
                     try:
                         url_ok = getattr(pg, "url", None)
                         if url_ok and url_ok != "about:blank":
-                            p = snap(pg, f"all_after_open_detail__{idx}")
-                            if p:
-                                taken.append((idx, p))
+                            taken.append((idx, pg))
                     except Exception:
                         continue
             except Exception:
                 pass
-            # 选择 idx==3 的图片（若存在），否则选择最后一张
-            target_path = None
-            for idx, p in taken:
+            target_page = None
+            for idx, pg in taken:
                 if idx == 3:
-                    target_path = p
+                    target_page = pg
                     break
-            if target_path is None and taken:
-                target_path = taken[-1][1]
-            # OCR 提取并立即结束（不再继续等待/轮询）
+            if target_page is None and taken:
+                target_page = taken[-1][1]
+            if dbg.enabled("steps"):
+                for idx, pg in taken:
+                    if pg is not target_page:
+                        snap(pg, f"all_after_open_detail__{idx}")
+            target_png, clipped = (None, False)
+            if target_page is not None:
+                target_png, clipped = ocr_pipeline.screenshot_eta_region(target_page)
+                dbg.save_png("eta_region" if clipped else "all_after_open_detail__target", target_png)
+            dl.mark("ocr")
+            # OCR 在进程池中执行；等待期间先尝试直接读 DOM，读到即取消 OCR
             out_obj_early = None
             ocr_text = None
-            if target_path:
+            if target_png and ocr_pipeline.available():
                 try:
-                    import pytesseract
-                    from PIL import Image
-                    img = Image.open(target_path)
-                    # 若系统已安装中文语言包，可改为 eng+chi_sim
-                    ocr_text = pytesseract.image_to_string(img, lang="eng")
-                    txt_path = os.path.join(debug_dir, "wanhai_ocr_detail.txt")
-                    with open(txt_path, "w", encoding="utf-8") as f:
-                        f.write(ocr_text)
-                    log(f"OCR extracted to: {txt_path}")
-                    # 简单正则从 OCR 中提取 ETA 日期并规范化
-                    eta_raw = None
+                    fut = ocr_pipeline.submit(target_png, clipped=clipped)
+                    dom_eta = ""
                     try:
-                        m = re.search(r"ESTIMATED\s*ARRIVAL\s*DATE[^\n\r]*?(\d{4}[\/-]\d{1,2}[\/-]\d{1,2}|[A-Z]{3}[\-\s]\d{1,2}[\-\s]\d{4}|\d{1,2}[\-\s][A-Z]{3}[\-\s]\d{4})", ocr_text, flags=re.I)
-                        if not m:
-                            m = re.search(r"ETA[^\n\r]*?(\d{4}[\/-]\d{1,2}[\/-]\d{1,2}|[A-Z]{3}[\-\s]\d{1,2}[\-\s]\d{4}|\d{1,2}[\-\s][A-Z]{3}[\-\s]\d{4})", ocr_text, flags=re.I)
-                        if m:
-                            eta_raw = m.group(1)
+                        dom_eta = scan_eta_everywhere_quick(target_page)
                     except Exception:
-                        eta_raw = None
-                    if eta_raw:
-                        eta_norm = normalize_date_text(eta_raw)
-                        out_obj_early = {"status": "ok", "number": str(search_number), "result": eta_norm, "source": "ocr"}
-                        # 也写入文件便于核对
-                        with open(os.path.join(debug_dir, "wanhai_ocr_eta.txt"), "w", encoding="utf-8") as f:
-                            f.write(eta_norm)
+                        dom_eta = ""
+                    if dom_eta == "__NO_DATA__":
+                        fut.cancel()
+                        dbg.write_text("wanhai_ocr_eta.txt", "null")
+                        out_obj_early = {"status": "no_data", "number": str(search_number), "error": "No Data.", "source": "dom"}
+                    elif dom_eta:
+                        fut.cancel()
+                        eta_norm = normalize_date_text(dom_eta)
+                        log(f"ETA (DOM while OCR pending): before='{dom_eta}' after='{eta_norm}'")
+                        dbg.write_text("wanhai_ocr_eta.txt", eta_norm)
+                        out_obj_early = {"status": "ok", "number": str(search_number), "result": eta_norm, "source": "dom"}
                     else:
-                        # 无法从 OCR 提取 ETA：也要生成占位文件，eta 写入 'null'
-                        with open(os.path.join(debug_dir, "wanhai_ocr_eta.txt"), "w", encoding="utf-8") as f:
-                            f.write("null")
-                        out_obj_early = {"status": "ok", "number": str(search_number), "ocr": True, "result": None, "source": "ocr"}
+                        try:
+                            ocr_text = fut.result(timeout=dl.sec(30))
+                        except cancellation.Cancelled:
+                            fut.cancel()
+                            ocr_pipeline.shutdown(kill=True)
+                            raise
+                        if dbg.write_text("wanhai_ocr_detail.txt", ocr_text):
+                            log("OCR text written to wanhai_ocr_detail.txt")
+                        eta_raw = ocr_pipeline.extract_eta(ocr_text, clipped=clipped)
+                        if eta_raw:
+                            eta_norm = normalize_date_text(eta_raw)
+                            out_obj_early = {"status": "ok", "number": str(search_number), "result": eta_norm, "source": "ocr"}
+                            # 也写入文件便于核对
+                            dbg.write_text("wanhai_ocr_eta.txt", eta_norm)
+                        else:
+                            # 无法从 OCR 提取 ETA：占位文件 eta 写入 'null'
+                            dbg.write_text("wanhai_ocr_eta.txt", "null")
+                            out_obj_early = {"status": "ok", "number": str(search_number), "ocr": True, "result": None, "source": "ocr"}
                 except Exception as e:
                     log(f"OCR failed: {e}")
-                    # OCR 失败也需落地占位文件
-                    try:
-                        with open(os.path.join(debug_dir, "wanhai_ocr_detail.txt"), "w", encoding="utf-8") as f:
-                            f.write(ocr_text or "")
-                        with open(os.path.join(debug_dir, "wanhai_ocr_eta.txt"), "w", encoding="utf-8") as f:
-                            f.write("null")
-                    except Exception:
-                        pass
+                    # OCR 失败属于错误路径：errors 级别即保存页面与 OCR 占位文件
+                    dbg.write_text("wanhai_ocr_detail.txt", ocr_text or "", level="errors")
+                    dbg.write_text("wanhai_ocr_eta.txt", "null", level="errors")
+                    dbg.capture_failure(target_page, "ocr_failed")
                     out_obj_early = {"status": "ok", "number": str(search_number), "ocr_error": str(e), "result": None}
             else:
-                # 没有可用的截图：也要输出占位 OCR 文件与 null 结果
-                try:
-                    with open(os.path.join(debug_dir, "wanhai_ocr_detail.txt"), "w", encoding="utf-8") as f:
-                        f.write("")
-                    with open(os.path.join(debug_dir, "wanhai_ocr_eta.txt"), "w", encoding="utf-8") as f:
-                        f.write("null")
-                except Exception:
-                    pass
-                out_obj_early = {"status": "ok", "number": str(search_number), "note": "no screenshot", "result": None, "source": "ocr"}
-            # 打印并保存结果，然后立刻返回，避免继续等待
+                # 没有可用的截图（或未安装 OCR 依赖）：输出 null 结果，并按错误路径保存现场
+                dbg.write_text("wanhai_ocr_eta.txt", "null", level="errors")
+                dbg.capture_failure(target_page or last_page, "no_screenshot")
+                note = "no screenshot" if not target_png else "ocr unavailable"
+                out_obj_early = {"status": "ok", "number": str(search_number), "note": note, "result": None, "source": "ocr"}
+            # 保存结果，然后立刻返回，避免继续等待
             try:
-                print(json.dumps(out_obj_early, ensure_ascii=False), flush=True)
-                out_file = os.path.join(debug_dir, "wanhai_result.json")
-                with open(out_file, "w", encoding="utf-8") as f:
-                    json.dump({"timestamp": datetime.now().isoformat(), **out_obj_early}, f, ensure_ascii=False, indent=2)
-                log(f"written early result: {out_file}")
+                result_ready(out_obj_early)
             except Exception:
                 pass
             return out_obj_early
@@ -1070,7 +1123,7 @@ def scrape(config: dict) -> dict:
                 """根据XPath取文本"""
                 try:
                     loc = page.locator(f"xpath={xpath}")
-                    loc.wait_for(state="visible", timeout=timeout)
+                    loc.wait_for(state="visible", timeout=dl.ms(timeout))
                     txt = loc.first.text_content() or ""
                     return re.sub(r"\s+", " ", txt.replace("\u00A0"," ")).strip()
                 except Exception:
@@ -1093,11 +1146,7 @@ def scrape(config: dict) -> dict:
                     "clickedSearch": clicked_search_ok,
                     "clickedMoreDetails": clicked_more_ok,
                 }
-                print(json.dumps(out_obj, ensure_ascii=False), flush=True)
-                out_file = os.path.join(debug_dir, "wanhai_result.json")
-                with open(out_file, "w", encoding="utf-8") as f:
-                    json.dump({"timestamp": datetime.now().isoformat(), **out_obj}, f, ensure_ascii=False, indent=2)
-                log(f"written debug: {out_file}")
+                result_ready(out_obj)
                 return out_obj
 
             # === Step 2: 如果还没拿到，就尝试用config中配置的 result_xpath ===
@@ -1115,11 +1164,7 @@ def scrape(config: dict) -> dict:
                         "clickedSearch": clicked_search_ok,
                         "clickedMoreDetails": clicked_more_ok,
                     }
-                    print(json.dumps(out_obj, ensure_ascii=False), flush=True)
-                    out_file = os.path.join(debug_dir, "wanhai_result.json")
-                    with open(out_file, "w", encoding="utf-8") as f:
-                        json.dump({"timestamp": datetime.now().isoformat(), **out_obj}, f, ensure_ascii=False, indent=2)
-                    log(f"written debug: {out_file}")
+                    result_ready(out_obj)
                     return out_obj
 
             # === Step 3: 再兜底，用全文正则匹配 ETA 日期 ===
@@ -1146,108 +1191,23 @@ def scrape(config: dict) -> dict:
                         "clickedSearch": clicked_search_ok,
                         "clickedMoreDetails": clicked_more_ok,
                     }
-                    print(json.dumps(out_obj, ensure_ascii=False), flush=True)
-                    out_file = os.path.join(debug_dir, "wanhai_result.json")
-                    with open(out_file, "w", encoding="utf-8") as f:
-                        json.dump({"timestamp": datetime.now().isoformat(), **out_obj}, f, ensure_ascii=False, indent=2)
-                    log(f"written debug: {out_file}")
+                    result_ready(out_obj)
                     return out_obj
             # ---------- END: 即刻取 ETA 的轻量兜底 ----------
 
-            def scan_eta_in_page(p):
-                # Returns ETA text or '' if not found
-                try:
-                    return p.evaluate("""
-                        () => {
-                          const norm = s => (s||'').replace(/\u00A0/g,' ').replace(/\s+/g,' ').trim();
-                          const isDateish = s => {
-                            if (!s) return false;
-                            const t = norm(s).toUpperCase();
-                            // very permissive: 2025-10-10, 10/10/2025, 10-OCT-2025, OCT-10-2025, 2025/10/10, etc.
-                            return (
-                              /^\d{4}[-\/.]\d{1,2}[-\/.]\d{1,2}/.test(t) ||
-                              /^\d{1,2}[-\/.][A-Z]{3}[-\/.]\d{4}/.test(t) ||
-                              /^[A-Z]{3}[-\/.]\d{1,2}[-\/.]\d{4}/.test(t)
-                            );
-                          };
-
-                          // Fast exit: No Data.
-                          const noData = Array.from(document.querySelectorAll('td')).some(td => norm(td.textContent) === 'No Data.');
-                          if (noData) return '__NO_DATA__';
-
-                          const labels = ['ESTIMATED ARRIVAL DATE','EST. ARRIVAL DATE','EST ARRIVAL DATE','ETA'];
-                          const tds = Array.from(document.querySelectorAll('td'));
-                          for (const td of tds) {
-                            const txt = norm(td.textContent).toUpperCase();
-                            if (labels.includes(txt)) {
-                              const sib = td.nextElementSibling;
-                              if (sib) {
-                                const val = norm(sib.textContent);
-                                if (txt === 'ETA') {
-                                  if (isDateish(val)) return val;
-                                } else {
-                                  if (val) return val;
-                                }
-                              }
-                            }
-                          }
-                          return '';
-                        }
-                    """)
-                except Exception:
-                    return ''
-
-            def scan_eta_everywhere(page):
-                # Scan root + frames
-                val = scan_eta_in_page(page)
-                if val: return val
-                try:
-                    for fr in page.frames:
-                        try:
-                            if fr is page.main_frame:
-                                continue
-                            _ = fr.evaluate_handle("() => document")  # touch frame
-                            res = scan_eta_in_page(fr)
-                            if res: return res
-                        except Exception:
-                            continue
-                except Exception:
-                    pass
-                return ''
-
-
-            # Poll up to ~30s, tolerant to JSF partial updates & iframes
-            deadline = time.time() + 30
+            dl.mark("eta_wait")
+            # 等待 ETA 出现（MutationObserver，兼容 JSF 局部更新 / frames）
             eta_text = ''
-            while time.time() < deadline:
-                # quick no-data check & ETA scan
-                val = scan_eta_everywhere(last_page)
-                if val == '__NO_DATA__':
-                    log("detected 'No Data.' during polling, exit as no result")
-                    return {"status": "no_data", "error": "No Data."}
-                if val:
-                    eta_text = val
-                    break
-                # small sleep, also nudge network to 'idle'
-                try:
-                    last_page.wait_for_load_state('networkidle', timeout=2000)
-                except Exception:
-                    pass
-                time.sleep(0.4)
+            val = page_waits.wait_for_dom_value(last_page, SCAN_ETA_JS, dl.ms(30000))
+            if val == '__NO_DATA__':
+                log("detected 'No Data.' while waiting, exit as no result")
+                return {"status": "no_data", "number": search_number, "error": "No Data."}
+            eta_text = val
 
             if not eta_text:
                 # Save for debug and return
-                try:
-                    with open(os.path.join(debug_dir, "wanhai_final_page.html"), "w", encoding="utf-8") as f:
-                        f.write(last_page.content())
-                    log("saved wanhai_final_page.html for debug; ETA not found within polling window")
-                except Exception:
-                    pass
-                # 额外保存最终页面截图
-                try:
-                    last_page.screenshot(path=os.path.join(debug_dir, "wanhai_final_page.png"), full_page=True)
-                except Exception:
-                    pass
+                log("ETA not found within polling window")
+                dbg.capture_failure(last_page, "final_page")
                 return {"status": "timeout", "error": "ETA not found (no visible label or JSF fragment not rendered)"}
 
             before_norm = eta_text
@@ -1261,47 +1221,106 @@ def scrape(config: dict) -> dict:
                 "clickedSearch": clicked_search_ok,
                 "clickedMoreDetails": clicked_more_ok,
             }
-            print(json.dumps(out_obj, ensure_ascii=False), flush=True)
-            out_file = os.path.join(debug_dir, "wanhai_result.json")
-            with open(out_file, "w", encoding="utf-8") as f:
-                json.dump({"timestamp": datetime.now().isoformat(), **out_obj}, f, ensure_ascii=False, indent=2)
-            log(f"written debug: {out_file}")
+            result_ready(out_obj)
             # 额外保存最终页面截图
-            try:
-                last_page.screenshot(path=os.path.join(debug_dir, "wanhai_final_page.png"), full_page=True)
-            except Exception:
-                pass
+            snap(last_page, "final_page")
             return out_obj
         except PlaywrightTimeoutError as e:
-            try:
-                page.screenshot(path=os.path.join(debug_dir, "wanhai_timeout.png"))
-            except Exception:
-                pass
-            log(f"timeout exception after {elapsed_ms()}ms: {e}")
+            dbg.capture_failure(page, "timeout")
+            log(f"timeout exception after {dl.elapsed_ms()}ms: {e}")
             return {"status": "timeout", "error": str(e)}
         except Exception as e:
-            try:
-                page.screenshot(path=os.path.join(debug_dir, "wanhai_error.png"))
-            except Exception:
-                pass
-            log(f"unexpected exception after {elapsed_ms()}ms: {e}")
+            dbg.capture_failure(page, "error")
+            log(f"unexpected exception after {dl.elapsed_ms()}ms: {e}")
             return {"status": "error", "error": str(e)}
-            
         finally:
-            try:
-                if context and not context.is_closed():
-                    context.close()
-                else:
-                    log("context already closed or None, skip closing.")
-            except Exception as e:
-                log(f"ignore context close error: {e}")
+            dbg.stop_tracing(context)
+        # context 由浏览器池负责关闭
   
 
+# ========= 异步版本：WanHai.browser_lookup_async（async_engine）调用 =========
+# 精简自 _scrape() 的主路径：查询 → 判断 B/L / Booking → 直达真实详情页 → 扫描 ETA；
+# 快速通道、缓存与时间预算由 carriers.Carrier.scrape_async / async_engine 负责
+
+
+def detail_url(number: str, ref_type: str = "MFT", search_url: str | None = None) -> str:
+    return f"{wanhai_http.detail_base(search_url)}/tracking_data_page.xhtml?ref_no={number}&ref_type={ref_type}"
+
+
+async def _scrape_async(config: dict, context) -> dict:
+    search_url = config.get("search_url")
+    search_input_xpath = config.get("search_input_xpath")
+    search_button_xpath = config.get("search_button_xpath")
+    search_number = str(config.get("search_number"))
+    if not search_url or not search_input_xpath or not search_button_xpath:
+        raise ValueError("配置缺少必要字段：search_url / search_input_xpath / search_button_xpath")
+    dl = deadline.current()
+
+    page = await context.new_page()
+    page.set_default_timeout(dl.ms(15000))
+    page.on("dialog", lambda d: d.accept())
+    try:
+        await page.goto(search_url, wait_until="domcontentloaded", timeout=dl.ms(30000))
+        inp = page.locator(f"xpath={search_input_xpath}")
+        await inp.wait_for(timeout=dl.ms(15000))
+        await inp.fill(search_number)
+
+        # 查询按钮通常新开窗口，否则为同页跳转
+        current_page = page
+        search_btn = page.locator(f"xpath={search_button_xpath}")
+        try:
+            async with context.expect_page(timeout=dl.ms(8000)) as pinfo:
+                await search_btn.click()
+            current_page = await pinfo.value
+            await current_page.wait_for_load_state("domcontentloaded", timeout=dl.ms(30000))
+        except Exception:
+            try:
+                await page.wait_for_load_state("domcontentloaded", timeout=dl.ms(15000))
+            except Exception:
+                pass
+
+        ref_type = "MFT"
+        try:
+            if await current_page.get_by_role("link", name=re.compile(r"B\s*/?\s*L\s*Data", re.I)).count() == 0:
+                if await current_page.get_by_role("link", name=re.compile(r"Booking\s*Data", re.I)).count() > 0:
+                    ref_type = "BKG"
+        except Exception:
+            pass
+
+        # 与同步流程的最终兜底一致：直接进入真实详情页，绕过 popup / redirect
+        await current_page.goto(detail_url(search_number, ref_type, search_url), wait_until="domcontentloaded", timeout=dl.ms(25000))
+
+        await page_waits.async_wait_loaders_hidden(current_page, dl.ms(10000))
+        eta_text = await page_waits.async_wait_for_dom_value(current_page, SCAN_ETA_JS, dl.ms(30000))
+        if eta_text == '__NO_DATA__':
+            return {"status": "no_data", "number": search_number, "error": "No Data."}
+
+        if not eta_text:
+            return {"status": "timeout", "number": search_number,
+                    "error": "ETA not found (no visible label or JSF fragment not rendered)"}
+        return {"status": "ok", "number": search_number, "result": normalize_date_text(eta_text), "refType": ref_type}
+    except PlaywrightTimeoutError as e:
+        return {"status": "timeout", "number": search_number, "error": str(e)}
+    except Exception as e:
+        return {"status": "error", "number": search_number, "error": str(e)}
+
+
 def main():
     parser = argparse.ArgumentParser(description="WanHai tracking scraper using Playwright")
     parser.add_argument("--config", default=os.path.join("backend", "app", "config", "wanhai.json"),
                         help="path to json config")
     parser.add_argument("--number", help="override search_number from config", default=None)
+    parser.add_argument("--debug-level", choices=LEVELS, default=None,
+                        help="debug artifacts: off / errors (default) / steps / full")
+    parser.add_argument("--refresh", action="store_true", help="bypass the result cache and query again")
+    parser.add_argument("--budget", type=float, default=None, metavar="SEC",
+                        help="end-to-end time budget for one lookup (default: budget_sec in config)")
+    parser.add_argument("--serve", nargs="?", const="stdin", default=None, metavar="HOST:PORT",
+                        help="keep running and answer JSON-lines requests on stdin (or a local TCP port)")
+    parser.add_argument("--replay-har", default=None, metavar="PATH",
+                        help="answer every request from a recorded HAR instead of the network")
+    parser.add_argument("--replay-mode", choices=har_replay.MODES, default=None,
+                        help="HAR matching: strict (route_from_har, default) or lenient (ignore ViewState / timestamps)")
     args = parser.parse_args()
 
     cfg_path = args.config
@@ -1315,10 +1334,39 @@ def main():
     if args.number:
         config["search_number"] = str(args.number)
         log(f"override search_number via --number: {config['search_number']}")
-    ensure_dir(os.path.join(os.path.dirname(__file__), "app", "debug"))
-
-    # 执行（scrape 内部已负责打印与写调试文件）
-    _ = scrape(config)
+    if args.debug_level:
+        config["debug_level"] = args.debug_level
+    if args.refresh:
+        config["refresh"] = True
+    if args.budget:
+        config["budget_sec"] = args.budget
+    if args.replay_har:
+        config["replay_har"] = args.replay_har
+    if args.replay_mode:
+        config["replay_har_mode"] = args.replay_mode
+
+    if args.serve:
+        # 常驻模式：每行一个请求 {"id", "number", "refresh", "debug_level", "budget_sec"}，浏览器在请求之间保持热启动
+        def handle(req: dict) -> dict:
+            cfg = dict(config, search_number=str(req["number"]), refresh=bool(req.get("refresh")))
+            if req.get("debug_level") in LEVELS:
+                cfg["debug_level"] = req["debug_level"]
+            if req.get("budget_sec"):
+                cfg["budget_sec"] = req["budget_sec"]
+            return scrape(cfg)
+        warm = lambda: get_pool().warm(bool(config.get("headless", True)), 1)
+        return serve_loop.serve(handle, args.serve, on_start=warm, on_cancel=close_pool)
+
+    # stdout 只输出一行结果 JSON（缓存命中同样输出），日志走 stderr；
+    # 被 SIGTERM 或 stdin 的 {"op": "cancel"} 取消时输出 cancelled 并以非零码退出
+    cancellation.install(watch_stdin=True)
+    try:
+        with cancellation.cancellable():
+            out = scrape(config)
+    except cancellation.Cancelled as e:
+        out = {"status": "cancelled", "number": config.get("search_number"), "reason": str(e)}
+    print(json.dumps(out, ensure_ascii=False), flush=True)
+    return cancellation.exit_code()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,189 @@
+import json
+import os
+import sys
+import time
+from datetime import datetime
+from urllib.parse import quote
+
+import deadline
+import http_client
+
+# ZIM 追踪 JSON 接口的直连回放：
+# 浏览器成功查询一次后，从捕获到的 XHR 学习接口地址、方法、请求头与 cookie，
+# 之后的单号直接用复用连接的 HTTP 会话请求该接口；模板缺失、过期或返回 401/403 时返回 None，
+# 由调用方启动浏览器重新学习（顺带刷新 cookie / token）。
+# 接口返回失败或无数据时结果为 invalid / no_data，按负缓存的短 TTL 缓存，不当作 ok。
+# 鉴权类请求头（authorization、token、cookie 等）不写入模板，单独存入仅本用户可读（0600）的 zim_api.secret.json；
+# 模板需要鉴权头而本进程读不到时不回放，直接走浏览器。
+
+TEMPLATE_PATH = os.path.join(http_client.COOKIE_DIR, "zim_api.json")
+SECRET_PATH = os.path.join(http_client.COOKIE_DIR, "zim_api.secret.json")
+TEMPLATE_TTL_SEC = 12 * 3600
+PLACEHOLDER = "__NUMBER__"
+# 不回放的请求头：由 requests 自动生成，或 cookie 另行管理
+SKIP_HEADERS = ("host", "content-length", "cookie", "connection", "accept-encoding")
+# 持久化模板时去掉的请求头（名称包含其中任一片段）
+SECRET_HEADER_PARTS = ("auth", "token", "cookie", "session", "api-key", "apikey")
+
+_template: dict | None = None
+
+
+def log(msg: str) -> None:
+    ts = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    print(f"[zim-api] {ts} {msg}", file=sys.stderr, flush=True)
+
+
+def is_tracking_response(url: str, content_type: str) -> bool:
+    low = (url or "").lower()
+    return ("track" in low or "consign" in low) and "application/json" in (content_type or "")
+
+
+def _templatize(text: str | None, number: str) -> str | None:
+    if text is None:
+        return None
+    for variant in (number, quote(number)):
+        text = text.replace(variant, PLACEHOLDER)
+    return text
+
+
+def _is_secret(name: str) -> bool:
+    low = name.lower()
+    return any(part in low for part in SECRET_HEADER_PARTS)
+
+
+def classify(data) -> tuple[str, str | None]:
+    # (status, error)：只有明确的 IsSuccess 为 false 才是 invalid，Data 字段存在但为空视为 no_data；
+    # 认不出的结构（列表、外层包装变化等）按 ok 处理，不进负缓存
+    if not isinstance(data, dict):
+        return "ok", None
+    message = data.get("Message") or data.get("message")
+    if data.get("IsSuccess") is False:
+        return "invalid", message or "API reported failure"
+    for key in ("Data", "data"):
+        if key in data and not data[key]:
+            return "no_data", message or "No Data."
+    return "ok", None
+
+
+def _write_private(path: str, obj: dict) -> None:
+    # 先以 0600 创建临时文件再替换，鉴权头不会以默认权限出现在磁盘上
+    tmp = path + f".{os.getpid()}.tmp"
+    fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump(obj, f, ensure_ascii=False)
+    os.replace(tmp, path)
+
+
+def _read_secrets() -> dict:
+    try:
+        with open(SECRET_PATH, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception:
+        return {}
+
+
+def learn(number: str, url: str, method: str, headers: dict, post_data: str | None, cookies: list[dict]) -> bool:
+    # 单号必须出现在 URL 或请求体里，才能泛化成模板
+    global _template
+    number = str(number)
+    url_t = _templatize(url, number)
+    body_t = _templatize(post_data, number)
+    if PLACEHOLDER not in url_t and PLACEHOLDER not in (body_t or ""):
+        log(f"number not found in captured request, skip learning: {url}")
+        return False
+    tpl = {
+        "url": url_t,
+        "method": (method or "GET").upper(),
+        "headers": {k: v for k, v in (headers or {}).items() if not k.startswith(":") and k.lower() not in SKIP_HEADERS},
+        "body": body_t,
+        "ts": time.time(),
+    }
+    http_client.import_cookies("zim", cookies)
+    secrets = {k: v for k, v in tpl["headers"].items() if _is_secret(k)}
+    stored = dict(tpl, headers={k: v for k, v in tpl["headers"].items() if k not in secrets},
+                  secret_headers=sorted(secrets))
+    try:
+        os.makedirs(os.path.dirname(TEMPLATE_PATH), exist_ok=True)
+        if secrets:
+            _write_private(SECRET_PATH, {"ts": tpl["ts"], "headers": secrets})
+        tmp = TEMPLATE_PATH + f".{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(stored, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, TEMPLATE_PATH)
+    except Exception as e:
+        log(f"save template failed: {e}")
+    _template = tpl
+    log(f"learned API template: {tpl['method']} {tpl['url']}")
+    return True
+
+
+def load_template(ttl_sec: float = TEMPLATE_TTL_SEC) -> dict | None:
+    global _template
+    tpl = _template
+    if tpl is None:
+        try:
+            with open(TEMPLATE_PATH, "r", encoding="utf-8") as f:
+                tpl = json.load(f)
+        except Exception:
+            return None
+        need = tpl.get("secret_headers") or []
+        if need:
+            secrets = _read_secrets()
+            # 与模板同一次学习写入的才算数
+            held = (secrets.get("headers") or {}) if secrets.get("ts") == tpl.get("ts") else {}
+            if any(k not in held for k in need):
+                log("API template needs auth headers that are not available, skip replay")
+                return None
+            tpl = dict(tpl, headers={**tpl["headers"], **held})
+    if time.time() - tpl.get("ts", 0) > ttl_sec:
+        log("API template expired, need browser refresh")
+        return None
+    _template = tpl
+    return tpl
+
+
+def invalidate() -> None:
+    global _template
+    _template = None
+    for path in (TEMPLATE_PATH, SECRET_PATH):
+        try:
+            os.remove(path)
+        except Exception:
+            pass
+
+
+def lookup(number: str, ttl_sec: float = TEMPLATE_TTL_SEC, timeout: float = 15) -> dict | None:
+    if not http_client.available():
+        return None
+    tpl = load_template(ttl_sec)
+    if tpl is None:
+        return None
+    number = str(number)
+    url = tpl["url"].replace(PLACEHOLDER, quote(number))
+    body = tpl["body"].replace(PLACEHOLDER, number) if tpl.get("body") else None
+    sess = http_client.get_session("zim")
+    t0 = time.time()
+    try:
+        resp = sess.request(tpl["method"], url, data=body, headers=tpl["headers"], timeout=deadline.current().sec(timeout))
+    except Exception as e:
+        log(f"request failed: {e}")
+        return None
+    if resp.status_code in (401, 403) or http_client.looks_like_challenge(resp):
+        # token / cookie 失效：丢弃模板，下次浏览器查询时重新学习
+        log(f"replay rejected (status={resp.status_code}), invalidating template")
+        invalidate()
+        return None
+    if resp.status_code != 200:
+        log(f"unexpected status {resp.status_code}")
+        return None
+    try:
+        data = resp.json()
+    except Exception:
+        log("response is not JSON")
+        return None
+    http_client.save_cookies("zim")
+    status, error = classify(data)
+    log(f"{number}: API replay in {int((time.time() - t0) * 1000)}ms ({status})")
+    if status != "ok":
+        return {"status": status, "api_url": url, "data": data, "error": error}
+    return {"status": "ok", "api_url": url, "data": data}
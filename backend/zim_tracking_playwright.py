@@ -1,123 +1,80 @@
-import argparse, json, os, sys, time, re
-from urllib.parse import quote
-from playwright.sync_api import sync_playwright, TimeoutError as PlaywrightTimeoutError
+import argparse, json, os, sys, time
+
+from browser_pool import close_pool, get_pool
+from debug_artifacts import LEVELS
+import carriers
+import har_replay
+import serve_loop
+import cancellation
 
 ROOT_DIR = os.path.dirname(__file__)
-DEBUG_DIR = os.path.join(ROOT_DIR, "app", "debug")
-USER_DATA_DIR = os.path.join(ROOT_DIR, "app", "userdata_zim")  # ← 固定目录（重要）
+CONFIG_PATH = os.path.join(ROOT_DIR, "app", "config", "zim.json")
+PROVIDER = carriers.get("zim")
+USER_DATA_DIR = PROVIDER.profile_seed  # ← 旧版固定目录，仅用于初始化 golden profile
 
 def ensure_dir(p): os.makedirs(p, exist_ok=True)
 def log(msg): print(f"[zim] {time.strftime('%F %T')} {msg}", file=sys.stderr, flush=True)
 
-def scrape(number: str, headless: bool = True) -> dict:
-    ensure_dir(DEBUG_DIR)
-    ensure_dir(USER_DATA_DIR)
-
-    url = f"https://www.zim.com/tools/track-a-shipment?consnumber={quote(str(number))}"
-    out_png  = os.path.join(DEBUG_DIR, f"zim_{number}_final.png")
-    out_html = os.path.join(DEBUG_DIR, f"zim_{number}_final.html")
-
-    with sync_playwright() as p:
-        ctx = p.chromium.launch_persistent_context(
-            user_data_dir=USER_DATA_DIR,
-            headless=headless,
-            viewport={"width": 1366, "height": 900},
-            args=[
-                "--disable-blink-features=AutomationControlled",
-                "--no-sandbox",
-                "--disable-dev-shm-usage",
-            ],
-        )
-        try:
-            # 更“像人”的指纹
-            ua = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
-            ctx.set_default_timeout(25000)
-            ctx.set_extra_http_headers({
-                "Accept-Language": "en-US,en;q=0.9",
-                "Cache-Control": "no-cache",
-            })
-            for page in ctx.pages:
-                page.set_default_timeout(25000)
-            page = ctx.new_page()
-            page.set_user_agent(ua)
-
-            # 去掉 webdriver 痕迹、补充常见属性
-            page.add_init_script("""
-                Object.defineProperty(navigator, 'webdriver', { get: () => false });
-                Object.defineProperty(navigator, 'languages', { get: () => ['en-US','en'] });
-                Object.defineProperty(navigator, 'plugins', { get: () => [1,2,3] });
-            """)
-
-            # 监听 XHR，尝试捕获追踪 JSON（可选）
-            captured = {}
-            def on_response(resp):
-                try:
-                    url = resp.url
-                    if "track" in url.lower() or "consign" in url.lower():
-                        if "application/json" in (resp.headers or {}).get("content-type", ""):
-                            captured[url] = resp.json()
-                except Exception:
-                    pass
-            page.on("response", on_response)
-
-            log(f"goto: {url}")
-            page.goto(url, wait_until="domcontentloaded")
-            try:
-                # 处理 Cookie 弹窗（多写几个名字的兜底）
-                for name in ["Accept All", "Accept all", "I Agree", "Agree", "Accept"]:
-                    btn = page.get_by_role("button", name=name)
-                    if btn and btn.is_visible():
-                        btn.click(timeout=3000)
-                        break
-            except Exception:
-                pass
-
-            # 等结果渲染：尝试等待常见的追踪结果容器（自己可换成更精确选择器）
-            # 例如包含你的提单号/订舱号的文本出现：
-            try:
-                page.wait_for_load_state("networkidle", timeout=15000)
-                page.wait_for_selector(f"text={number}", timeout=15000)
-            except Exception:
-                # 如果节点等不到，但我们抓到了 XHR，也算成功
-                pass
-
-            # 保存页面
-            try:
-                with open(out_html, "w", encoding="utf-8") as f:
-                    f.write(page.content())
-            except Exception:
-                pass
-            page.screenshot(path=out_png, full_page=True)
-            log(f"saved screenshot -> {out_png}")
+def load_config(path: str = CONFIG_PATH) -> dict:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception:
+        return {}
 
-            result = {"status": "ok", "screenshot": out_png}
-            if captured:
-                # 返回一份抓到的 JSON，方便你后处理
-                # 只带第一条，避免过大
-                first_url = next(iter(captured))
-                result["api_url"] = first_url
-                result["data"] = captured[first_url]
-            return result
+def api_fast_path(number: str, config: dict) -> dict | None:
+    # 接口模板回放，实现在 carriers.Zim
+    return PROVIDER.fast_path(dict(config, search_number=str(number)))
 
-        except PlaywrightTimeoutError as e:
-            log(f"timeout: {e}")
-            return {"status": "timeout", "error": str(e)}
-        except Exception as e:
-            log(f"error: {e}")
-            return {"status": "error", "error": str(e)}
-        finally:
-            try:
-                ctx.close()
-            except Exception:
-                pass
+def scrape(number: str, headless: bool = True, debug_level: str | None = None, refresh: bool = False,
+           budget_sec: float | None = None, replay_har: str | None = None, replay_mode: str | None = None) -> dict:
+    # 缓存 / 预算 / 接口回放 / 浏览器步骤（app/config/zim.json 的 "steps"）由 carriers 统一执行
+    config = dict(load_config(), search_number=str(number), headless=headless, refresh=refresh)
+    if debug_level:
+        config["debug_level"] = debug_level
+    if budget_sec:
+        config["budget_sec"] = budget_sec
+    if replay_har:
+        config["replay_har"] = replay_har
+    if replay_mode:
+        config["replay_har_mode"] = replay_mode
+    return PROVIDER.scrape(config)
 
 def main():
     ap = argparse.ArgumentParser()
-    ap.add_argument("--number", required=True)
+    ap.add_argument("--number", default=None)
     ap.add_argument("--headless", default="false")
+    ap.add_argument("--debug-level", choices=LEVELS, default=None)
+    ap.add_argument("--refresh", action="store_true", help="bypass the result cache and query again")
+    ap.add_argument("--budget", type=float, default=None, metavar="SEC",
+                    help="end-to-end time budget for one lookup (default: budget_sec in config)")
+    ap.add_argument("--serve", nargs="?", const="stdin", default=None, metavar="HOST:PORT",
+                    help="keep running and answer JSON-lines requests on stdin (or a local TCP port)")
+    ap.add_argument("--replay-har", default=None, metavar="PATH",
+                    help="answer every request from a recorded HAR instead of the network")
+    ap.add_argument("--replay-mode", choices=har_replay.MODES, default=None,
+                    help="HAR matching: strict (route_from_har, default) or lenient (ignore ViewState / timestamps)")
     args = ap.parse_args()
     headless = str(args.headless).lower() not in ("false","0","no")
-    print(json.dumps(scrape(args.number, headless=headless), ensure_ascii=False))
+    if args.serve:
+        def handle(req: dict) -> dict:
+            level = req.get("debug_level") if req.get("debug_level") in LEVELS else args.debug_level
+            return scrape(str(req["number"]), headless=headless, debug_level=level, refresh=bool(req.get("refresh")),
+                          budget_sec=req.get("budget_sec") or args.budget, replay_har=args.replay_har,
+                          replay_mode=args.replay_mode)
+        return serve_loop.serve(handle, args.serve, on_start=lambda: get_pool().warm(headless, 1),
+                                on_cancel=close_pool)
+    if not args.number:
+        ap.error("--number is required unless --serve is given")
+    cancellation.install(watch_stdin=True)
+    try:
+        with cancellation.cancellable():
+            out = scrape(args.number, headless=headless, debug_level=args.debug_level, refresh=args.refresh,
+                         budget_sec=args.budget, replay_har=args.replay_har, replay_mode=args.replay_mode)
+    except cancellation.Cancelled as e:
+        out = {"status": "cancelled", "number": args.number, "reason": str(e)}
+    print(json.dumps(out, ensure_ascii=False), flush=True)
+    return cancellation.exit_code()
 
 if __name__ == "__main__":
     sys.exit(main())